@@ -0,0 +1,87 @@
+"""Dashboard/analytics scaling benchmark on synthetic databases.
+
+Builds (or reuses) a synthetic rents database per size and times the dashboard loaders and the
+market aggregations on it, to show where the dashboard stops scaling:
+
+    python -m benchmarks.analytics --sizes 10000,100000,1000000 --workdir /tmp/craigscraper-bench
+"""
+import argparse
+import os
+import statistics
+import time
+
+from benchmarks.synthetic_db import create_database
+from craigscraper import dashboard_queries as queries
+from craigscraper.db import connect
+from craigscraper.market_analysis import (
+    active_listings_from_months, active_listings_per_month, monthly_median_rent, monthly_median_rent_from_counts
+)
+
+
+def stages(conn):
+    # (name, callable) in dashboard order; later stages reuse earlier results like the UI does
+    results = {}
+
+    def run(name, fn):
+        def call():
+            results[name] = fn()
+        return name, call
+
+    return [
+        run('load_listings_data', lambda: queries.load_listings_data(conn)),
+        # what the listings table loads now: one filtered page and its prices
+        run('load_listings_page', lambda: queries.load_listings_page(conn, {'available_only': True})),
+        run('load_listing_prices', lambda: queries.load_listing_prices(conn, results['load_listings_page'][0]['id'])),
+        run('load_price_months', lambda: queries.load_price_months(conn)),
+        run('load_posted_and_dom', lambda: queries.load_posted_and_dom(conn)),
+        run('monthly_median_rent', lambda: monthly_median_rent(results['load_price_months'])),
+        run('active_listings_per_month', lambda: active_listings_per_month(results['load_posted_and_dom'][['posted_month', 'last_month']])),
+        # what the dashboard runs now: the materialized aggregates
+        run('load_price_counts', lambda: queries.load_price_counts(conn)),
+        run('load_market_months', lambda: queries.load_market_months(conn)),
+        run('median_from_counts', lambda: monthly_median_rent_from_counts(results['load_price_counts'])),
+        run('active_from_months', lambda: active_listings_from_months(results['load_market_months'])),
+    ]
+
+
+def time_size(path, repeat):
+    conn = connect(path, read_only=True)  # as the dashboard opens it
+    timings = {}
+    for _ in range(repeat):
+        for name, call in stages(conn):
+            started = time.perf_counter()
+            call()
+            timings.setdefault(name, []).append(time.perf_counter() - started)
+    conn.close()
+    return timings
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time the dashboard loaders and aggregations at several database sizes')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma-separated listing counts')
+    parser.add_argument('--workdir', default='.', help='where the synthetic databases are kept between runs')
+    parser.add_argument('--repeat', type=int, default=3, help='runs per stage; the median is reported')
+    parser.add_argument('--rebuild', action='store_true', help='regenerate databases that already exist')
+    args = parser.parse_args(argv)
+
+    sizes = [int(s) for s in args.sizes.split(',')]
+    os.makedirs(args.workdir, exist_ok=True)
+
+    report = {}
+    for size in sizes:
+        path = os.path.join(args.workdir, 'rents_%d.db' % size)
+        if args.rebuild or not os.path.exists(path):
+            print('generating %s...' % path)
+            create_database(path, size)
+        report[size] = {name: statistics.median(values) for name, values in time_size(path, args.repeat).items()}
+
+    names = list(next(iter(report.values())))
+    header = '%-28s' % 'stage' + ''.join('%14s' % ('%d listings' % size) for size in sizes)
+    print(header)
+    print('-' * len(header))
+    for name in names:
+        print('%-28s' % name + ''.join('%13.3fs' % report[size][name] for size in sizes))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Recorded Craigslist pages for offline replay, shared by the benchmarks and the tests.
+
+fixtures/listing_*.html are listing detail pages and fixtures/search_results.html is a search
+results page. synthesize_listings() and search_pages() multiply them into a corpus of any size
+by rewriting post ids, links and prices, so nothing ever touches the network.
+"""
+import os
+import random
+import re
+from types import SimpleNamespace
+
+from scrapy.http import HtmlResponse, Request
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+SEARCH_URL = (
+    'https://vancouver.craigslist.org/search/vancouver-bc/apa?lat=49.2822&lon=-123.1284'
+    '&min_price=2000&max_price=2700&min_bedrooms=1&search_distance=1.41#search=1~list~1~0'
+)
+
+post_id_pattern = re.compile(r'post id: (\d+)')
+og_url_pattern = re.compile(r'<meta property="og:url" content="([^"]+)">')
+og_title_pattern = re.compile(r'<meta property="og:title" content="([^"]+) - craigslist">')
+price_pattern = re.compile(r'<span class="price">\$([\d,]+)</span>')
+
+
+def read_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return f.read()
+
+
+def listing_fixtures():
+    # [(file name, html)] of every recorded listing page
+    names = sorted(n for n in os.listdir(FIXTURES_DIR) if n.startswith('listing_') and n.endswith('.html'))
+    return [(name, read_fixture(name)) for name in names]
+
+
+def html_response(url, body, meta=None):
+    if isinstance(body, str):
+        body = body.encode('utf-8')
+    return HtmlResponse(url, body=body, encoding='utf-8', request=Request(url, meta=meta or {}))
+
+
+def synthesize_listings(count, seed=0):
+    # [(link, title, price, html)]: the recorded listings cycled with fresh post ids and prices
+    rng = random.Random(seed)
+    templates = [html for _, html in listing_fixtures()]
+    listings = []
+    for i in range(count):
+        html = templates[i % len(templates)]
+        old_id = post_id_pattern.search(html).group(1)
+        old_price = price_pattern.search(html).group(1)
+        new_id = str(7900000000 + i)
+        price = 2000 + 5 * rng.randint(0, 140)
+        html = html.replace(old_id, new_id).replace('$' + old_price, '${:,}'.format(price))
+        link = og_url_pattern.search(html).group(1)
+        title = og_title_pattern.search(html).group(1)
+        listings.append((link, title, price, html))
+    return listings
+
+
+def search_page_html(results):
+    # a search results page in the layout of fixtures/search_results.html; results: [(link, title, price)]
+    items = ''.join(
+        '    <li class="cl-static-search-result" title="{title}">\n'
+        '        <a href="{link}">\n'
+        '            <div class="title">{title}</div>\n'
+        '            <div class="details">\n'
+        '                <div class="price">${price:,}</div>\n'
+        '                <div class="location">Vancouver</div>\n'
+        '            </div>\n'
+        '        </a>\n'
+        '    </li>\n'.format(link=link, title=title, price=price)
+        for link, title, price in results
+    )
+    return (
+        '<!DOCTYPE html>\n<html>\n<head><meta charset="UTF-8"></head>\n<body>\n<div class="cl-content">\n'
+        '<ol class="cl-static-search-results">\n'
+        '    <li class="cl-static-hub-links"><div>see also</div></li>\n'
+        + items +
+        '</ol>\n</div>\n</body>\n</html>\n'
+    )
+
+
+def search_pages(results, page_size=120):
+    # result pages as Craigslist serves them, ending with an empty page
+    pages = [search_page_html(results[i:i + page_size]) for i in range(0, len(results), page_size)]
+    pages.append(search_page_html([]))
+    return pages
+
+
+def offline_spider(rents_db, extractor='parsel'):
+    # a RentSpider that needs no crawler, network or notification transport
+    from craigscraper.spiders.rent import RentSpider
+
+    RentSpider.test_notification_sent = True
+    spider = RentSpider(notifications=SimpleNamespace(apobj=None))
+    spider.rents_db = rents_db
+    spider.first_run = True
+    spider.search_page_fanout = 1
+    spider.search_max_pages = 10 ** 6
+    spider.search_page_priority = 100
+    spider.detail_extractor = extractor
+    return spider
+
+
+def replay_search(spider, pages, search_url=SEARCH_URL, on_page=None, items=None):
+    # feed result pages through RentSpider.parse as if they were all requested up front;
+    # returns the detail-page requests the spider made (the price-only items it yields go to `items`)
+    page_size = None
+    spider.pending_pages += len(pages)
+    spider.last_page_requested[search_url] = len(pages) - 1
+    requests = []
+    for page, html in enumerate(pages):
+        url = spider.get_page_url(search_url, page, page_size or 1)
+        response = html_response(url, html, meta={'search_url': search_url, 'page': page, 'page_size': page_size})
+        if on_page:
+            with on_page():
+                out = list(spider.parse(response))
+        else:
+            out = list(spider.parse(response))
+        page_size = page_size or html.count('cl-static-search-result"')
+        requests.extend(r for r in out if isinstance(r, Request) and r.callback == spider.parseItem)
+        if items is not None:
+            items.extend(r for r in out if not isinstance(r, Request))
+    return requests
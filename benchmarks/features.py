@@ -0,0 +1,63 @@
+"""Micro-benchmark of feature detection: SharedUtils.findFeature x4 vs findFeatures.
+
+    python -m benchmarks.features --items 2000 --words 600
+"""
+import argparse
+import random
+import time
+
+from craigscraper.spiders.shared_utils import SharedUtils
+
+FILLER = (
+    'bright spacious unit with large windows and a view of the mountains close to transit shops '
+    'and restaurants hardwood floors in-suite laundry dishwasher balcony storage locker bike room '
+    'pets negotiable no smoking references required one year lease minimum utilities not included'
+).split()
+KEYWORDS = ['parking', 'stall', 'space', 'electric', 'charger', 'EV', 'attached', 'gym', 'pool', 'carport']
+
+
+def make_items(count, words, seed=0):
+    # long descriptions with the feature keywords sprinkled in, so the parking/EV patterns have
+    # plenty of candidate positions and long lines to backtrack over
+    rng = random.Random(seed)
+    items = []
+    for _ in range(count):
+        tokens = [rng.choice(KEYWORDS) if rng.random() < 0.02 else rng.choice(FILLER) for _ in range(words)]
+        for i in range(60, len(tokens), 60):
+            tokens[i] += '\n'
+        attributes = ['cats are OK - purrr', 'laundry in bldg', rng.choice(['street parking', 'no parking', 'attached garage']), 'no smoking']
+        items.append({'description': ' '.join(tokens), 'attributes': attributes})
+    return items
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time findFeature x4 against findFeatures')
+    parser.add_argument('--items', type=int, default=2000)
+    parser.add_argument('--words', type=int, default=600, help='words per description')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    utils = SharedUtils()
+    items = make_items(args.items, args.words)
+    for item in items:
+        assert utils.findFeatures(item) == {f: utils.findFeature(f, item) for f in SharedUtils.features}
+
+    one_by_one = best_of(lambda: [[utils.findFeature(f, item) for f in SharedUtils.features] for item in items], args.repeat)
+    single_pass = best_of(lambda: [utils.findFeatures(item) for item in items], args.repeat)
+    print('%d items, %d words each' % (args.items, args.words))
+    print('findFeature x4: %8.1f ms  (%.1f us/item)' % (one_by_one * 1000, one_by_one / args.items * 1e6))
+    print('findFeatures:   %8.1f ms  (%.1f us/item)  %.1fx' % (single_pass * 1000, single_pass / args.items * 1e6, one_by_one / single_pass))
+
+
+if __name__ == '__main__':
+    main()
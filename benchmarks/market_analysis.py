@@ -0,0 +1,65 @@
+"""Micro-benchmark of the market aggregations against their original pure-Python loops.
+
+    python -m benchmarks.market_analysis --spans 1000000
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from craigscraper.market_analysis import _index_to_month, _month_to_index, active_listings_per_month
+
+
+def active_listings_per_month_loop(spans_df):
+    # the original iterrows() implementation, kept as the baseline
+    counts = {}
+    for _, r in spans_df.dropna(subset=['posted_month', 'last_month']).iterrows():
+        start = _month_to_index(r['posted_month'])
+        end = _month_to_index(r['last_month'])
+        if end < start:
+            continue
+        for idx in range(start, end + 1):
+            m = _index_to_month(idx)
+            counts[m] = counts.get(m, 0) + 1
+    return pd.DataFrame(sorted(counts.items()), columns=['month', 'active'])
+
+
+def random_spans(count, seed=0):
+    rng = np.random.default_rng(seed)
+    start = rng.integers(2020 * 12, 2026 * 12, size=count)
+    end = start + rng.geometric(0.6, size=count) - 1
+    fmt = lambda idx: pd.Series(idx // 12).astype(str).str.zfill(4) + '-' + pd.Series(idx % 12 + 1).astype(str).str.zfill(2)
+    return pd.DataFrame({'posted_month': fmt(start), 'last_month': fmt(end)})
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Time active_listings_per_month against the original loop')
+    parser.add_argument('--spans', type=int, default=1000000)
+    parser.add_argument('--loop-spans', type=int, default=100000, help='spans given to the (slow) original loop')
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args(argv)
+
+    spans = random_spans(args.spans)
+    vectorized, _ = best_of(lambda: active_listings_per_month(spans), args.repeat)
+    print('active_listings_per_month (vectorized): %d spans in %.1f ms' % (args.spans, vectorized * 1000))
+
+    subset = spans.iloc[:args.loop_spans]
+    loop, expected = best_of(lambda: active_listings_per_month_loop(subset), 1)
+    fast, got = best_of(lambda: active_listings_per_month(subset), args.repeat)
+    assert got['month'].tolist() == expected['month'].tolist() and got['active'].tolist() == expected['active'].tolist()
+    print('on %d spans: loop %.1f ms, vectorized %.1f ms (%.0fx)' % (len(subset), loop * 1000, fast * 1000, loop / fast))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+"""Offline replay benchmark for RentSpider.parse, RentSpider.parseItem and the pipeline.
+
+Replays the recorded pages in benchmarks/fixtures (multiplied to --listings listings) against a
+temporary database, with no network:
+
+    python -m benchmarks.replay --listings 1000 [--json run.json] [--baseline previous.json]
+    python -m benchmarks.replay --extractor lxml --baseline parsel.json   # compare extractors
+
+Stages: 'parse (new)' reads result pages against an empty DB, 'parseItem' extracts every
+listing page, 'pipeline' writes the items, 'parse (rescrape)' replays the result pages against
+the filled DB with some prices changed. Reports pages/sec or items/sec, per-call latency
+percentiles and the peak traced memory of the whole replay.
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from contextlib import contextmanager, redirect_stdout
+from types import SimpleNamespace
+
+from benchmarks.corpus import SEARCH_URL, html_response, offline_spider, replay_search, search_pages, synthesize_listings
+from craigscraper.spiders.extractors import EXTRACTORS
+
+
+class StageTimer:
+    def __init__(self):
+        self.samples = {}
+
+    @contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples.setdefault(stage, []).append(time.perf_counter() - start)
+
+
+def percentile(values, q):
+    # nearest-rank percentile of an unsorted list
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, int(round(q / 100 * len(ordered))) - 1))]
+
+
+def summarize(samples):
+    summary = {}
+    for stage, values in samples.items():
+        total = sum(values)
+        summary[stage] = {
+            'calls': len(values),
+            'total_s': total,
+            'per_s': len(values) / total if total else None,
+            'p50_ms': percentile(values, 50) * 1000,
+            'p95_ms': percentile(values, 95) * 1000,
+            'p99_ms': percentile(values, 99) * 1000,
+        }
+    return summary
+
+
+def replay(listings_count, page_size, reprice_share, timer, seed=0, extractor='parsel'):
+    listings = synthesize_listings(listings_count, seed=seed)
+    pages = search_pages([(link, title, price) for link, title, price, _ in listings], page_size)
+    bodies = {link: html for link, _, _, html in listings}
+
+    with tempfile.TemporaryDirectory() as tmp:
+        rents_db = os.path.join(tmp, 'rents.db')
+        os.environ['RENTS_DB'] = rents_db
+        # imported late: the pipeline reads RENTS_DB when it is built
+        from craigscraper.pipelines import CraigscraperPipeline
+        pipeline = CraigscraperPipeline()
+        quiet = SimpleNamespace(first_run=True)
+
+        spider = offline_spider(rents_db, extractor)
+        requests = replay_search(spider, pages, SEARCH_URL, on_page=lambda: timer.time('parse (new)'))
+
+        items = []
+        for request in requests:
+            response = html_response(request.url, bodies[request.url], meta=request.meta)
+            with timer.time('parseItem'):
+                items.extend(spider.parseItem(response))
+
+        for item in items:
+            with timer.time('pipeline'):
+                pipeline.process_item(item, quiet)
+        with timer.time('pipeline'):
+            pipeline.close_spider(quiet)
+
+        # steady state: same result set, a share of the listings repriced
+        rng = random.Random(seed + 1)
+        rescrape = [
+            (link, title, price + 25 if rng.random() < reprice_share else price)
+            for link, title, price, _ in listings
+        ]
+        spider = offline_spider(rents_db)
+        price_only = []
+        replay_search(spider, search_pages(rescrape, page_size), SEARCH_URL, on_page=lambda: timer.time('parse (rescrape)'), items=price_only)
+        # the listings were just fetched: reprices are recorded from the result pages alone
+        for item in price_only:
+            with timer.time('pipeline (rescrape)'):
+                pipeline.process_item(item, quiet)
+        with timer.time('pipeline (rescrape)'):
+            pipeline.close_spider(quiet)
+
+        pipeline.con.close()
+        pipeline.shared_connections.pop(rents_db, None)
+        return len(pages), len(items)
+
+
+def print_report(summary, pages, items, peak_bytes, baseline=None):
+    print('%d result pages x2, %d listing pages, %d items' % (pages, items, items))
+    if peak_bytes is not None:
+        print('peak traced memory: %.1f MiB' % (peak_bytes / 2 ** 20))
+    header = '%-18s %7s %10s %10s %9s %9s %9s' % ('stage', 'calls', 'total s', 'per sec', 'p50 ms', 'p95 ms', 'p99 ms')
+    print(header)
+    print('-' * len(header))
+    for stage, s in summary.items():
+        line = '%-18s %7d %10.3f %10.1f %9.3f %9.3f %9.3f' % (
+            stage, s['calls'], s['total_s'], s['per_s'] or 0, s['p50_ms'], s['p95_ms'], s['p99_ms'])
+        if baseline and stage in baseline.get('stages', {}) and baseline['stages'][stage]['per_s']:
+            change = (s['per_s'] / baseline['stages'][stage]['per_s'] - 1) * 100
+            line += '  %+6.1f%% vs baseline' % change
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Offline replay benchmark for the spider and pipeline')
+    parser.add_argument('--listings', type=int, default=500, help='listing pages to replay (default: 500)')
+    parser.add_argument('--page-size', type=int, default=120, help='results per search page (default: 120)')
+    parser.add_argument('--reprice-share', type=float, default=0.1, help='share of listings repriced on the rescrape')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--json', help='write the results to this file')
+    parser.add_argument('--baseline', help='compare throughput against a previous --json file')
+    parser.add_argument('--extractor', choices=sorted(EXTRACTORS), default='parsel', help='detail page extractor (DETAIL_EXTRACTOR)')
+    parser.add_argument('--verbose', action='store_true', help="show the spider's per-listing output")
+    args = parser.parse_args(argv)
+
+    # the spider and pipeline print a line per listing; keep the report readable
+    out = sys.stdout if args.verbose else open(os.devnull, 'w')
+
+    timer = StageTimer()
+    with redirect_stdout(out):
+        pages, items = replay(args.listings, args.page_size, args.reprice_share, timer, extractor=args.extractor)
+
+    # memory is measured in a separate pass: tracemalloc slows everything down
+    peak = None
+    if not args.no_memory:
+        tracemalloc.start()
+        with redirect_stdout(out):
+            replay(args.listings, args.page_size, args.reprice_share, StageTimer(), extractor=args.extractor)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    summary = summarize(timer.samples)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    print_report(summary, pages, items, peak, baseline)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'listings': args.listings, 'extractor': args.extractor, 'pages': pages, 'items': items,
+                       'peak_bytes': peak, 'stages': summary}, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
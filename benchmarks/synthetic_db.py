@@ -0,0 +1,177 @@
+"""Synthetic rents databases for scaling tests of the dashboard and the analytics.
+
+Builds listings, prices and listing_changes with the crawler's own schema and plausible market
+behaviour: postings spread over --months of history, exponential time on market, bedroom-driven
+prices with a yearly trend, price drops/raises and occasional content edits.
+
+    python -m benchmarks.synthetic_db --listings 100000 --out rents_100k.db
+"""
+import argparse
+import os
+import random
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+
+TZ = timezone(timedelta(hours=-8))
+TS_FORMAT = '%Y-%m-%dT%H:%M:%S%z'  # the crawler's format, e.g. 2025-02-16T12:00:53-0800
+
+BEDROOMS = [(1, 0.5), (2, 0.3), (3, 0.12), (4, 0.06), (5, 0.02)]
+BASE_RENT = {1: 2300, 2: 3200, 3: 4200, 4: 5200, 5: 6100}
+BATHROOMS = [('1Ba', 1.0, None), ('1.5Ba', 1.5, None), ('2Ba', 2.0, None), ('2.5Ba', 2.5, None),
+             ('splitBa', None, 'split'), ('sharedBa', None, 'shared')]
+ATTRIBUTES = ['cats are OK - purrr', 'dogs are OK - wooof', 'laundry in bldg', 'w/d in unit', 'no smoking',
+              'underground parking', 'street parking', 'carport', 'furnished', 'wheelchair accessible']
+NEIGHBOURHOODS = ['Yaletown', 'West End', 'Kitsilano', 'Mount Pleasant', 'Fairview', 'Coal Harbour', 'Gastown']
+SENTENCES = [
+    'Bright and spacious unit with large windows and plenty of natural light.',
+    'Steps to the seawall, transit, shops and restaurants.',
+    'Building has a gym, rooftop garden and bike storage.',
+    'One secured underground parking stall included.',
+    'In-suite laundry, dishwasher and a gas range.',
+    'Heat and hot water included, tenant pays hydro.',
+    'Available now, one year lease, no smoking.',
+    'Small pets considered with a pet deposit.',
+    'Indoor pool and hot tub in the building.',
+    'EV charging station available in the parkade.',
+]
+CHANGED_FIELDS = ['title', 'description', 'available_on', 'size']
+
+
+def weighted_choice(rng, choices):
+    pick = rng.random()
+    for value, weight in choices:
+        pick -= weight
+        if pick <= 0:
+            return value
+    return choices[-1][0]
+
+
+def generate(con, listings, months=36, seed=0, description_sentences=4, end=None):
+    rng = random.Random(seed)
+    end = end or datetime(2026, 9, 30, 12, 0, tzinfo=TZ)
+    start = end - timedelta(days=months * 30.4)
+    history_seconds = (end - start).total_seconds()
+
+    listing_rows, price_rows, change_rows = [], [], []
+
+    def flush():
+        con.executemany(
+            """INSERT INTO listings (id, link, rooms, bedrooms, bathrooms, bathrooms_type, available_on, size,
+               attributes, description, title, gym, pool, parking, ev_charging, distance, last_price, last_updated,
+               posted_on, still_published) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            listing_rows)
+        con.executemany("INSERT INTO prices (listing_id, last_updated, price) VALUES (?, ?, ?)", price_rows)
+        con.executemany(
+            "INSERT INTO listing_changes (listing_id, field, old_value, new_value, changed_at) VALUES (?, ?, ?, ?, ?)",
+            change_rows)
+        con.commit()
+        listing_rows.clear()
+        price_rows.clear()
+        change_rows.clear()
+
+    for n in range(listings):
+        listing_id = 7000000000 + n
+        posted = start + timedelta(seconds=rng.random() * history_seconds)
+        on_market = timedelta(days=min(rng.expovariate(1 / 21), 180))
+        last_seen = min(posted + on_market, end)
+        still_published = 'True' if end - last_seen < timedelta(days=2) else 'False'
+
+        bedrooms = weighted_choice(rng, BEDROOMS)
+        if rng.random() < 0.03:
+            bath_text, bathrooms, bathrooms_type = rng.choice(BATHROOMS[4:])  # split/shared
+        else:
+            bath_text, bathrooms, bathrooms_type = rng.choice(BATHROOMS[:min(1 + bedrooms, 4)])
+        rooms = '%dBR / %s' % (bedrooms, bath_text)
+
+        # rents drift up ~3%/year; asking prices are round-ish numbers
+        years_in = (posted - start).days / 365
+        price = BASE_RENT[bedrooms] * (1 + 0.03 * years_in) * rng.lognormvariate(0, 0.12)
+        price = int(round(price / 5) * 5)
+
+        neighbourhood = rng.choice(NEIGHBOURHOODS)
+        title = '%s %dBR in %s' % (rng.choice(['Bright', 'Spacious', 'Renovated', 'Modern', 'Cozy']), bedrooms, neighbourhood)
+        description = ' '.join(rng.sample(SENTENCES, description_sentences))
+        size = rng.randint(400, 650) + 250 * (bedrooms - 1) if rng.random() < 0.8 else None
+        available_on = (posted + timedelta(days=rng.randint(0, 45))).strftime('%Y-%m-%d')
+
+        # price history: the first asking price, then drops (mostly) or raises over time on market
+        changes = weighted_choice(rng, [(0, 0.6), (1, 0.25), (2, 0.1), (3, 0.05)])
+        stamps = sorted(posted + (last_seen - posted) * rng.random() for _ in range(changes))
+        price_rows.append((listing_id, posted.strftime(TS_FORMAT), price))
+        for stamp in stamps:
+            step = 5 * rng.randint(5, 60)
+            price = price - step if rng.random() < 0.75 else price + step
+            price_rows.append((listing_id, stamp.strftime(TS_FORMAT), price))
+
+        # occasional content edits
+        if rng.random() < 0.15:
+            for _ in range(rng.randint(1, 3)):
+                field = rng.choice(CHANGED_FIELDS)
+                changed_at = posted + (last_seen - posted) * rng.random()
+                change_rows.append((listing_id, field, 'old %s' % field, 'new %s' % field, changed_at.strftime(TS_FORMAT)))
+
+        listing_rows.append((
+            listing_id,
+            'https://vancouver.craigslist.org/van/apa/d/vancouver-%s/%d.html' % (title.lower().replace(' ', '-'), listing_id),
+            rooms, float(bedrooms), bathrooms, bathrooms_type, available_on, size,
+            ', '.join(rng.sample(ATTRIBUTES, rng.randint(1, 4))), description, title,
+            str('gym' in description), str('pool' in description), str(rng.random() < 0.4), str('EV' in description),
+            round(rng.uniform(0.1, 5.0), 3), price,
+            last_seen.strftime(TS_FORMAT), posted.strftime(TS_FORMAT), still_published,
+        ))
+
+        if len(listing_rows) >= 10000:
+            flush()
+
+    flush()
+
+
+def create_database(path, listings, months=36, seed=0, description_sentences=4):
+    # the crawler's own schema, indexes and migration ledger, then bulk synthetic rows
+    from craigscraper import market_aggregates
+    from craigscraper.pipelines import CraigscraperPipeline
+
+    if os.path.exists(path):
+        os.remove(path)
+    previous = os.environ.get('RENTS_DB')
+    os.environ['RENTS_DB'] = path
+    try:
+        pipeline = CraigscraperPipeline()
+    finally:
+        if previous is None:
+            os.environ.pop('RENTS_DB')
+        else:
+            os.environ['RENTS_DB'] = previous
+    con = pipeline.con
+    CraigscraperPipeline.shared_connections.pop(path, None)
+
+    # bulk load: durability doesn't matter for a throwaway database
+    con.execute('PRAGMA synchronous = OFF')
+    generate(con, listings, months=months, seed=seed, description_sentences=description_sentences)
+    # rows were inserted behind the pipeline's back: build the aggregates the way the migration does
+    market_aggregates.rebuild(con)
+    con.execute('ANALYZE')
+    con.commit()
+    con.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Build a synthetic rents database')
+    parser.add_argument('--listings', type=int, default=10000)
+    parser.add_argument('--months', type=int, default=36, help='months of history (default: 36)')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', default=None, help='database path (default: rents_<listings>.db)')
+    args = parser.parse_args(argv)
+
+    out = args.out or 'rents_%d.db' % args.listings
+    started = time.perf_counter()
+    create_database(out, args.listings, months=args.months, seed=args.seed)
+    con = sqlite3.connect(out)
+    counts = {t: con.execute('SELECT COUNT(*) FROM %s' % t).fetchone()[0] for t in ('listings', 'prices', 'listing_changes')}
+    con.close()
+    print('%s: %s in %.1fs' % (out, ', '.join('%d %s' % (n, t) for t, n in counts.items()), time.perf_counter() - started))
+
+
+if __name__ == '__main__':
+    main()
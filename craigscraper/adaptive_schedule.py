@@ -0,0 +1,91 @@
+"""Crawl interval from the observed market churn.
+
+Listings are posted and repriced at very different rates through the day and the week. From the
+stored history (listings.posted_on for new listings, every price row after a listing's first for
+reprices) we count events per (weekday, hour) slot over the last ADAPTIVE_HISTORY_WEEKS weeks.
+The next interval is the one that should see ADAPTIVE_TARGET_EVENTS events at the current rate,
+kept within MIN_MINUTES_INTERVAL..MAX_MINUTES_INTERVAL: short at peak times, long at night.
+
+Slots use the local time written in the stored timestamps (Craigslist's), not the host's.
+"""
+import os
+import sqlite3
+from datetime import datetime, timedelta
+from termcolor import colored
+from craigscraper.db import connect, db_path
+
+
+TS_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+
+
+def _slot(timestamp):
+    try:
+        when = datetime.strptime(timestamp, TS_FORMAT)
+    except (TypeError, ValueError):
+        return None
+    return when.weekday(), when.hour
+
+
+def event_rates(con, weeks=8, now=None):
+    # {(weekday, hour): average new + repriced listings in that hour of the week}
+    now = now or datetime.now().astimezone()
+    since = (now - timedelta(weeks=weeks)).strftime(TS_FORMAT)
+    counts = {}
+    new = con.execute("SELECT posted_on FROM listings WHERE posted_on >= ?", (since,))
+    repriced = con.execute("""
+        SELECT p.last_updated FROM prices p
+        WHERE p.last_updated >= ?
+          AND EXISTS (SELECT 1 FROM prices q WHERE q.listing_id = p.listing_id AND q.last_updated < p.last_updated)
+    """, (since,))
+    for cursor in (new, repriced):
+        for (timestamp,) in cursor.fetchall():
+            slot = _slot(timestamp)
+            if slot is not None:
+                counts[slot] = counts.get(slot, 0) + 1
+    return {slot: n / weeks for slot, n in counts.items()}
+
+
+def market_timezone(con):
+    # the UTC offset Craigslist writes in its timestamps (the latest one, across DST changes)
+    latest = con.execute("SELECT MAX(last_updated) FROM prices").fetchone()[0]
+    try:
+        return datetime.strptime(latest, TS_FORMAT).tzinfo
+    except (TypeError, ValueError):
+        return None
+
+
+def interval_minutes(rates, now, min_minutes, max_minutes, target_events=1.0):
+    # the rate around `now` (previous, current and next hour, to smooth out noisy slots)
+    # -> minutes until target_events are expected, within the bounds
+    rate = 0.0
+    for offset in (-1, 0, 1):
+        when = now + timedelta(hours=offset)
+        rate += rates.get((when.weekday(), when.hour), 0.0)
+    rate /= 3
+    if rate <= 0:
+        return max_minutes
+    return int(min(max(60 * target_events / rate, min_minutes), max_minutes))
+
+
+def next_interval(default_minutes):
+    # the configured bounds and history; falls back to default_minutes without a database
+    path = db_path()
+    if not os.path.exists(path):
+        return default_minutes
+    min_minutes = int(os.environ.get('MIN_MINUTES_INTERVAL', '2'))
+    max_minutes = int(os.environ.get('MAX_MINUTES_INTERVAL', '60'))
+    weeks = int(os.environ.get('ADAPTIVE_HISTORY_WEEKS', '8'))
+    target_events = float(os.environ.get('ADAPTIVE_TARGET_EVENTS', '1'))
+
+    con = connect(path, read_only=True)
+    try:
+        now = datetime.now(market_timezone(con) or datetime.now().astimezone().tzinfo)
+        minutes = interval_minutes(event_rates(con, weeks, now), now, min_minutes, max_minutes, target_events)
+    except sqlite3.Error as e:
+        # e.g. a database the pipeline hasn't created the tables in yet
+        print(colored('Adaptive schedule unavailable (%s), next crawl in %d minute(s)' % (e, default_minutes), 'yellow'))
+        return default_minutes
+    finally:
+        con.close()
+    print(colored('Adaptive schedule: next crawl in %d minute(s)' % minutes, 'cyan'))
+    return minutes
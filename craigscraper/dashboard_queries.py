@@ -0,0 +1,270 @@
+"""SQL loaders behind the Streamlit dashboard.
+
+Plain functions of a sqlite3 connection, without streamlit imports, so ui/ui.py can wrap them in
+its caches while tests and benchmarks/analytics.py call them directly.
+"""
+import pandas as pd
+
+
+# columns the listings table shows; description and attributes are fetched one listing at a time
+LISTING_COLUMNS = ['id', 'link', 'title', 'bedrooms', 'bathrooms', 'size', 'last_price', 'available_on',
+                   'posted_on', 'last_updated', 'distance', 'gym', 'pool', 'parking', 'ev_charging',
+                   'still_published']
+FEATURE_COLUMNS = ['gym', 'pool', 'parking', 'ev_charging']
+
+# sortable columns. NULLs sort as a sentinel past every real value (last in both directions), so
+# the keyset comparison in load_listings_page never meets a NULL.
+SORT_COLUMNS = {
+    'size': 'number',
+    'last_price': 'number',
+    'bedrooms': 'number',
+    'bathrooms': 'number',
+    'distance': 'number',
+    'available_on': 'text',
+    'posted_on': 'text',
+    'title': 'text',
+}
+
+
+def _typed_listings(df):
+    # stored 'True'/'False' strings to booleans, ISO timestamps to datetimes
+    for col in FEATURE_COLUMNS + ['still_published']:
+        if col in df.columns:
+            df[col] = df[col].map({'True': True, 'False': False})
+    for col in ['available_on', 'last_updated', 'posted_on']:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
+    return df
+
+
+def load_listings_data(conn):
+    query = """
+    SELECT * FROM listings
+    """
+    return _typed_listings(pd.read_sql_query(query, conn))
+
+
+def listing_filters(filters):
+    # sidebar filters -> (WHERE clauses, params). Keys: available_only (or rented_only),
+    # price_range (min, max), bedrooms, bathrooms (values to keep; empty keeps everything),
+    # features (columns that must be True)
+    clauses, params = [], []
+    if filters.get('available_only'):
+        clauses.append("still_published = 'True'")
+    if filters.get('rented_only'):
+        clauses.append("still_published = 'False'")
+    if filters.get('price_range'):
+        clauses.append("last_price BETWEEN ? AND ?")
+        params += list(filters['price_range'])
+    for column in ('bedrooms', 'bathrooms'):
+        values = list(filters.get(column) or [])
+        if values:
+            clauses.append("%s IN (%s)" % (column, ','.join('?' * len(values))))
+            params += values
+    for column in filters.get('features') or []:
+        if column not in FEATURE_COLUMNS:
+            raise ValueError('unknown feature column: %s' % column)
+        clauses.append("%s = 'True'" % column)
+    return clauses, params
+
+
+def _where(clauses):
+    return ' WHERE ' + ' AND '.join(clauses) if clauses else ''
+
+
+def _sort_key(column, descending):
+    if column not in SORT_COLUMNS:
+        raise ValueError('unknown sort column: %s' % column)
+    if SORT_COLUMNS[column] == 'number':
+        sentinel = '-1e308' if descending else '1e308'
+    else:
+        sentinel = "''" if descending else 'char(1114111)'
+    return 'COALESCE(%s, %s)' % (column, sentinel)
+
+
+def count_listings(conn, filters):
+    clauses, params = listing_filters(filters)
+    return conn.execute("SELECT COUNT(*) FROM listings" + _where(clauses), params).fetchone()[0]
+
+
+def load_listings_page(conn, filters, sort='size', descending=True, after=None, page_size=50):
+    # One page of the filtered listings, ordered by `sort` then id. Keyset pagination: `after` is
+    # the cursor returned with the previous page, so a page costs the same however deep it is.
+    # Returns (page, cursor of the next page or None on the last page).
+    key = _sort_key(sort, descending)
+    clauses, params = listing_filters(filters)
+    if after is not None:
+        clauses.append("(%s, id) %s (?, ?)" % (key, '<' if descending else '>'))
+        params += list(after)
+    direction = 'DESC' if descending else 'ASC'
+    query = "SELECT %s, %s AS sort_key FROM listings%s ORDER BY sort_key %s, id %s LIMIT ?" % (
+        ', '.join(LISTING_COLUMNS), key, _where(clauses), direction, direction)
+    df = pd.read_sql_query(query, conn, params=params + [page_size + 1])
+
+    cursor = None
+    if len(df) > page_size:
+        df = df.iloc[:page_size]
+        # native Python values: sqlite3 can't bind numpy scalars
+        cursor = (df['sort_key'].tolist()[-1], int(df['id'].iloc[-1]))
+    return _typed_listings(df.drop(columns='sort_key')), cursor
+
+
+def load_filter_options(conn):
+    # bounds and values for the sidebar widgets
+    min_price, max_price = conn.execute("SELECT MIN(last_price), MAX(last_price) FROM listings").fetchone()
+    values = {}
+    for column in ('bedrooms', 'bathrooms'):
+        values[column] = [row[0] for row in conn.execute(
+            "SELECT DISTINCT %s FROM listings WHERE %s IS NOT NULL ORDER BY %s" % (column, column, column))]
+    return {'min_price': min_price, 'max_price': max_price, **values}
+
+
+def load_listing_titles(conn, filters):
+    # (id, title) of the filtered listings, for the price history selector
+    clauses, params = listing_filters(filters)
+    return pd.read_sql_query("SELECT id, title FROM listings%s ORDER BY title, id" % _where(clauses), conn, params=params)
+
+
+def get_listing_title(conn, listing_id):
+    row = conn.execute("SELECT title FROM listings WHERE id = ?", (listing_id,)).fetchone()
+    return None if row is None else row[0]
+
+
+def load_price_points(conn, filters):
+    # the filtered listings' current prices counted per (bedrooms, last_price): the snapshot
+    # charts' input, as many rows as distinct prices rather than listings
+    clauses, params = listing_filters(filters)
+    clauses.append("last_price IS NOT NULL")
+    return pd.read_sql_query(
+        "SELECT bedrooms, last_price, COUNT(*) AS n FROM listings%s GROUP BY bedrooms, last_price ORDER BY bedrooms, last_price"
+        % _where(clauses), conn, params=params)
+
+
+def load_trend_counts(conn, filters):
+    # how many of the filtered listings went up, down or stayed put between their first and their
+    # latest recorded price (no history counts as stable). Both prices are index lookups per listing.
+    clauses, params = listing_filters(filters)
+    query = """
+    SELECT CASE WHEN first_price IS NULL OR latest_price = first_price THEN 'stable'
+                WHEN latest_price > first_price THEN 'increase'
+                ELSE 'decrease' END AS trend,
+           COUNT(*) AS count
+    FROM (
+        SELECT (SELECT price FROM prices WHERE listing_id = listings.id ORDER BY last_updated LIMIT 1) AS first_price,
+               (SELECT price FROM prices WHERE listing_id = listings.id ORDER BY last_updated DESC LIMIT 1) AS latest_price
+        FROM listings%s
+    )
+    GROUP BY trend
+    ORDER BY trend
+    """ % _where(clauses)
+    return pd.read_sql_query(query, conn, params=params)
+
+
+def get_listing_details(conn, listing_id):
+    # the long text columns the listings table leaves out, for one listing
+    row = conn.execute("SELECT description, attributes FROM listings WHERE id = ?", (listing_id,)).fetchone()
+    if row is None:
+        return None
+    return {'description': row[0], 'attributes': row[1]}
+
+
+def load_listing_prices(conn, listing_ids):
+    # price points of the given listings, oldest first per listing
+    ids = [int(listing_id) for listing_id in listing_ids]
+    if not ids:
+        return pd.DataFrame(columns=['listing_id', 'last_updated', 'price'])
+    df = pd.read_sql_query(
+        "SELECT listing_id, last_updated, price FROM prices WHERE listing_id IN (%s) ORDER BY listing_id, last_updated"
+        % ','.join('?' * len(ids)), conn, params=ids)
+    df['last_updated'] = pd.to_datetime(df['last_updated'], errors='coerce', utc=True)
+    return df
+
+
+def load_prices_data(conn):
+    query = """
+    SELECT * FROM prices
+    """
+    df = pd.read_sql_query(query, conn)
+
+    # Convert date columns to datetime
+    if 'last_updated' in df.columns:
+        df['last_updated'] = pd.to_datetime(df['last_updated'], errors='coerce', utc=True)
+
+    return df
+
+
+def load_price_months(conn):
+    # one row per price point: month, bedrooms, price (joined to the listing's bedroom count).
+    # Timestamps are stored ISO-8601 with a 'T' and tz offset (e.g. 2025-02-16T12:00:53-0800),
+    # which SQLite strftime() CANNOT parse (returns NULL). substr(...,1,7) extracts 'YYYY-MM'
+    # directly from the ISO string, which is correct for that fixed layout.
+    query = """
+    SELECT substr(p.last_updated, 1, 7) AS month, l.bedrooms AS bedrooms, p.price AS price
+    FROM prices p
+    JOIN listings l ON l.id = p.listing_id
+    WHERE l.bedrooms IS NOT NULL AND p.price IS NOT NULL
+    """
+    return pd.read_sql_query(query, conn)
+
+
+def load_posted_and_dom(conn):
+    # posted month (for new-listings) and approximate days-on-market per listing.
+    # substr(...,1,7) is used instead of strftime() because the ISO-8601 timestamps with a
+    # 'T'/tz offset are not parseable by SQLite's date functions (see load_price_months).
+    query = """
+    SELECT substr(posted_on, 1, 7) AS posted_month,
+           substr(last_updated, 1, 7) AS last_month,
+           posted_on, last_updated
+    FROM listings
+    WHERE posted_on IS NOT NULL
+    """
+    df = pd.read_sql_query(query, conn)
+    df['posted_on'] = pd.to_datetime(df['posted_on'], errors='coerce', utc=True)
+    df['last_updated'] = pd.to_datetime(df['last_updated'], errors='coerce', utc=True)
+    df['days_on_market'] = (df['last_updated'] - df['posted_on']).dt.days
+    return df
+
+
+def _has_table(conn, name):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)).fetchone() is not None
+
+
+def load_price_counts(conn):
+    # the materialized (month, bedrooms, price) histogram, see craigscraper.market_aggregates.
+    # Empty until the crawler has built it (migration 4).
+    if not _has_table(conn, 'market_price_counts'):
+        return pd.DataFrame(columns=['month', 'bedrooms', 'price', 'n'])
+    return pd.read_sql_query("SELECT month, bedrooms, price, n FROM market_price_counts", conn)
+
+
+def load_market_months(conn):
+    # per-month listing counts, active span events and days-on-market totals
+    if not _has_table(conn, 'market_months'):
+        return pd.DataFrame(columns=['month', 'new_listings', 'span_starts', 'span_ends', 'dom_days', 'dom_listings'])
+    return pd.read_sql_query("""
+    SELECT month, new_listings, span_starts, span_ends, dom_days, dom_listings
+    FROM market_months
+    ORDER BY month
+    """, conn)
+
+
+def load_crawl_runs(conn, limit=500):
+    # the most recent crawls recorded by craigscraper.extensions.CrawlMetrics, oldest first
+    if not _has_table(conn, 'crawl_runs'):
+        return pd.DataFrame(columns=['run_started', 'run_finished', 'duration_seconds', 'reason'])
+    df = pd.read_sql_query("SELECT * FROM crawl_runs ORDER BY run_started DESC LIMIT ?", conn, params=(limit,))
+    for col in ['run_started', 'run_finished']:
+        df[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
+    return df.sort_values('run_started').reset_index(drop=True)
+
+
+def get_price_history(conn, listing_id):
+    query = """
+    SELECT last_updated, price
+    FROM prices
+    WHERE listing_id = ?
+    ORDER BY last_updated
+    """
+    df = pd.read_sql_query(query, conn, params=(listing_id,))
+    df['last_updated'] = pd.to_datetime(df['last_updated'], errors='coerce', utc=True)
+    return df
@@ -0,0 +1,45 @@
+"""Connections to the rents database.
+
+The crawler (pipeline, spider, page cache, notification outbox) and the Streamlit UI are separate
+processes working on the same file (see run.sh). Every connection goes through connect(), which
+puts the database in WAL mode: readers see the last committed snapshot and never block the
+crawler's commits, and the crawler never blocks a dashboard query. The UI uses read-only
+connections. checkpoint() folds the WAL back into the database file; the pipeline calls it
+periodically so the WAL doesn't keep growing while the UI is reading.
+"""
+import os
+import sqlite3
+from urllib.parse import quote
+
+
+# how long a connection waits on a lock held by the other process before raising "database is locked"
+BUSY_TIMEOUT_SECONDS = float(os.environ.get('SQLITE_BUSY_TIMEOUT_SECONDS', '30'))
+# bytes of the database file read through memory mapping instead of read() calls
+MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', str(256 * 2 ** 20)))
+
+
+def db_path(path=None):
+    return path or os.environ.get('RENTS_DB', 'rents.db')
+
+
+def connect(path=None, read_only=False, check_same_thread=True):
+    path = db_path(path)
+    if read_only:
+        # mode=ro: the UI can never take the write lock, even by accident
+        con = sqlite3.connect('file:%s?mode=ro' % quote(os.path.abspath(path)), uri=True,
+                              timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=check_same_thread)
+    else:
+        con = sqlite3.connect(path, timeout=BUSY_TIMEOUT_SECONDS, check_same_thread=check_same_thread)
+        # persistent (stored in the file), so read-only connections get WAL too
+        con.execute("PRAGMA journal_mode = WAL")
+        # in WAL mode NORMAL only syncs at checkpoints: a power loss can drop the last commits,
+        # never corrupt the database
+        con.execute("PRAGMA synchronous = NORMAL")
+    con.execute("PRAGMA mmap_size = %d" % MMAP_SIZE)
+    return con
+
+
+def checkpoint(con, mode='PASSIVE'):
+    # PASSIVE copies what it can without waiting on readers; TRUNCATE (end of a crawl) waits for
+    # them and also resets the -wal file to zero bytes. Returns (busy, wal pages, checkpointed pages).
+    return con.execute("PRAGMA wal_checkpoint(%s)" % mode).fetchone()
@@ -0,0 +1,83 @@
+"""Scrapy extensions for the rent crawler."""
+import os
+import time
+from datetime import datetime
+from dotenv import load_dotenv
+from scrapy import signals
+from termcolor import colored
+from craigscraper import metrics
+from craigscraper.db import connect
+from craigscraper.metrics import METRICS
+
+
+class CrawlMetrics:
+    # Times the downloads, counts pages and bytes, serves the METRICS registry on METRICS_PORT
+    # (once per process: a persistent crawler keeps the same endpoint across crawls) and stores
+    # each crawl's summary in the crawl_metrics and crawl_runs tables when the engine stops.
+    server = None
+
+    def __init__(self, rents_db, port, host):
+        self.rents_db = rents_db
+        self.run_started = None
+        self.started = None
+        self.reason = None
+        if port and CrawlMetrics.server is None:
+            CrawlMetrics.server = metrics.serve(port, host)
+            print(colored('Metrics on http://%s:%d/metrics' % CrawlMetrics.server.server_address[:2], 'cyan'))
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        load_dotenv()
+        extension = cls(
+            os.environ.get('RENTS_DB', 'rents.db'),
+            int(os.environ.get('METRICS_PORT', '0')),  # 0: no endpoint
+            os.environ.get('METRICS_HOST', '127.0.0.1'),
+        )
+        crawler.signals.connect(extension.spider_opened, signal=signals.spider_opened)
+        crawler.signals.connect(extension.response_downloaded, signal=signals.response_downloaded)
+        crawler.signals.connect(extension.response_received, signal=signals.response_received)
+        crawler.signals.connect(extension.spider_closed, signal=signals.spider_closed)
+        crawler.signals.connect(extension.engine_stopped, signal=signals.engine_stopped)
+        return extension
+
+    def spider_opened(self, spider):
+        METRICS.begin_run()
+        self.run_started = datetime.now().astimezone().strftime('%Y-%m-%dT%H:%M:%S%z')
+        self.started = time.monotonic()
+
+    def spider_closed(self, spider, reason):
+        self.reason = reason
+
+    def response_downloaded(self, response, request, spider):
+        # sent by the downloader itself: the body is still as it came over the wire (compressed),
+        # and pages the cache answers without a request never get here
+        METRICS.inc('bytes_downloaded', len(response.body))
+
+    def response_received(self, response, request, spider):
+        kind = 'detail_pages' if request.meta.get('detail_page') else 'search_pages'
+        if 'cached' in response.flags:
+            # answered from the page cache without a download
+            METRICS.inc('cached_pages')
+            return
+        METRICS.inc(kind)
+        if 'download_latency' in request.meta:
+            METRICS.observe('download', request.meta['download_latency'])
+
+    def engine_stopped(self):
+        # after spider_closed, so the final flush and the notifications sent so far are counted
+        if self.run_started is None:
+            return
+        run_finished = datetime.now().astimezone().strftime('%Y-%m-%dT%H:%M:%S%z')
+        con = connect(self.rents_db)
+        try:
+            metrics.save_run(con, self.run_started, run_finished)
+            metrics.save_crawl_run(con, self.run_started, run_finished, time.monotonic() - self.started, self.reason)
+            con.commit()
+        finally:
+            con.close()
+
+        stages, counters = METRICS.run_summary()
+        for stage, (count, total, p50, p95, peak) in sorted(stages.items()):
+            print(colored('%-10s %6d calls %8.2fs total  p50 %.3fs  p95 %.3fs  max %.3fs' % (stage, count, total, p50, p95, peak), 'cyan'))
+        if counters:
+            print(colored(', '.join('%s: %s' % item for item in sorted(counters.items())), 'cyan'))
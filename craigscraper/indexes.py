@@ -0,0 +1,90 @@
+"""Declared indexes for the rents database and the hot queries they exist to serve.
+
+ensure_indexes() creates missing indexes idempotently at startup. query_plans() runs
+EXPLAIN QUERY PLAN over HOT_QUERIES so a query that falls back to a full table scan or a
+temporary sort shows up at startup and in tests/test_indexes.py.
+"""
+from termcolor import colored
+
+
+# (name, table, columns). Column order matters: equality columns first, then the ORDER BY
+# column, then any extra selected columns so the lookup is answered from the index alone.
+INDEXES = [
+    ('listings_link', 'listings', ['link', 'last_price']),
+    ('listings_still_published', 'listings', ['still_published', 'link', 'last_price']),
+    ('prices_listing_updated', 'prices', ['listing_id', 'last_updated', 'price']),
+    ('listing_changes_listing_changed', 'listing_changes', ['listing_id', 'changed_at']),
+]
+
+# superseded by a wider index above
+OBSOLETE_INDEXES = ['listing_changes_ids']
+
+# (name, sql, params) for the queries the spider, pipeline and UI run on every crawl/rerun
+HOT_QUERIES = [
+    ('spider: published index',
+     "SELECT link, last_price FROM listings WHERE still_published = 'True'", ()),
+    ('spider: repriced listings',
+     "SELECT link, id, last_fetched, last_updated FROM listings WHERE link IN (?, ?)", ('a', 'b')),
+    ('spider: unpublish',
+     "UPDATE listings SET still_published = 'False' WHERE link = ?", ('a',)),
+    ('pipeline: latest prices',
+     "SELECT listing_id, price, MAX(last_updated) FROM prices WHERE listing_id IN (?, ?) GROUP BY listing_id", (1, 2)),
+    ('pipeline: price history',
+     "SELECT listing_id, price FROM prices WHERE listing_id IN (?, ?) ORDER BY listing_id DESC, last_updated DESC", (1, 2)),
+    ('ui: price history',
+     "SELECT last_updated, price FROM prices WHERE listing_id = ? ORDER BY last_updated", (1,)),
+    ('ui: listing changes',
+     "SELECT changed_at, field, old_value, new_value FROM listing_changes WHERE listing_id = ? ORDER BY changed_at", (1,)),
+]
+
+
+def index_prefixes(con, table):
+    # column lists of every existing index on `table`, including the automatic ones SQLite
+    # builds for UNIQUE constraints (e.g. prices' UNIQUE(listing_id, last_updated, price))
+    prefixes = []
+    for index in con.execute(f"PRAGMA index_list({table})").fetchall():
+        columns = [row[2] for row in con.execute(f"PRAGMA index_info({index[1]})").fetchall()]
+        prefixes.append(columns)
+    return prefixes
+
+
+def ensure_indexes(con, indexes=INDEXES):
+    for name in OBSOLETE_INDEXES:
+        con.execute(f"DROP INDEX IF EXISTS {name}")
+
+    for name, table, columns in indexes:
+        # an existing index that already starts with these columns serves the same queries;
+        # a second copy would only slow down writes
+        if any(existing[:len(columns)] == columns for existing in index_prefixes(con, table)):
+            continue
+        con.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}({', '.join(columns)})")
+        print(colored(f"Created index {name} on {table}({', '.join(columns)})", 'green'))
+
+    con.commit()
+
+
+def query_plans(con, queries=HOT_QUERIES):
+    # {query name: [EXPLAIN QUERY PLAN detail lines]}
+    plans = {}
+    for name, sql, params in queries:
+        plans[name] = [row[-1] for row in con.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()]
+    return plans
+
+
+def slow_plans(con, queries=HOT_QUERIES):
+    # queries whose plan scans a whole table or sorts in a temporary b-tree
+    slow = {}
+    for name, details in query_plans(con, queries).items():
+        for detail in details:
+            full_scan = detail.startswith('SCAN ') and ' USING ' not in detail
+            if full_scan or 'TEMP B-TREE' in detail:
+                slow[name] = details
+                break
+    return slow
+
+
+def report_query_plans(con):
+    slow = slow_plans(con)
+    for name, details in slow.items():
+        print(colored(f"Query '{name}' is not served by an index: {'; '.join(details)}", 'yellow'))
+    return slow
@@ -0,0 +1,154 @@
+"""Materialized market aggregates behind the dashboard's Market Statistics tab.
+
+Two small tables summarize the whole listings/prices history:
+
+- market_price_counts: how many price points were recorded per (month, bedrooms, price). Sorted
+  by price, a (month, bedrooms) bucket is an exact sketch of its price distribution, so medians
+  come out the same as grouping the raw price rows (market_analysis.monthly_median_rent_from_counts).
+- market_months: per month, listings posted, active spans starting and ending (an end is stored
+  on the month after a listing's last-seen month, like the difference array in
+  market_analysis.active_listings_per_month) and the days-on-market total of the listings posted.
+
+The pipeline keeps them current: every flush subtracts the contribution of the listings in the
+batch as stored before the write and adds it back as stored after, in the same transaction, so
+re-posts, price changes and corrected bedroom counts move counts between buckets without any
+rescans (reprocess does the same for the bedrooms it corrects). rebuild() recomputes both tables
+from scratch (migration).
+"""
+from collections import Counter
+from datetime import datetime
+
+
+TS_FORMAT = '%Y-%m-%dT%H:%M:%S%z'
+MONTH_FIELDS = ['new_listings', 'span_starts', 'span_ends', 'dom_days', 'dom_listings']
+
+
+def create_tables(con):
+    con.execute("""CREATE TABLE IF NOT EXISTS market_price_counts (
+        month    TEXT,
+        bedrooms REAL,
+        price    INTEGER,
+        n        INTEGER,
+        PRIMARY KEY (month, bedrooms, price)
+    )""")
+    con.execute("""CREATE TABLE IF NOT EXISTS market_months (
+        month        TEXT PRIMARY KEY,
+        new_listings INTEGER DEFAULT 0,
+        span_starts  INTEGER DEFAULT 0,
+        span_ends    INTEGER DEFAULT 0,
+        dom_days     INTEGER DEFAULT 0,
+        dom_listings INTEGER DEFAULT 0
+    )""")
+
+
+def tables_exist(con):
+    return con.execute("SELECT COUNT(*) FROM sqlite_master WHERE type = 'table' AND name IN ('market_price_counts', 'market_months')").fetchone()[0] == 2
+
+
+def _next_month(month):
+    year, mon = int(month[:4]), int(month[5:7])
+    return '%04d-%02d' % (year + mon // 12, mon % 12 + 1)
+
+
+def _parse(timestamp):
+    try:
+        return datetime.strptime(timestamp, TS_FORMAT)
+    except (TypeError, ValueError):
+        return None
+
+
+def price_counts(con, where='', params=()):
+    # the rows dashboard_queries.load_price_months returns, already counted. substr(...,1,7) for
+    # the month because SQLite's date functions can't parse the stored ISO timestamps.
+    counts = Counter()
+    cur = con.execute("""
+        SELECT substr(p.last_updated, 1, 7), l.bedrooms, p.price, COUNT(*)
+        FROM prices p
+        JOIN listings l ON l.id = p.listing_id
+        WHERE l.bedrooms IS NOT NULL AND p.price IS NOT NULL %s
+        GROUP BY 1, 2, 3""" % where, params)
+    for month, bedrooms, price, n in cur:
+        counts[(month, bedrooms, price)] += n
+    return counts
+
+
+def month_counts(con, where='', params=()):
+    # {(month, field): count} for MONTH_FIELDS, from the listings' posted_on/last_updated
+    counts = Counter()
+    cur = con.execute("SELECT posted_on, last_updated FROM listings l WHERE posted_on IS NOT NULL %s" % where, params)
+    for posted_on, last_updated in cur:
+        posted_month = posted_on[:7]
+        counts[(posted_month, 'new_listings')] += 1
+        if last_updated is not None:
+            last_month = last_updated[:7]
+            # inverted spans and unparseable months are skipped, as in active_listings_per_month
+            if last_month >= posted_month:
+                try:
+                    end_month = _next_month(last_month)
+                except ValueError:
+                    end_month = None
+                if end_month is not None:
+                    counts[(posted_month, 'span_starts')] += 1
+                    counts[(end_month, 'span_ends')] += 1
+        posted, last = _parse(posted_on), _parse(last_updated)
+        if posted is not None and last is not None:
+            counts[(posted_month, 'dom_days')] += (last - posted).days
+            counts[(posted_month, 'dom_listings')] += 1
+    return counts
+
+
+def listing_counts(con, ids, chunk_size=500):
+    # (price_counts, month_counts) of the given listings as currently stored
+    prices, months = Counter(), Counter()
+    ids = list(ids)
+    for start in range(0, len(ids), chunk_size):
+        chunk = ids[start:start + chunk_size]
+        marks = ','.join('?' * len(chunk))
+        prices.update(price_counts(con, 'AND l.id IN (%s)' % marks, chunk))
+        months.update(month_counts(con, 'AND l.id IN (%s)' % marks, chunk))
+    return prices, months
+
+
+def _subtract(after, before):
+    # Counter subtraction drops negative counts; deltas need them
+    delta = Counter(after)
+    for key, n in before.items():
+        delta[key] -= n
+    return {key: n for key, n in delta.items() if n}
+
+
+def apply_delta(con, before, after):
+    # before/after: listing_counts() of the same listings around a write
+    price_delta = _subtract(after[0], before[0])
+    con.executemany(
+        """INSERT INTO market_price_counts (month, bedrooms, price, n) VALUES (?, ?, ?, ?)
+           ON CONFLICT (month, bedrooms, price) DO UPDATE SET n = n + excluded.n""",
+        [key + (n,) for key, n in price_delta.items()]
+    )
+    con.executemany(
+        "DELETE FROM market_price_counts WHERE month = ? AND bedrooms = ? AND price = ? AND n <= 0",
+        list(price_delta)
+    )
+
+    month_delta = {}
+    for (month, field), n in _subtract(after[1], before[1]).items():
+        month_delta.setdefault(month, dict.fromkeys(MONTH_FIELDS, 0))[field] = n
+    con.executemany(
+        """INSERT INTO market_months (month, %s) VALUES (?, %s)
+           ON CONFLICT (month) DO UPDATE SET %s""" % (
+            ', '.join(MONTH_FIELDS), ', '.join('?' * len(MONTH_FIELDS)),
+            ', '.join('%s = %s + excluded.%s' % (field, field, field) for field in MONTH_FIELDS)),
+        [(month,) + tuple(values[field] for field in MONTH_FIELDS) for month, values in month_delta.items()]
+    )
+    con.executemany(
+        "DELETE FROM market_months WHERE month = ? AND %s" % ' AND '.join('%s = 0' % field for field in MONTH_FIELDS),
+        [(month,) for month in month_delta]
+    )
+
+
+def rebuild(con):
+    # recompute both tables from listings/prices; the caller commits
+    create_tables(con)
+    con.execute("DELETE FROM market_price_counts")
+    con.execute("DELETE FROM market_months")
+    apply_delta(con, (Counter(), Counter()), (price_counts(con), month_counts(con)))
@@ -2,6 +2,7 @@
 
 No scrapy/streamlit imports so this is unit-testable and importable from the UI process.
 """
+import numpy as np
 import pandas as pd
 
 MIN_POINTS_PER_BUCKET = 5  # drop (month, bedroom) medians backed by fewer price points
@@ -45,6 +46,22 @@ def pct_change_vs(median_overall_df, months_back):
     return (latest_val - prev) / prev * 100
 
 
+def price_chain_labels(prices_df):
+    # prices_df columns: listing_id, last_updated, price (the load_prices_data frame).
+    # Returns {listing_id: '$2,100→$2,000'}: each listing's prices oldest first with consecutive
+    # repeats collapsed, for listings with more than one price point. One sort and one groupby
+    # over every listing instead of a price-history query per table row.
+    if prices_df.empty:
+        return {}
+    df = prices_df.sort_values(['listing_id', 'last_updated'], kind='mergesort')
+    ids, prices = df['listing_id'], df['price']
+    multi = ids.groupby(ids).transform('size') > 1
+    changed = (ids != ids.shift()) | (prices != prices.shift())
+    kept = df[multi & changed]
+    labels = '$' + kept['price'].map('{:,.0f}'.format)
+    return labels.groupby(kept['listing_id']).agg('→'.join).to_dict()
+
+
 def _month_to_index(month_str):
     # 'YYYY-MM' -> integer month index (year*12 + month-1) for inclusive range math
     return int(month_str[:4]) * 12 + (int(month_str[5:7]) - 1)
@@ -54,19 +71,115 @@ def _index_to_month(idx):
     return '%04d-%02d' % (idx // 12, (idx % 12) + 1)
 
 
+def _months_to_index(months):
+    # vectorized _month_to_index over a Series of 'YYYY-MM' strings
+    return (months.str.slice(0, 4).astype(np.int64) * 12 + months.str.slice(5, 7).astype(np.int64) - 1).to_numpy()
+
+
 def active_listings_per_month(spans_df):
     # spans_df columns: posted_month ('YYYY-MM'), last_month ('YYYY-MM').
     # Count each listing as active in every month from posted_month through last_month inclusive.
+    # Difference array over month indices: +1 at each span's first month, -1 after its last,
+    # and the running sum is the number of active listings. O(listings + months).
     if spans_df.empty:
         return pd.DataFrame(columns=['month', 'active'])
-    counts = {}
-    for _, r in spans_df.dropna(subset=['posted_month', 'last_month']).iterrows():
-        start = _month_to_index(r['posted_month'])
-        end = _month_to_index(r['last_month'])
-        if end < start:  # defensive: ignore inverted spans
+    spans = spans_df.dropna(subset=['posted_month', 'last_month'])
+    start = _months_to_index(spans['posted_month'])
+    end = _months_to_index(spans['last_month'])
+    valid = end >= start  # defensive: ignore inverted spans
+    start, end = start[valid], end[valid]
+    ones = np.ones(len(start), dtype=np.int64)
+    return _running_active(start, ones, end + 1, ones)
+
+
+def _running_active(start, starts, stop, stops):
+    # start/stop: month indices where `starts` spans begin and `stops` spans have ended
+    if len(start) == 0:
+        return pd.DataFrame(columns=['month', 'active'])
+    first = min(start.min(), stop.min())
+    size = max(start.max(), stop.max()) - first + 1
+    events = (np.bincount(start - first, weights=starts, minlength=size)
+              - np.bincount(stop - first, weights=stops, minlength=size))
+    active = np.rint(np.cumsum(events)).astype(np.int64)
+
+    # months no span covers are left out, like before
+    idx = np.nonzero(active)[0]
+    return pd.DataFrame({
+        'month': [_index_to_month(int(first + i)) for i in idx],
+        'active': active[idx],
+    })
+
+
+# ---- readers of the materialized aggregates (craigscraper.market_aggregates) ----
+
+def median_from_counts(counts_df, keys=('month', 'bedrooms'), min_points=MIN_POINTS_PER_BUCKET):
+    # counts_df columns: month, bedrooms, price, n (the market_price_counts table). Same result
+    # as grouping the raw price points by `keys` and taking the median (average of the two middle
+    # prices for an even count), read off each bucket's cumulative counts.
+    keys = list(keys)
+    if counts_df.empty:
+        return pd.DataFrame(columns=keys + ['median_price', 'n'])
+    rows = []
+    for key, group in counts_df.sort_values('price', kind='mergesort').groupby(keys):
+        prices = group['price'].to_numpy()
+        cum = np.cumsum(group['n'].to_numpy())
+        total = int(cum[-1])
+        if total < min_points:
             continue
-        for idx in range(start, end + 1):
-            m = _index_to_month(idx)
-            counts[m] = counts.get(m, 0) + 1
-    out = pd.DataFrame(sorted(counts.items()), columns=['month', 'active'])
-    return out
+        lower = prices[np.searchsorted(cum, (total - 1) // 2, side='right')]
+        upper = prices[np.searchsorted(cum, total // 2, side='right')]
+        rows.append((key if isinstance(key, tuple) else (key,)) + ((lower + upper) / 2, total))
+    out = pd.DataFrame(rows, columns=keys + ['median_price', 'n'])
+    return out.sort_values(keys).reset_index(drop=True)
+
+
+def monthly_median_rent_from_counts(counts_df):
+    return median_from_counts(counts_df, ('month', 'bedrooms'))
+
+
+def new_listings_from_months(months_df):
+    # months_df: the market_months table
+    out = months_df.loc[months_df['new_listings'] > 0, ['month', 'new_listings']]
+    return out.rename(columns={'new_listings': 'count'}).sort_values('month').reset_index(drop=True)
+
+
+def active_listings_from_months(months_df):
+    # span ends are stored on the month after the last active one, so they go straight into
+    # the difference array
+    events = months_df[(months_df['span_starts'] != 0) | (months_df['span_ends'] != 0)]
+    index = _months_to_index(events['month'])
+    return _running_active(index, events['span_starts'].to_numpy(), index, events['span_ends'].to_numpy())
+
+
+def days_on_market_from_months(months_df):
+    # average days on market of the listings posted in each month
+    out = months_df.loc[months_df['dom_listings'] > 0, ['month', 'dom_days', 'dom_listings']]
+    out = out.assign(days_on_market=out['dom_days'] / out['dom_listings'])
+    out = out.rename(columns={'month': 'posted_month'})[['posted_month', 'days_on_market']]
+    return out.sort_values('posted_month').reset_index(drop=True)
+
+
+def _quantile_from_counts(prices, cum, q):
+    # prices sorted ascending, cum their cumulative counts: the q-quantile of the expanded values,
+    # interpolated like pandas' default
+    position = q * (int(cum[-1]) - 1)
+    lower = prices[np.searchsorted(cum, int(np.floor(position)), side='right')]
+    upper = prices[np.searchsorted(cum, int(np.ceil(position)), side='right')]
+    return lower + (upper - lower) * (position - np.floor(position))
+
+
+def price_stats_from_counts(counts_df, key='bedrooms', price='last_price'):
+    # counts_df columns: key, price, n (dashboard_queries.load_price_points). Per key: count,
+    # mean, min, quartiles and max of the expanded prices, for the snapshot table and box plot.
+    columns = [key, 'count', 'avg_price', 'min_price', 'q1_price', 'median_price', 'q3_price', 'max_price']
+    if counts_df.empty:
+        return pd.DataFrame(columns=columns)
+    rows = []
+    for value, group in counts_df.sort_values(price, kind='mergesort').groupby(key):
+        prices = group[price].to_numpy(dtype=float)
+        n = group['n'].to_numpy()
+        cum = np.cumsum(n)
+        rows.append((value, int(cum[-1]), float((prices * n).sum() / cum[-1]), prices[0],
+                     _quantile_from_counts(prices, cum, 0.25), _quantile_from_counts(prices, cum, 0.5),
+                     _quantile_from_counts(prices, cum, 0.75), prices[-1]))
+    return pd.DataFrame(rows, columns=columns).sort_values(key).reset_index(drop=True)
@@ -0,0 +1,187 @@
+"""Crawl-stage timers and counters.
+
+The spider, pipeline and notifications record into the process-wide METRICS registry:
+
+    with METRICS.timer('extract'):
+        fields = extractor(response)
+    METRICS.inc('items_written', len(batch))
+
+Stage timings are histograms with Prometheus' fixed buckets. serve() exposes the registry in the
+Prometheus text format on a local HTTP port, and save_run() stores a per-crawl summary (count,
+total, estimated p50/p95 and max per stage, plus the counters) in the crawl_metrics table, so
+throughput can be compared across runs. save_crawl_run() adds the crawl's one-line record to
+crawl_runs (duration, pages, bytes, listing diff counts, stage totals) for the dashboard. All of
+them are driven by craigscraper.extensions.CrawlMetrics.
+"""
+import json
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# upper bounds in seconds, from a cached parse to a slow notifier
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+
+
+class Histogram:
+    def __init__(self, buckets=BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        index = 0
+        while index < len(self.buckets) and value > self.buckets[index]:
+            index += 1
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q):
+        # linear interpolation inside the bucket holding the q-th observation, capped at the
+        # largest value seen (what histogram_quantile() does on the Prometheus side)
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index, n in enumerate(self.counts):
+            if n and seen + n >= rank:
+                lower = self.buckets[index - 1] if index else 0.0
+                upper = self.buckets[index] if index < len(self.buckets) else self.max
+                return min(lower + (upper - lower) * (rank - seen) / n, self.max)
+            seen += n
+        return self.max
+
+
+class Metrics:
+    def __init__(self):
+        self.lock = threading.Lock()  # notifications are delivered from worker threads
+        self.histograms = {}  # stage -> Histogram, since the process started
+        self.counters = {}
+        self.begin_run()
+
+    def begin_run(self):
+        # the per-crawl view that save_run() stores; the totals keep growing for the endpoint
+        with self.lock:
+            self.run_started = time.time()
+            self.run_histograms = {}
+            self.run_counters = {}
+
+    def observe(self, stage, seconds):
+        with self.lock:
+            for histograms in (self.histograms, self.run_histograms):
+                histograms.setdefault(stage, Histogram()).observe(seconds)
+
+    def inc(self, name, value=1):
+        with self.lock:
+            for counters in (self.counters, self.run_counters):
+                counters[name] = counters.get(name, 0) + value
+
+    @contextmanager
+    def timer(self, stage):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(stage, time.perf_counter() - started)
+
+    def run_summary(self):
+        # {stage: (count, total seconds, p50, p95, max)} and {counter: value} of the current crawl
+        with self.lock:
+            stages = {
+                stage: (h.count, h.sum, h.quantile(0.5), h.quantile(0.95), h.max)
+                for stage, h in self.run_histograms.items()
+            }
+            return stages, dict(self.run_counters)
+
+    def render(self):
+        # Prometheus text exposition format, version 0.0.4
+        with self.lock:
+            lines = ['# HELP craigscraper_stage_seconds Time spent per crawl stage.',
+                     '# TYPE craigscraper_stage_seconds histogram']
+            for stage, h in sorted(self.histograms.items()):
+                cumulative = 0
+                for bound, n in zip(h.buckets + ('+Inf',), h.counts):
+                    cumulative += n
+                    lines.append('craigscraper_stage_seconds_bucket{stage="%s",le="%s"} %d' % (stage, bound, cumulative))
+                lines.append('craigscraper_stage_seconds_sum{stage="%s"} %r' % (stage, h.sum))
+                lines.append('craigscraper_stage_seconds_count{stage="%s"} %d' % (stage, h.count))
+            for name, value in sorted(self.counters.items()):
+                lines.append('# TYPE craigscraper_%s_total counter' % name)
+                lines.append('craigscraper_%s_total %r' % (name, value))
+        return '\n'.join(lines) + '\n'
+
+
+METRICS = Metrics()
+
+
+def serve(port, host='127.0.0.1', metrics=METRICS):
+    # GET /metrics from a daemon thread; returns the server (server_address has the bound port)
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split('?')[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = metrics.render().encode()
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass  # scrapes every few seconds would drown the crawl log
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+
+def save_run(con, run_started, run_finished, metrics=METRICS):
+    # one row per stage and per counter of the crawl that just ended; the caller commits
+    con.execute("""CREATE TABLE IF NOT EXISTS crawl_metrics (
+        run_started   TEXT,
+        run_finished  TEXT,
+        metric        TEXT,
+        count         INTEGER,
+        total_seconds REAL,
+        p50_seconds   REAL,
+        p95_seconds   REAL,
+        max_seconds   REAL
+    )""")
+    stages, counters = metrics.run_summary()
+    rows = [(run_started, run_finished, stage) + values for stage, values in sorted(stages.items())]
+    rows += [(run_started, run_finished, name, value, None, None, None, None) for name, value in sorted(counters.items())]
+    con.executemany("INSERT INTO crawl_metrics VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+    return rows
+
+
+# crawl_runs columns filled straight from a run counter of the same name
+RUN_COUNTERS = ['search_pages', 'detail_pages', 'cached_pages', 'bytes_downloaded', 'listings_seen',
+                'new_listings', 'repriced_listings', 'unpublished_listings', 'items_written']
+
+
+def save_crawl_run(con, run_started, run_finished, duration_seconds, reason, metrics=METRICS):
+    # one row per crawl; the caller commits
+    con.execute("""CREATE TABLE IF NOT EXISTS crawl_runs (
+        run_started             TEXT PRIMARY KEY,
+        run_finished            TEXT,
+        duration_seconds        REAL,
+        reason                  TEXT,
+        %s,
+        new_listing_age_seconds REAL,
+        stage_seconds           TEXT
+    )""" % ',\n        '.join('%s INTEGER' % name for name in RUN_COUNTERS))
+    stages, counters = metrics.run_summary()
+    # how old new listings were when they reached the database: how fresh the scrape is
+    written = counters.get('new_listings_written')
+    age = counters.get('new_listing_age_seconds', 0) / written if written else None
+    row = (run_started, run_finished, duration_seconds, reason) + tuple(counters.get(name, 0) for name in RUN_COUNTERS) + (
+        age, json.dumps({stage: round(values[1], 3) for stage, values in sorted(stages.items())}))
+    con.execute("INSERT OR REPLACE INTO crawl_runs VALUES (%s)" % ', '.join('?' * len(row)), row)
+    return row
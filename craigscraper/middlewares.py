@@ -3,11 +3,19 @@
 # See documentation in:
 # https://docs.scrapy.org/en/latest/topics/spider-middleware.html
 
+import os
+from dotenv import load_dotenv
 from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
 
 # useful for handling different item types with a single interface
 from itemadapter import is_item, ItemAdapter
 
+from craigscraper.db import connect
+from craigscraper.page_cache import PageCache
+from craigscraper.spiders.rent import RentSpider
+
 
 class CraigscraperSpiderMiddleware:
     # Not all methods need to be defined. If a method is not defined,
@@ -101,3 +109,93 @@ class CraigscraperDownloaderMiddleware:
 
     def spider_opened(self, spider):
         spider.logger.info("Spider opened: %s" % spider.name)
+
+
+class DetailPageCacheMiddleware:
+    # Caches listing detail pages (requests flagged with meta['detail_page']) in the rents DB.
+    # Cached pages are revalidated with If-None-Match/If-Modified-Since; a 304 is answered from
+    # the cache. With DETAIL_CACHE_OFFLINE, cached pages are served without touching the network.
+    # Must sit below HttpCompressionMiddleware (590) so it stores decompressed bodies.
+    # New pages are committed DETAIL_CACHE_BATCH_SIZE at a time, in short transactions so the
+    # pipeline's writes aren't kept waiting, and the connection is closed with the spider.
+
+    def __init__(self, rents_db, offline, stats, batch_size=50):
+        self.con = connect(rents_db)
+        self.cache = PageCache(self.con)
+        self.offline = offline
+        self.stats = stats
+        self.batch_size = max(1, batch_size)
+        self.pending = []
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        if not crawler.settings.getbool('DETAIL_CACHE_ENABLED'):
+            raise NotConfigured
+        load_dotenv()
+        middleware = cls(
+            os.environ.get('RENTS_DB', 'rents.db'),
+            crawler.settings.getbool('DETAIL_CACHE_OFFLINE'),
+            crawler.stats,
+            crawler.settings.getint('DETAIL_CACHE_BATCH_SIZE', 50),
+        )
+        crawler.signals.connect(middleware.spider_closed, signal=signals.spider_closed)
+        return middleware
+
+    def flush(self):
+        if not self.pending:
+            return
+        pending, self.pending = self.pending, []
+        for args, kwargs in pending:
+            self.cache.put(*args, **kwargs)
+        self.con.commit()
+
+    def spider_closed(self, spider):
+        # a persistent crawler builds a new middleware for every crawl: don't leak its connection
+        self.flush()
+        self.con.close()
+
+    def process_request(self, request, spider):
+        if not request.meta.get('detail_page'):
+            return None
+        cached = self.cache.get(request.url)
+        if cached is None:
+            return None
+
+        etag, last_modified, encoding, body = cached
+        if self.offline:
+            self.stats.inc_value('page_cache/offline_hit')
+            return HtmlResponse(request.url, body=body, encoding=encoding, request=request, flags=['cached'])
+
+        if etag:
+            request.headers.setdefault('If-None-Match', etag)
+        if last_modified:
+            request.headers.setdefault('If-Modified-Since', last_modified)
+        return None
+
+    def process_response(self, request, response, spider):
+        if not request.meta.get('detail_page') or 'cached' in response.flags:
+            return response
+
+        if response.status == 304:
+            cached = self.cache.get(request.url)
+            if cached is not None:
+                self.stats.inc_value('page_cache/revalidated')
+                _, _, encoding, body = cached
+                return HtmlResponse(request.url, body=body, encoding=encoding, request=request, flags=['cached'])
+            return response
+
+        if response.status == 200 and isinstance(response, HtmlResponse):
+            post_id = RentSpider.post_id_pattern.search(response.text)
+            times = response.css('div.postinginfos p.postinginfo.reveal time::attr(datetime)').getall()
+            if post_id is None:
+                return response  # not a listing page parseItem can read
+            self.pending.append(((request.url, response.body, response.encoding), dict(
+                post_id = int(post_id.group('id')),
+                last_updated = times[-1] if times else None,
+                etag = response.headers.get('ETag', b'').decode('latin-1') or None,
+                last_modified = response.headers.get('Last-Modified', b'').decode('latin-1') or None,
+            )))
+            if len(self.pending) >= self.batch_size:
+                self.flush()
+            self.stats.inc_value('page_cache/stored')
+        return response
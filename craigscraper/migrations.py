@@ -0,0 +1,153 @@
+"""Versioned, run-once data repairs for the rents database.
+
+Every migration runs once, is recorded in the `schema_version` ledger and is skipped on later
+startups, so opening the pipeline no longer rescans whole tables. Add new repairs (e.g. a
+backfill for a newly added derived column) at the end of MIGRATIONS with the next version.
+"""
+import sqlite3
+from datetime import datetime
+from termcolor import colored
+from craigscraper import market_aggregates
+from craigscraper.spiders.shared_utils import SharedUtils
+
+
+def backfill_null_column(con, table_name, column_name):
+    utils = SharedUtils()
+
+    # fetch rows as dictionaries so we can rebuild the item shape findFeatures expects
+    con.row_factory = sqlite3.Row
+    special_cur = con.cursor()
+    con.row_factory = None
+
+    special_cur.execute(
+        f"SELECT id, description, attributes FROM {table_name} WHERE {column_name} IS NULL"
+    )
+    rows = special_cur.fetchall()
+    if not rows:
+        return
+
+    print(colored(f"Backfilling '{column_name}' for {len(rows)} row(s)...", 'cyan'))
+    updated = 0
+    for row in rows:
+        item = {
+            'description': row['description'] or '',
+            # attributes are stored as a ', '-joined string; findFeatures expects a list
+            'attributes': (row['attributes'] or '').split(', '),
+        }
+        new_value = utils.findFeatures(item, (column_name,))[column_name]
+        if new_value is not None:  # Only update if new_value is valid
+            con.execute(
+                f"UPDATE {table_name} SET {column_name} = ? WHERE id = ?",
+                (new_value, row['id'])
+            )
+            updated += 1
+
+    con.commit()
+    print(colored(f"Backfill complete for '{column_name}'. Updated rows: {updated}", 'green'))
+
+
+def backfill_features(con):
+    # feature columns that can be recomputed from description/attributes; also repairs rows a
+    # past bug left as NULL
+    for column_name in ['pool', 'gym', 'parking', 'ev_charging']:
+        backfill_null_column(con, 'listings', column_name)
+
+
+def backfill_rooms(con):
+    utils = SharedUtils()
+    con.row_factory = sqlite3.Row
+    special_cur = con.cursor()
+    con.row_factory = None
+
+    special_cur.execute("SELECT id, rooms FROM listings WHERE bedrooms IS NULL AND rooms IS NOT NULL")
+    rows = special_cur.fetchall()
+    if not rows:
+        return
+
+    print(colored(f"Backfilling parsed rooms for {len(rows)} row(s)...", 'cyan'))
+    updated = 0
+    for row in rows:
+        parsed = utils.parse_rooms(row['rooms'])
+        con.execute(
+            "UPDATE listings SET bedrooms = ?, bathrooms = ?, bathrooms_type = ? WHERE id = ?",
+            (parsed['bedrooms'], parsed['bathrooms'], parsed['bathrooms_type'], row['id'])
+        )
+        updated += 1
+
+    con.commit()
+    print(colored(f"Rooms backfill complete. Updated rows: {updated}", 'green'))
+
+
+def purge_consecutive_duplicate_prices(con):
+    # Older data recorded a new prices row whenever `last_updated` changed even if the price
+    # didn't, leaving consecutive same-price rows that render as fake "$X -> $X" changes.
+    # Delete each price row whose price equals the chronologically-previous row's price for
+    # the same listing. Real round-trips (2000->2100->2000) are preserved because only rows
+    # equal to their immediate predecessor are removed. The pipeline no longer writes such
+    # rows, so this only ever needs to run once.
+    con.row_factory = sqlite3.Row
+    cur = con.cursor()
+    con.row_factory = None
+
+    cur.execute("SELECT rowid, listing_id, last_updated, price FROM prices ORDER BY listing_id, last_updated")
+    to_delete = []
+    prev_listing = None
+    prev_price = None
+    for r in cur:
+        if r['listing_id'] == prev_listing and r['price'] == prev_price:
+            to_delete.append(r['rowid'])
+        else:
+            prev_listing = r['listing_id']
+            prev_price = r['price']
+
+    if not to_delete:
+        return
+
+    print(colored(f"Purging {len(to_delete)} consecutive-duplicate price row(s)...", 'cyan'))
+    cur.executemany("DELETE FROM prices WHERE rowid = ?", [(rid,) for rid in to_delete])
+    con.commit()
+    print(colored(f"Price dedup complete. Deleted rows: {len(to_delete)}", 'green'))
+
+
+def build_market_aggregates(con):
+    # the pipeline only updates the aggregates for the listings it writes; fill them once from
+    # the existing history
+    print(colored("Building market aggregates...", 'cyan'))
+    market_aggregates.rebuild(con)
+    con.commit()
+    months = con.execute("SELECT COUNT(*) FROM market_months").fetchone()[0]
+    print(colored(f"Market aggregates built. Months: {months}", 'green'))
+
+
+# (version, name, migration); append only, never renumber or reorder
+MIGRATIONS = [
+    (1, 'backfill_features', backfill_features),
+    (2, 'backfill_rooms', backfill_rooms),
+    (3, 'purge_consecutive_duplicate_prices', purge_consecutive_duplicate_prices),
+    (4, 'build_market_aggregates', build_market_aggregates),
+]
+
+
+def applied_versions(con):
+    con.execute("""CREATE TABLE IF NOT EXISTS schema_version (
+        version    INTEGER PRIMARY KEY,
+        name       TEXT,
+        applied_at TEXT
+    )""")
+    return {row[0] for row in con.execute("SELECT version FROM schema_version")}
+
+
+def apply_migrations(con, migrations=MIGRATIONS):
+    # run every migration that isn't in the ledger yet, in version order. A migration that
+    # crashes halfway is not recorded and reruns next startup, so each one must be idempotent.
+    applied = applied_versions(con)
+    for version, name, migration in sorted(migrations, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        print(colored(f"Applying migration {version}: {name}", 'cyan'))
+        migration(con)
+        con.execute(
+            "INSERT INTO schema_version (version, name, applied_at) VALUES (?, ?, ?)",
+            (version, name, datetime.now().astimezone().strftime('%Y-%m-%dT%H:%M:%S%z'))
+        )
+        con.commit()
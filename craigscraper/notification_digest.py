@@ -0,0 +1,76 @@
+"""Coalesces notification events into digest messages.
+
+Used by Notifications when NOTIFICATION_DIGEST=True: instead of one message per new or repriced
+listing, events are buffered and sent as one summary every `max_events` events, once the oldest
+buffered event is `max_seconds` old (a timer thread checks, so a quiet crawl still sends it), and
+when the crawl closes.
+"""
+import threading
+import time
+
+
+# a digest carries the most severe type among its events
+SEVERITY = ['info', 'success', 'warning', 'failure']
+
+
+class NotificationDigest:
+    def __init__(self, send, max_events=25, max_seconds=600, timer=threading.Timer):
+        # send(title, body, notify_type, body_format): delivers one message (to every transport).
+        # It may be called from the timer thread.
+        self.send = send
+        self.max_events = max(1, max_events)
+        self.max_seconds = max_seconds
+        self.timer = timer
+        self.events = []
+        self.started = None
+        self.pending_timer = None
+        self.lock = threading.Lock()
+
+    def add(self, title, body, notify_type=None, body_format=None, summary=None):
+        # summary: the event's line(s) in a digest; defaults to the title followed by the body
+        with self.lock:
+            if not self.events:
+                self.started = time.monotonic()
+                self._schedule(self.max_seconds)
+            self.events.append((title, body, notify_type, body_format, summary or '%s\n%s' % (title, body)))
+            due = len(self.events) >= self.max_events or time.monotonic() - self.started >= self.max_seconds
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self.lock:
+            if self.pending_timer is not None:
+                self.pending_timer.cancel()
+                self.pending_timer = None
+            if not self.events:
+                return
+            events, self.events = self.events, []
+
+        # a lone event goes out exactly as it would have without the digest
+        if len(events) == 1:
+            title, body, notify_type, body_format, _ = events[0]
+            self.send(title, body, notify_type, body_format)
+            return
+
+        title = 'Craigscraper: %d updates' % len(events)
+        body = '\n\n'.join(summary for _, _, _, _, summary in events)
+        self.send(title, body, most_severe(notify_type for _, _, notify_type, _, _ in events), 'text')
+
+    def _schedule(self, seconds):
+        # called with the lock held, when the first event of a buffer arrives
+        self.pending_timer = self.timer(max(0, seconds), self._on_timer)
+        self.pending_timer.daemon = True  # never keeps the process alive
+        self.pending_timer.start()
+
+    def _on_timer(self):
+        with self.lock:
+            # a timer that fired just as its buffer was flushed: the next buffer has its own
+            if not self.events or time.monotonic() - self.started < self.max_seconds:
+                return
+        self.flush()
+
+
+def most_severe(notify_types):
+    values = [str(getattr(t, 'value', t)) for t in notify_types if t is not None]
+    known = [value for value in values if value in SEVERITY]
+    return max(known, key=SEVERITY.index) if known else None
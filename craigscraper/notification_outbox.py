@@ -0,0 +1,205 @@
+"""Persistent, non-blocking outbox for notifications.
+
+notify() stores one row per transport in the rents DB and returns right away; a small thread pool
+delivers the rows off the reactor thread, with a concurrency cap per transport and exponential
+backoff on failure. Rows are deleted once sent, so anything left in the table after a crash or a
+kill is picked up again by the next process (see resume()).
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from termcolor import colored
+from craigscraper.db import connect
+from craigscraper.metrics import METRICS
+
+
+class NotificationOutbox:
+    def __init__(self, senders, db_path, workers=4, per_transport=1, max_attempts=5,
+                 retry_seconds=30, max_retry_seconds=3600):
+        # senders: {transport key: object with notify(title=, body=, notify_type=, body_format=) -> bool}
+        self.senders = senders
+        self.db_path = db_path
+        self.max_attempts = max(1, max_attempts)
+        self.retry_seconds = retry_seconds
+        self.max_retry_seconds = max_retry_seconds
+
+        self.con = None  # opened on first use, so merely configuring notifications doesn't create the DB
+        self.db_lock = threading.Lock()
+        self.idle = threading.Condition()
+        self.inflight = 0  # rows queued, waiting on a retry timer or being delivered
+        self.timers = set()
+        self.closed = False
+
+        self.executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='notify')
+        # e.g. one message at a time per Telegram bot, while email and others send in parallel
+        self.transport_slots = {key: threading.BoundedSemaphore(max(1, per_transport)) for key in senders}
+
+        # deliver whatever a previous process left behind
+        if os.path.exists(db_path):
+            self.resume()
+
+    def connection(self):
+        if self.con is None:
+            self.con = connect(self.db_path, check_same_thread=False)
+            self.con.execute("""CREATE TABLE IF NOT EXISTS notification_outbox (
+                id              INTEGER PRIMARY KEY AUTOINCREMENT,
+                transport       TEXT,
+                title           TEXT,
+                body            TEXT,
+                notify_type     TEXT,
+                body_format     TEXT,
+                status          TEXT DEFAULT 'pending',
+                attempts        INTEGER DEFAULT 0,
+                next_attempt_at REAL,
+                last_error      TEXT,
+                created_at      TEXT
+            )""")
+            self.con.commit()
+        return self.con
+
+    def notify(self, title, body, notify_type=None, body_format=None):
+        # called from the reactor thread (or the digest's timer): a local insert, never a network call
+        if not self.senders:
+            return
+        created_at = datetime.now().astimezone().strftime('%Y-%m-%dT%H:%M:%S%z')
+        row_ids = []
+        with self.db_lock:
+            con = self.connection()
+            for key in self.senders:
+                cur = con.execute(
+                    "INSERT INTO notification_outbox (transport, title, body, notify_type, body_format, next_attempt_at, created_at) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (key, title, body, _plain(notify_type), _plain(body_format), time.time(), created_at)
+                )
+                row_ids.append(cur.lastrowid)
+            con.commit()
+        for row_id in row_ids:
+            self.schedule(row_id, 0)
+
+    def resume(self):
+        # a new process is a fresh chance: retry leftovers right away instead of honouring the
+        # backoff the previous process had scheduled
+        with self.db_lock:
+            rows = self.connection().execute(
+                "SELECT id FROM notification_outbox WHERE status = 'pending' ORDER BY id"
+            ).fetchall()
+        if rows:
+            print(colored('NOTIFICATIONS: resuming %d undelivered notification(s)' % len(rows), 'yellow'))
+        for (row_id,) in rows:
+            self.schedule(row_id, 0)
+
+    def schedule(self, row_id, delay):
+        with self.idle:
+            if self.closed:
+                return
+            self.inflight += 1
+        if delay <= 0:
+            self.executor.submit(self.deliver, row_id)
+        else:
+            timer = threading.Timer(delay, self.on_timer, (row_id,))
+            timer.daemon = True
+            with self.idle:
+                self.timers.add(timer)
+            timer.start()
+
+    def on_timer(self, row_id):
+        with self.idle:
+            self.timers = {t for t in self.timers if t.is_alive() and t is not threading.current_thread()}
+            if self.closed:
+                return
+        self.executor.submit(self.deliver, row_id)
+
+    def deliver(self, row_id):
+        try:
+            with self.db_lock:
+                row = self.connection().execute(
+                    "SELECT transport, title, body, notify_type, body_format, attempts FROM notification_outbox WHERE id = ? AND status = 'pending'",
+                    (row_id,)
+                ).fetchone()
+            if row is None:
+                return
+            transport, title, body, notify_type, body_format, attempts = row
+
+            sender = self.senders.get(transport)
+            if sender is None:
+                # the notifications config changed since this row was queued
+                self.give_up(row_id, 'transport no longer configured')
+                return
+
+            error = None
+            with self.transport_slots[transport]:
+                try:
+                    kwargs = {'title': title, 'body': body}
+                    if notify_type:
+                        kwargs['notify_type'] = notify_type
+                    if body_format:
+                        kwargs['body_format'] = body_format
+                    with METRICS.timer('notify'):
+                        sent = sender.notify(**kwargs)
+                    if not sent:
+                        error = 'transport reported failure'
+                except Exception as e:
+                    error = repr(e)
+            METRICS.inc('notifications_failed' if error else 'notifications_sent')
+
+            if error is None:
+                with self.db_lock:
+                    self.con.execute("DELETE FROM notification_outbox WHERE id = ?", (row_id,))
+                    self.con.commit()
+                return
+
+            attempts += 1
+            if attempts >= self.max_attempts:
+                self.give_up(row_id, error, attempts)
+                return
+            delay = min(self.retry_seconds * 2 ** (attempts - 1), self.max_retry_seconds)
+            with self.db_lock:
+                self.con.execute(
+                    "UPDATE notification_outbox SET attempts = ?, next_attempt_at = ?, last_error = ? WHERE id = ?",
+                    (attempts, time.time() + delay, error, row_id)
+                )
+                self.con.commit()
+            print(colored('NOTIFICATIONS: delivery failed (%s), retrying in %ds' % (error, delay), 'yellow'))
+            self.schedule(row_id, delay)
+        finally:
+            self.done()
+
+    def give_up(self, row_id, error, attempts=None):
+        # kept as 'failed' rather than deleted, so lost alerts can be inspected
+        with self.db_lock:
+            self.con.execute(
+                "UPDATE notification_outbox SET status = 'failed', attempts = COALESCE(?, attempts), last_error = ? WHERE id = ?",
+                (attempts, error, row_id)
+            )
+            self.con.commit()
+        print(colored('NOTIFICATIONS: giving up on a notification (%s)' % error, 'red'))
+
+    def done(self):
+        with self.idle:
+            self.inflight -= 1
+            if self.inflight == 0:
+                self.idle.notify_all()
+
+    def drain(self, timeout=None):
+        # wait until nothing is queued or waiting for a retry; True if the outbox emptied in time.
+        # Whatever is still pending stays in the DB for the next process.
+        with self.idle:
+            return self.idle.wait_for(lambda: self.inflight == 0, timeout)
+
+    def close(self):
+        with self.idle:
+            self.closed = True
+            for timer in self.timers:
+                timer.cancel()
+            self.timers = set()
+        self.executor.shutdown(wait=True)
+        with self.db_lock:
+            if self.con is not None:
+                self.con.close()
+                self.con = None
+
+
+def _plain(value):
+    # apprise's NotifyType/NotifyFormat may be plain strings or enums depending on the version
+    return None if value is None else str(getattr(value, 'value', value))
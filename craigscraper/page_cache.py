@@ -0,0 +1,165 @@
+"""Listing detail pages cached in the rents database.
+
+Bodies are stored zlib-compressed in page_cache, keyed by post id and last_updated; only the
+newest version of each listing is kept. page_validators maps each URL to that version and the
+validators (ETag/Last-Modified) DetailPageCacheMiddleware uses to send conditional requests. Cached pages
+can also be re-parsed offline:
+
+    python -m craigscraper.page_cache reparse [--write]
+
+--write only refreshes the parsed content of listings already stored; publication state, prices,
+distance and last_fetched stay as the crawler left them.
+"""
+import argparse
+import zlib
+from datetime import datetime
+from craigscraper import market_aggregates
+from craigscraper.db import connect
+
+
+# listings columns reparse --write refreshes, all of them parsed from the detail page alone.
+# distance isn't one: it is measured from the searches that returned the listing, which a reparse doesn't know
+CONTENT_COLUMNS = ['rooms', 'bedrooms', 'bathrooms', 'bathrooms_type', 'available_on', 'size', 'attributes',
+                   'description', 'title', 'gym', 'pool', 'parking', 'ev_charging']
+
+
+class PageCache:
+    # put() doesn't commit: the caller batches pages into its own transactions
+    def __init__(self, con):
+        self.con = con
+        self.con.execute("""CREATE TABLE IF NOT EXISTS page_cache (
+            post_id      INTEGER,
+            last_updated TEXT,
+            url          TEXT,
+            encoding     TEXT,
+            body         BLOB,
+            fetched_at   TEXT,
+            PRIMARY KEY (post_id, last_updated)
+        )""")
+        self.con.execute("""CREATE TABLE IF NOT EXISTS page_validators (
+            url           TEXT PRIMARY KEY,
+            post_id       INTEGER,
+            last_updated  TEXT,
+            etag          TEXT,
+            last_modified TEXT
+        )""")
+        self.con.commit()
+
+    def get(self, url):
+        # (etag, last_modified, encoding, body) of the URL's latest version, or None
+        row = self.con.execute("""
+            SELECT v.etag, v.last_modified, p.encoding, p.body FROM page_validators v
+            JOIN page_cache p ON p.post_id = v.post_id AND p.last_updated = v.last_updated
+            WHERE v.url = ?""", (url,)
+        ).fetchone()
+        if row is None:
+            return None
+        etag, last_modified, encoding, body = row
+        return etag, last_modified, encoding, zlib.decompress(body)
+
+    def get_by_post(self, post_id, last_updated):
+        row = self.con.execute(
+            "SELECT url, encoding, body FROM page_cache WHERE post_id = ? AND last_updated = ?",
+            (post_id, last_updated)
+        ).fetchone()
+        if row is None:
+            return None
+        url, encoding, body = row
+        return url, encoding, zlib.decompress(body)
+
+    def put(self, url, body, encoding, post_id=None, last_updated=None, etag=None, last_modified=None):
+        # a page without a post id isn't a listing parseItem can read: not cached
+        if post_id is None:
+            return False
+        last_updated = last_updated or ''
+        self.con.execute(
+            "INSERT OR REPLACE INTO page_cache (post_id, last_updated, url, encoding, body, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (post_id, last_updated, url, encoding, zlib.compress(body, 6),
+             datetime.now().astimezone().strftime('%Y-%m-%dT%H:%M:%S%z'))
+        )
+        self.con.execute(
+            "INSERT OR REPLACE INTO page_validators (url, post_id, last_updated, etag, last_modified) VALUES (?, ?, ?, ?, ?)",
+            (url, post_id, last_updated, etag, last_modified)
+        )
+        # keep only the newest version of the listing (a late, older page doesn't replace it)
+        for table in ('page_cache', 'page_validators'):
+            self.con.execute(
+                "DELETE FROM %s WHERE post_id = ? AND last_updated < (SELECT MAX(last_updated) FROM page_cache WHERE post_id = ?)" % table,
+                (post_id, post_id)
+            )
+        return True
+
+    def cached_responses(self):
+        # every cached listing as an HtmlResponse, ready for RentSpider.parseItem
+        from scrapy.http import HtmlResponse, Request
+
+        cursor = self.con.execute("SELECT url, encoding, body FROM page_cache ORDER BY post_id")
+        for url, encoding, body in cursor:
+            yield HtmlResponse(
+                url, body=zlib.decompress(body), encoding=encoding or 'utf-8',
+                request=Request(url, meta={'link': url}), flags=['cached']
+            )
+
+
+def write_content(con, items, chunk_size=500):
+    # refresh CONTENT_COLUMNS of the listings already stored; returns the number of rows updated.
+    # The market aggregates bucket prices by bedrooms, so they follow the change.
+    update = "UPDATE listings SET %s WHERE id = ?" % ', '.join('%s = ?' % column for column in CONTENT_COLUMNS)
+    aggregates = market_aggregates.tables_exist(con)
+    updated = 0
+    for start in range(0, len(items), chunk_size):
+        chunk = items[start:start + chunk_size]
+        ids = list({item['id'] for item in chunk})
+        before = market_aggregates.listing_counts(con, ids) if aggregates else None
+        rows = [
+            tuple(', '.join(item[column]) if column == 'attributes' else item.get(column) for column in CONTENT_COLUMNS) + (item['id'],)
+            for item in chunk
+        ]
+        updated += con.executemany(update, rows).rowcount
+        if aggregates:
+            market_aggregates.apply_delta(con, before, market_aggregates.listing_counts(con, ids))
+        con.commit()
+    return updated
+
+
+def reparse(write=False):
+    from types import SimpleNamespace
+    from dotenv import load_dotenv
+    from termcolor import colored
+    from craigscraper.spiders.rent import RentSpider
+
+    load_dotenv()
+    con = connect()
+    cache = PageCache(con)
+
+    # offline: no test notification
+    RentSpider.test_notification_sent = True
+    spider = RentSpider(notifications=SimpleNamespace(apobj=None))
+
+    items = []
+    failed = 0
+    for response in cache.cached_responses():
+        try:
+            items.extend(spider.parseItem(response))
+        except Exception as e:
+            failed += 1
+            print(colored('Could not parse %s: %r' % (response.url, e), 'red'))
+
+    if write:
+        updated = write_content(con, items)
+        print(colored('Updated %s stored listing(s)' % updated, 'green'))
+    else:
+        for item in items:
+            print(item['id'], item['price'], item['title'])
+    con.close()
+    print(colored('Re-parsed %s cached page(s), %s failed' % (len(items), failed), 'green' if not failed else 'yellow'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    reparse_parser = sub.add_parser('reparse', help='run parseItem over every cached detail page')
+    reparse_parser.add_argument('--write', action='store_true', help='write the parsed items to the database')
+    args = parser.parse_args()
+    if args.command == 'reparse':
+        reparse(write=args.write)
@@ -6,25 +6,70 @@
 
 # useful for handling different item types with a single interface
 from itemadapter import ItemAdapter
-import sqlite3
 import os
+import time
+from datetime import datetime
 from dotenv import load_dotenv
 from apprise import NotifyType
 from apprise import NotifyFormat
 from termcolor import colored
-from craigscraper.spiders.shared_utils import SharedUtils
+from twisted.internet import task
+from craigscraper import market_aggregates
+from craigscraper.db import checkpoint, connect
+from craigscraper.indexes import ensure_indexes, report_query_plans
+from craigscraper.metrics import METRICS
+from craigscraper.migrations import apply_migrations
+
+
+# content fields whose edits are recorded in listing_changes (forward-only history)
+TRACKED_FIELDS = ['title', 'description', 'attributes', 'available_on', 'size', 'rooms']
+
+# stored fields a price-only item (see RentSpider.price_only_item) is notified with
+NOTIFY_FIELDS = ['link', 'title', 'description', 'available_on', 'size', 'distance', 'gym', 'pool', 'parking']
+
+
+def chunked(values, size=500):
+    # keep `IN (...)` lists well below SQLite's bound-variable limit
+    values = list(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
 
 
 class CraigscraperPipeline:
+    # One connection per database file per process. A persistent crawler (main.py with
+    # PERSISTENT_CRAWLER=True) builds a new pipeline for every crawl; those reuse the warm
+    # connection and skip the schema checks and backfills that already ran.
+    shared_connections = {}
+
     def __init__(self):
 
         load_dotenv()
         rents_db = os.environ.get('RENTS_DB', 'rents.db')
 
-        # initialize sqlite
-        self.con = sqlite3.connect(rents_db)
-        self.cur = self.con.cursor()
-
+        if rents_db in self.shared_connections:
+            self.con = self.shared_connections[rents_db]
+            self.cur = self.con.cursor()
+        else:
+            # initialize sqlite
+            self.con = connect(rents_db)
+            self.cur = self.con.cursor()
+            self.prepare_schema()
+            self.shared_connections[rents_db] = self.con
+
+        # Buffered writes: items are collected in memory and written in a single transaction
+        # once the batch holds PIPELINE_BATCH_SIZE items or is PIPELINE_BATCH_SECONDS old, and
+        # on close_spider. PIPELINE_BATCH_SIZE=1 behaves like the old commit-per-item path.
+        self.batch_size = max(1, int(os.environ.get('PIPELINE_BATCH_SIZE', '50')))
+        self.batch_seconds = float(os.environ.get('PIPELINE_BATCH_SECONDS', '30'))
+        self.batch = []
+        self.batch_started = None
+        self.flush_loop = None
+
+        # fold the WAL back into the database every WAL_CHECKPOINT_SECONDS (see craigscraper.db)
+        self.checkpoint_seconds = float(os.environ.get('WAL_CHECKPOINT_SECONDS', '300'))
+        self.last_checkpoint = time.monotonic()
+
+    def prepare_schema(self):
         listing_columns = [
             "id INTEGER PRIMARY KEY",
             "link TEXT",
@@ -45,7 +90,8 @@ class CraigscraperPipeline:
             "last_price INTEGER",
             "last_updated TEXT",
             "posted_on TEXT",
-            "still_published TEXT"
+            "still_published TEXT",
+            "last_fetched TEXT"  # when the detail page was last parsed (NULL: before this column existed)
         ]
 
         prices_columns = [
@@ -69,42 +115,26 @@ class CraigscraperPipeline:
             new_value  TEXT,
             changed_at TEXT
         )""")
-        self.cur.execute("""CREATE INDEX IF NOT EXISTS listing_changes_ids ON listing_changes(listing_id)""")
         self.con.commit()
 
-        self.backfill_rooms()
-        self.purge_consecutive_duplicate_prices()
-
-    def purge_consecutive_duplicate_prices(self):
-        # One-time cleanup: older data recorded a new prices row whenever `last_updated`
-        # changed even if the price didn't, leaving consecutive same-price rows that render
-        # as fake "$X -> $X" changes. Delete each price row whose price equals the
-        # chronologically-previous row's price for the same listing. Idempotent: once clean,
-        # it deletes nothing. Real round-trips (2000->2100->2000) are preserved because only
-        # rows equal to their immediate predecessor are removed.
-        self.con.row_factory = sqlite3.Row
-        cur = self.con.cursor()
-        self.con.row_factory = None
-
-        cur.execute("SELECT rowid, listing_id, last_updated, price FROM prices ORDER BY listing_id, last_updated")
-        rows = cur.fetchall()
-        to_delete = []
-        prev_listing = None
-        prev_price = None
-        for r in rows:
-            if r['listing_id'] == prev_listing and r['price'] == prev_price:
-                to_delete.append(r['rowid'])
-            else:
-                prev_listing = r['listing_id']
-                prev_price = r['price']
+        # indexes for the spider/pipeline/UI hot queries; warn if any of them still scans a table
+        ensure_indexes(self.con)
+        report_query_plans(self.con)
 
-        if not to_delete:
-            return
+        # one-time repairs; each runs once and is recorded in the schema_version ledger
+        apply_migrations(self.con)
 
-        print(colored(f"Purging {len(to_delete)} consecutive-duplicate price row(s)...", 'cyan'))
-        cur.executemany("DELETE FROM prices WHERE rowid = ?", [(rid,) for rid in to_delete])
-        self.con.commit()
-        print(colored(f"Price dedup complete. Deleted rows: {len(to_delete)}", 'green'))
+    def open_spider(self, spider):
+        # flush on a timer too, so a slow trickle of items doesn't sit in memory until the
+        # crawl ends (the size check in process_item only fires when a new item arrives)
+        self.flush_loop = task.LoopingCall(self.flush_on_timer, spider)
+        self.flush_loop.start(self.batch_seconds, now=False)
+
+    def close_spider(self, spider):
+        if self.flush_loop is not None and self.flush_loop.running:
+            self.flush_loop.stop()
+        self.flush(spider)
+        checkpoint(self.con, 'TRUNCATE')
 
     def create_table_if_not_exists(self, table_name, columns, constraints=None):
         # Create table if it doesn't exist
@@ -119,10 +149,8 @@ class CraigscraperPipeline:
         self.cur.execute(f"PRAGMA table_info({table_name});")
         existing_columns = {column[1] for column in self.cur.fetchall()}
 
-        # Columns that can be recomputed from description/attributes
-        reprocessable_columns = ['pool', 'gym', 'parking', 'ev_charging']
-
-        # Add missing columns
+        # Add missing columns. A newly added derived column starts out NULL; backfill it with a
+        # new entry in craigscraper.migrations.MIGRATIONS rather than here.
         for column in columns:
             column_name = column.split()[0]
             if column_name not in existing_columns:
@@ -132,191 +160,241 @@ class CraigscraperPipeline:
 
         self.con.commit()
 
-        # Backfill any reprocessable columns that still hold NULL values. This runs on
-        # every startup but is idempotent: once every row is populated the SELECT matches
-        # nothing, so it's a cheap no-op. It also repairs rows a past bug left as NULL.
-        wanted_columns = {c.split()[0] for c in columns}
-        for column_name in reprocessable_columns:
-            if column_name in wanted_columns:
-                self.backfill_null_column(table_name, column_name)
+    def process_item(self, item, spider):
+        if not self.batch:
+            self.batch_started = time.monotonic()
+        self.batch.append(item)
 
-    def backfill_null_column(self, table_name, column_name):
-        utils = SharedUtils()
+        if len(self.batch) >= self.batch_size:
+            self.flush(spider)
+        else:
+            self.flush_if_stale(spider)
 
-        # fetch rows as dictionaries so we can rebuild the item shape findFeature expects
-        self.con.row_factory = sqlite3.Row
-        special_cur = self.con.cursor()
-        self.con.row_factory = None
+        return item
 
-        special_cur.execute(
-            f"SELECT id, description, attributes FROM {table_name} WHERE {column_name} IS NULL"
-        )
-        rows = special_cur.fetchall()
-        if not rows:
+    def flush_if_stale(self, spider):
+        if self.batch and time.monotonic() - self.batch_started >= self.batch_seconds:
+            self.flush(spider)
+        if time.monotonic() - self.last_checkpoint >= self.checkpoint_seconds:
+            checkpoint(self.con)
+            self.last_checkpoint = time.monotonic()
+
+    def flush_on_timer(self, spider):
+        # an exception would stop the LoopingCall for good: report it and keep flushing on schedule
+        try:
+            self.flush_if_stale(spider)
+        except Exception as e:
+            print(colored('Timed pipeline flush failed, retrying in %ss: %r' % (self.batch_seconds, e), 'red'))
+
+    def flush(self, spider):
+        if not self.batch:
             return
+        batch, self.batch = self.batch, []
+        ids = list({item['id'] for item in batch})
+        write_started = time.perf_counter()
+        try:
+            self.write_batch(batch, ids)
+        except Exception:
+            # nothing of a failed batch is kept: undo its writes (so the next commit can't save
+            # them half-applied) and queue it again ahead of the items that arrived since
+            self.con.rollback()
+            self.batch = batch + self.batch
+            print(colored('Could not write %s item(s), they stay queued for the next flush' % len(batch), 'red'))
+            raise
+        METRICS.observe('db_write', time.perf_counter() - write_started)
+        METRICS.inc('items_written', len(batch))
 
-        print(colored(f"Backfilling '{column_name}' for {len(rows)} row(s)...", 'cyan'))
-        updated = 0
-        for row in rows:
-            item = {
-                'description': row['description'] or '',
-                # attributes are stored as a ', '-joined string; findFeature expects a list
-                'attributes': (row['attributes'] or '').split(', '),
-            }
-            new_value = utils.findFeature(column_name, item)
-            if new_value is not None:  # Only update if new_value is valid
-                self.con.execute(
-                    f"UPDATE {table_name} SET {column_name} = ? WHERE id = ?",
-                    (new_value, row['id'])
+        # send notifications only if it's not the the first run (file exists)
+        if not spider.first_run:
+            # fetch the price history of the whole batch at once, most recent to oldest
+            price_history = {}
+            for chunk in chunked(ids):
+                self.cur.execute(
+                    "SELECT listing_id, price FROM prices WHERE listing_id IN (%s) ORDER BY listing_id DESC, last_updated DESC" % ','.join('?' * len(chunk)),
+                    chunk
                 )
-                updated += 1
-
-        self.con.commit()
-        print(colored(f"Backfill complete for '{column_name}'. Updated rows: {updated}", 'green'))
-
-    def backfill_rooms(self):
-        utils = SharedUtils()
-        self.con.row_factory = sqlite3.Row
-        special_cur = self.con.cursor()
-        self.con.row_factory = None
-
-        special_cur.execute("SELECT id, rooms FROM listings WHERE bedrooms IS NULL AND rooms IS NOT NULL")
-        rows = special_cur.fetchall()
-        if not rows:
-            return
+                for listing_id, price in self.cur.fetchall():
+                    price_history.setdefault(listing_id, []).append(price)
+
+            # price-only items carry no listing details: notify with the stored ones
+            stored_details = {}
+            price_only_ids = [item['id'] for item in batch if item.get('price_only')]
+            for chunk in chunked(price_only_ids):
+                self.cur.execute(
+                    "SELECT id, %s FROM listings WHERE id IN (%s)" % (', '.join(NOTIFY_FIELDS), ','.join('?' * len(chunk))),
+                    chunk
+                )
+                for row in self.cur.fetchall():
+                    stored_details[row[0]] = dict(zip(NOTIFY_FIELDS, row[1:]))
+
+            for item in batch:
+                if item.get('price_only'):
+                    if item['id'] not in stored_details:
+                        continue
+                    item = dict(stored_details[item['id']], **item)
+                self.notify_item(item, price_history.get(item['id'], []), spider)
+        else:
+            print(colored('CRAIGSCRAPER RAN FOR THE FIRST TIME, NOTIFICATIONS HAVE BEEN SUPPRESSED', 'magenta'))
 
-        print(colored(f"Backfilling parsed rooms for {len(rows)} row(s)...", 'cyan'))
-        updated = 0
-        for row in rows:
-            parsed = utils.parse_rooms(row['rooms'])
-            self.con.execute(
-                "UPDATE listings SET bedrooms = ?, bathrooms = ?, bathrooms_type = ? WHERE id = ?",
-                (parsed['bedrooms'], parsed['bathrooms'], parsed['bathrooms_type'], row['id'])
+    def write_batch(self, batch, ids):
+        # the batch's writes, committed as one transaction (flush rolls back if any of them fails)
+        # one round-trip for the stored snapshot of every listing in the batch...
+        stored_rows = {}
+        for chunk in chunked(ids):
+            self.cur.execute(
+                "SELECT id, title, description, attributes, available_on, size, rooms FROM listings WHERE id IN (%s)" % ','.join('?' * len(chunk)),
+                chunk
             )
-            updated += 1
+            for row in self.cur.fetchall():
+                stored_rows[row[0]] = dict(zip(TRACKED_FIELDS, row[1:]))
 
-        self.con.commit()
-        print(colored(f"Rooms backfill complete. Updated rows: {updated}", 'green'))
-
-    def create_indexes_if_not_exist(self):
-        self.cur.execute("""CREATE UNIQUE INDEX IF NOT EXISTS listings_ids ON listings(id)""")
-        self.cur.execute("""CREATE UNIQUE INDEX IF NOT EXISTS listings_links ON listings(link)""")
-        self.cur.execute("""CREATE INDEX IF NOT EXISTS prices_ids ON prices(listing_id)""")
-
-    def process_item(self, item, spider):
-        # record content-field edits before we overwrite the stored row (forward-only history)
-        tracked_fields = ['title', 'description', 'attributes', 'available_on', 'size', 'rooms']
-        incoming = {
-            'title': item['title'],
-            'description': item['description'],
-            'attributes': ', '.join(item['attributes']),  # stored form
-            'available_on': item['available_on'],
-            'size': item['size'],
-            'rooms': item['rooms'],
-        }
-        self.cur.execute(
-            "SELECT title, description, attributes, available_on, size, rooms FROM listings WHERE id = ?",
-            (item['id'],)
+        # ...and one for their most recent recorded price (SQLite returns the bare `price`
+        # column from the row holding MAX(last_updated))
+        latest_prices = {}
+        for chunk in chunked(ids):
+            self.cur.execute(
+                "SELECT listing_id, price, MAX(last_updated) FROM prices WHERE listing_id IN (%s) GROUP BY listing_id" % ','.join('?' * len(chunk)),
+                chunk
+            )
+            for listing_id, price, _ in self.cur.fetchall():
+                latest_prices[listing_id] = price
+
+        fetched_at = datetime.now().astimezone().strftime('%Y-%m-%dT%H:%M:%S%z')
+        changes = []
+        listing_rows = []
+        repriced_rows = []
+        price_rows = []
+        new_listing_ages = []  # counted once the batch is committed
+        for item in batch:
+            if item.get('price_only'):
+                # a repriced listing updated from its search result: only the price moves. Its
+                # last_updated is the detail page's; the prices row is stamped when it was seen
+                repriced_rows.append((item['price'], item['id']))
+                if item['id'] not in latest_prices or latest_prices[item['id']] != item['price']:
+                    price_rows.append((item['id'], item['seen_at'], item['price']))
+                    latest_prices[item['id']] = item['price']
+                continue
+
+            # record content-field edits before we overwrite the stored row (forward-only history)
+            incoming = {
+                'title': item['title'],
+                'description': item['description'],
+                'attributes': ', '.join(item['attributes']),  # stored form
+                'available_on': item['available_on'],
+                'size': item['size'],
+                'rooms': item['rooms'],
+            }
+            stored_map = stored_rows.get(item['id'])
+            if stored_map is not None:
+                for field in TRACKED_FIELDS:
+                    old_val = stored_map[field]
+                    new_val = incoming[field]
+                    # normalize to string for a stable comparison (DB returns native types)
+                    if (old_val if old_val is None else str(old_val)) != (new_val if new_val is None else str(new_val)):
+                        changes.append(
+                            (item['id'], field, None if old_val is None else str(old_val),
+                             None if new_val is None else str(new_val), item['last_updated'])
+                        )
+            else:
+                # a listing we haven't stored before: how long after posting did it reach us
+                try:
+                    posted_on = datetime.strptime(item['posted_on'], '%Y-%m-%dT%H:%M:%S%z')
+                except (TypeError, ValueError):
+                    posted_on = None
+                if posted_on is not None:
+                    new_listing_ages.append((datetime.now().astimezone() - posted_on).total_seconds())
+            # a later item for the same listing in this batch compares against this one
+            stored_rows[item['id']] = incoming
+
+            listing_rows.append((
+                item['id'],
+                item['link'],
+                item['rooms'],
+                item.get('bedrooms'),
+                item.get('bathrooms'),
+                item.get('bathrooms_type'),
+                item['available_on'],
+                item['size'],
+                ', '.join(item['attributes']),
+                item['description'],
+                item['title'],
+                item['gym'],
+                item['pool'],
+                item['parking'],
+                item['ev_charging'],
+                item['distance'],
+                item['price'],
+                item['last_updated'],
+                item['posted_on'],
+                'True', # always set still_published as true during insert
+                fetched_at
+            ))
+
+            # Record a price row only when the price actually differs from this listing's most
+            # recent recorded price. Craigslist bumps `last_updated` on re-posts without a price
+            # change, and the old UNIQUE(listing_id, last_updated, price) constraint let those
+            # through as duplicate-price rows (rendering as fake "$X -> $X" changes). Comparing
+            # against only the latest price still captures real round-trips (2000->2100->2000).
+            if item['id'] not in latest_prices or latest_prices[item['id']] != item['price']:
+                price_rows.append((item['id'], item['last_updated'], item['price']))
+                latest_prices[item['id']] = item['price']
+
+        # the batch's listings as the market aggregates currently count them
+        aggregates_before = market_aggregates.listing_counts(self.con, ids)
+
+        # everything lands in one transaction
+        self.cur.executemany(
+            "INSERT INTO listing_changes (listing_id, field, old_value, new_value, changed_at) VALUES (?, ?, ?, ?, ?)",
+            changes
         )
-        stored = self.cur.fetchone()
-        if stored is not None:
-            stored_map = dict(zip(tracked_fields, stored))
-            for field in tracked_fields:
-                old_val = stored_map[field]
-                new_val = incoming[field]
-                # normalize to string for a stable comparison (DB returns native types)
-                if (old_val if old_val is None else str(old_val)) != (new_val if new_val is None else str(new_val)):
-                    self.cur.execute(
-                        "INSERT INTO listing_changes (listing_id, field, old_value, new_value, changed_at) VALUES (?, ?, ?, ?, ?)",
-                        (item['id'], field, None if old_val is None else str(old_val),
-                         None if new_val is None else str(new_val), item['last_updated'])
-                    )
-
         # insert or replace if unique index(s) (id OR link) are violated deleting previous row
-        self.cur.execute("""INSERT or REPLACE into listings
-                            (id, link, rooms, bedrooms, bathrooms, bathrooms_type, available_on, size, attributes, description, title, gym, pool, parking, ev_charging, distance, last_price, last_updated, posted_on, still_published) VALUES
-                            (?,  ?,    ?,     ?,        ?,         ?,              ?,            ?,    ?,          ?,           ?,     ?,   ?,    ?,       ?,           ?,        ?,          ?,            ?,         ?)""",
-                         (
-                             item['id'],
-                             item['link'],
-                             item['rooms'],
-                             item.get('bedrooms'),
-                             item.get('bathrooms'),
-                             item.get('bathrooms_type'),
-                             item['available_on'],
-                             item['size'],
-                             ', '.join(item['attributes']),
-                             item['description'],
-                             item['title'],
-                             item['gym'],
-                             item['pool'],
-                             item['parking'],
-                             item['ev_charging'],
-                             item['distance'],
-                             item['price'],
-                             item['last_updated'],
-                             item['posted_on'],
-                             'True' # always set still_published as true during insert
-                         )
+        self.cur.executemany("""INSERT or REPLACE into listings
+                            (id, link, rooms, bedrooms, bathrooms, bathrooms_type, available_on, size, attributes, description, title, gym, pool, parking, ev_charging, distance, last_price, last_updated, posted_on, still_published, last_fetched) VALUES
+                            (?,  ?,    ?,     ?,        ?,         ?,              ?,            ?,    ?,          ?,           ?,     ?,   ?,    ?,       ?,           ?,        ?,          ?,            ?,         ?,               ?)""",
+                             listing_rows
         )
-
-        # Record a price row only when the price actually differs from this listing's most
-        # recent recorded price. Craigslist bumps `last_updated` on re-posts without a price
-        # change, and the old UNIQUE(listing_id, last_updated, price) constraint let those
-        # through as duplicate-price rows (rendering as fake "$X -> $X" changes). Comparing
-        # against only the latest price still captures real round-trips (2000->2100->2000).
-        self.cur.execute(
-            "SELECT price FROM prices WHERE listing_id = ? ORDER BY last_updated DESC LIMIT 1",
-            (item['id'],)
+        self.cur.executemany("UPDATE listings SET last_price = ? WHERE id = ?", repriced_rows)
+        self.cur.executemany(
+            "INSERT OR IGNORE INTO prices (listing_id, last_updated, price) VALUES (?, ?, ?)",
+            price_rows
         )
-        latest = self.cur.fetchone()
-        if latest is None or latest[0] != item['price']:
-            self.cur.execute(
-                "INSERT OR IGNORE INTO prices (listing_id, last_updated, price) VALUES (?, ?, ?)",
-                (item['id'], item['last_updated'], item['price'])
-            )
-
+        market_aggregates.apply_delta(self.con, aggregates_before, market_aggregates.listing_counts(self.con, ids))
         self.con.commit()
+        for age in new_listing_ages:
+            METRICS.inc('new_listings_written')
+            METRICS.inc('new_listing_age_seconds', age)
+
+    def notify_item(self, item, prices, spider):
+        # if there are multiple results, we want to build the subject with all the prices
+        if len(prices) > 1:
+            price = ' <- $'.join(str(p) for p in prices)
+        else:
+            price = item['price']
 
-        # send notifications only if it's not the the first run (file exists)
-        if not spider.first_run:
-            # check if we had more prices for the same apartment and order them from most recent to oldest
-            self.cur.execute("SELECT price FROM prices WHERE listing_id = ? ORDER BY last_updated DESC", [item['id']])
-            data = self.cur.fetchall() # data is an array of tuples
-
-            # if there are multiple results, we want to build the subject with all the prices
-            if len(data) > 1:
-                price = ' <- $'.join(str(price[0]) for price in data)
-            else:
-                price = item['price']
-
-            if item['size'] == None:
-                size = "Unknown"
-            else:
-                size = f"{item['size']}sqft"
-
-            if item['available_on']:
-                available_on = f"{item['available_on']}"
-            else:
-                available_on = "Unknown"
-
-            title = f"${price} / {size} / {available_on} - {item['title']}"
-            body = (
-                f"Link: {item['link']}\n"
-                f"Distance from the reference: {item['distance']}km\n"
-                f"Gym: {item['gym']}\n"
-                f"Pool: {item['pool']}\n\n"
-                f"Parking: {item['parking']}\n\n"
-                f"Description: {item['description']}"
-            )
+        if item['size'] == None:
+            size = "Unknown"
+        else:
+            size = f"{item['size']}sqft"
 
-            spider.notifications.apobj.notify(
-                title       = title,
-                body        = body,
-                notify_type = NotifyType.SUCCESS,
-                body_format = NotifyFormat.TEXT # this is necessary to preserve newlines in the notifications
-            )
+        if item['available_on']:
+            available_on = f"{item['available_on']}"
         else:
-            print(colored('CRAIGSCRAPER RAN FOR THE FIRST TIME, NOTIFICATIONS HAVE BEEN SUPPRESSED', 'magenta'))
+            available_on = "Unknown"
+
+        title = f"${price} / {size} / {available_on} - {item['title']}"
+        body = (
+            f"Link: {item['link']}\n"
+            f"Distance from the reference: {item['distance']}km\n"
+            f"Gym: {item['gym']}\n"
+            f"Pool: {item['pool']}\n\n"
+            f"Parking: {item['parking']}\n\n"
+            f"Description: {item['description']}"
+        )
 
-        return item
+        spider.notifications.notify(
+            title       = title,
+            body        = body,
+            notify_type = NotifyType.SUCCESS,
+            body_format = NotifyFormat.TEXT, # this is necessary to preserve newlines in the notifications
+            summary     = f"{title}\n{item['link']}" # the listing's lines in a digest
+        )
@@ -0,0 +1,160 @@
+"""Recompute derived listing columns over the whole history.
+
+Run after changing the feature regexes or parse_rooms in SharedUtils:
+
+    python -m craigscraper.reprocess [--columns features rooms] [--only-null] [--workers 4]
+
+Rows are read in id order, chunk by chunk, derived in a process pool and written back with one
+executemany per chunk, committing every few chunks. Only rows whose values actually change are
+written. Safe to run while the crawler is running: the write transactions stay short.
+"""
+import argparse
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from dotenv import load_dotenv
+from termcolor import colored
+from craigscraper import market_aggregates
+from craigscraper.db import connect
+from craigscraper.spiders.shared_utils import SharedUtils
+
+
+# column groups that can be recomputed, and the columns each one writes
+DERIVED_COLUMNS = {
+    'features': ['gym', 'pool', 'parking', 'ev_charging'],
+    'rooms': ['bedrooms', 'bathrooms', 'bathrooms_type'],
+}
+
+# rows --only-null picks up, per group (same conditions as the startup backfills)
+NULL_CONDITIONS = {
+    'features': 'gym IS NULL OR pool IS NULL OR parking IS NULL OR ev_charging IS NULL',
+    'rooms': 'bedrooms IS NULL AND rooms IS NOT NULL',
+}
+
+SOURCE_COLUMNS = ['id', 'description', 'attributes', 'rooms']
+
+# derived columns the market aggregates bucket listings by
+AGGREGATE_COLUMNS = ['bedrooms']
+
+
+def derive_chunk(rows, groups):
+    # runs in the worker processes: rows are SOURCE_COLUMNS + the current derived values.
+    # Returns (new values..., id) for the rows whose derived values changed, and the ids of those
+    # whose AGGREGATE_COLUMNS changed.
+    utils = SharedUtils()
+    columns = [column for group in groups for column in DERIVED_COLUMNS[group]]
+    aggregated = [index for index, column in enumerate(columns) if column in AGGREGATE_COLUMNS]
+    updates = []
+    moved = []
+    for row in rows:
+        listing_id, description, attributes, rooms = row[:len(SOURCE_COLUMNS)]
+        current = row[len(SOURCE_COLUMNS):]
+        values = {}
+        if 'features' in groups:
+            item = {
+                'description': description or '',
+                # attributes are stored as a ', '-joined string
+                'attributes': (attributes or '').split(', '),
+            }
+            values.update(utils.findFeatures(item))
+        if 'rooms' in groups:
+            values.update(utils.parse_rooms(rooms))
+        new = tuple(values[column] for column in columns)
+        if new != tuple(current):
+            updates.append(new + (listing_id,))
+            if any(new[index] != current[index] for index in aggregated):
+                moved.append(listing_id)
+    return updates, moved
+
+
+def read_chunks(con, groups, only_null, chunk_size):
+    # keyset pagination on id: no read cursor stays open across the write transactions
+    columns = SOURCE_COLUMNS + [column for group in groups for column in DERIVED_COLUMNS[group]]
+    where = ''
+    if only_null:
+        where = ' AND (%s)' % ' OR '.join('(%s)' % NULL_CONDITIONS[group] for group in groups)
+    query = "SELECT %s FROM listings WHERE id > ?%s ORDER BY id LIMIT ?" % (', '.join(columns), where)
+    last_id = None
+    while True:
+        rows = con.execute(query, (-2 ** 63 if last_id is None else last_id, chunk_size)).fetchall()
+        if not rows:
+            return
+        last_id = rows[-1][0]
+        yield rows
+
+
+def count_rows(con, groups, only_null):
+    where = ''
+    if only_null:
+        where = ' WHERE %s' % ' OR '.join('(%s)' % NULL_CONDITIONS[group] for group in groups)
+    return con.execute("SELECT COUNT(*) FROM listings" + where).fetchone()[0]
+
+
+def reprocess(con, groups=('features', 'rooms'), only_null=False, chunk_size=2000, workers=None, commit_every=10, report=print):
+    groups = [group for group in DERIVED_COLUMNS if group in groups]
+    columns = [column for group in groups for column in DERIVED_COLUMNS[group]]
+    update = "UPDATE listings SET %s WHERE id = ?" % ', '.join('%s = ?' % column for column in columns)
+    total = count_rows(con, groups, only_null)
+    workers = workers or os.cpu_count() or 1
+    aggregates = market_aggregates.tables_exist(con)
+
+    report(colored('Reprocessing %s for %d listing(s) with %d worker(s)...' % (', '.join(columns), total, workers), 'cyan'))
+    started = time.monotonic()
+    done = updated = chunks_since_commit = 0
+
+    def write(rows_in_chunk, derived):
+        nonlocal done, updated, chunks_since_commit
+        updates, moved = derived
+        # listings whose bedrooms changed move between market aggregate buckets, in the same transaction
+        before = market_aggregates.listing_counts(con, moved) if aggregates and moved else None
+        con.executemany(update, updates)
+        if before is not None:
+            market_aggregates.apply_delta(con, before, market_aggregates.listing_counts(con, moved))
+        done += rows_in_chunk
+        updated += len(updates)
+        chunks_since_commit += 1
+        if chunks_since_commit >= commit_every:
+            con.commit()
+            chunks_since_commit = 0
+        elapsed = time.monotonic() - started
+        report('  %d/%d rows, %d updated, %.0f rows/s' % (done, total, updated, done / elapsed if elapsed else 0))
+
+    chunks = read_chunks(con, groups, only_null, chunk_size)
+    if workers == 1:
+        for rows in chunks:
+            write(len(rows), derive_chunk(rows, groups))
+    else:
+        # a bounded window of chunks in flight keeps memory flat on big databases
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            in_flight = deque()
+            for rows in chunks:
+                in_flight.append((len(rows), executor.submit(derive_chunk, rows, groups)))
+                if len(in_flight) >= workers * 2:
+                    size, future = in_flight.popleft()
+                    write(size, future.result())
+            while in_flight:
+                size, future = in_flight.popleft()
+                write(size, future.result())
+    con.commit()
+
+    elapsed = time.monotonic() - started
+    report(colored('Reprocessed %d row(s) in %.1fs (%.0f rows/s), %d updated' % (
+        done, elapsed, done / elapsed if elapsed else 0, updated), 'green'))
+    return done, updated
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Recompute derived listing columns over the whole history')
+    parser.add_argument('--columns', nargs='+', choices=sorted(DERIVED_COLUMNS), default=sorted(DERIVED_COLUMNS),
+                        help='column groups to recompute (default: all)')
+    parser.add_argument('--only-null', action='store_true', help='only rows with missing values, like the startup backfills')
+    parser.add_argument('--chunk-size', type=int, default=2000, help='rows per chunk (default: 2000)')
+    parser.add_argument('--workers', type=int, default=None, help='worker processes (default: one per CPU)')
+    parser.add_argument('--db', help='database file (default: RENTS_DB or rents.db)')
+    args = parser.parse_args()
+
+    load_dotenv()
+    con = connect(args.db)
+    reprocess(con, args.columns, args.only_null, args.chunk_size, args.workers)
+    con.close()
@@ -0,0 +1,100 @@
+"""Search profiles: the Craigslist searches a crawl runs.
+
+SEARCH_PROFILES_FILE points to a YAML file with any number of searches (see
+resources/search_profiles.yaml). Without it, a single profile is built from the
+MIN_PRICE/LAT/SEARCH_DISTANCE/... environment variables, exactly as before.
+"""
+import os
+import yaml
+from urllib.parse import urlencode
+
+
+class SearchProfile:
+    def __init__(self, name, site='vancouver', area='vancouver-bc', category='apa',
+                 lat='49.2822', lon='-123.1284', search_distance='1.41',
+                 min_price='2000', max_price='2700', min_bedrooms='1',
+                 distance_from_lat='49.2799016', distance_from_lon='-123.1167676'):
+        self.name = name
+        self.site = site
+        self.area = area
+        self.category = category
+        self.lat = lat
+        self.lon = lon
+        self.search_distance = search_distance
+        self.min_price = min_price
+        self.max_price = max_price
+        self.min_bedrooms = min_bedrooms
+        # reference point the listing distance is measured from (e.g. your work place)
+        self.distance_from = (float(distance_from_lat), float(distance_from_lon))
+
+    def search_url(self):
+        query = urlencode([
+            ('lat', self.lat),
+            ('lon', self.lon),
+            ('min_price', self.min_price),
+            ('max_price', self.max_price),
+            ('min_bedrooms', self.min_bedrooms),
+            ('search_distance', self.search_distance),
+        ])
+        return f"https://{self.site}.craigslist.org/search/{self.area}/{self.category}?{query}#search=1~list~1~0"
+
+    def __repr__(self):
+        return f"SearchProfile({self.name!r}, {self.search_url()!r})"
+
+
+def profile_from_env(name='default'):
+    return SearchProfile(
+        name,
+        lat               = os.environ.get('LAT',               '49.2822'),
+        lon               = os.environ.get('LON',               '-123.1284'),
+        search_distance   = os.environ.get('SEARCH_DISTANCE',   '1.41'),
+        min_price         = os.environ.get('MIN_PRICE',         '2000'),
+        max_price         = os.environ.get('MAX_PRICE',         '2700'),
+        min_bedrooms      = os.environ.get('MIN_BEDROOMS',      '1'),
+        distance_from_lat = os.environ.get('DISTANCE_FROM_LAT', '49.2799016'),
+        distance_from_lon = os.environ.get('DISTANCE_FROM_LON', '-123.1167676'),
+    )
+
+
+def _profile_kwargs(entry):
+    # YAML values may be numbers; URLs and the env-based defaults work with strings
+    kwargs = {k: str(v) for k, v in entry.items() if k not in ('name', 'distance_from')}
+    distance_from = entry.get('distance_from')
+    if distance_from:
+        kwargs['distance_from_lat'] = str(distance_from['lat'])
+        kwargs['distance_from_lon'] = str(distance_from['lon'])
+    return kwargs
+
+
+def load_search_profiles(path=None):
+    path = path or os.environ.get('SEARCH_PROFILES_FILE')
+    if not path:
+        return [profile_from_env()]
+
+    if not os.path.isfile(path):
+        raise FileNotFoundError('The specified search profiles file does not exist')
+
+    with open(path) as f:
+        config = yaml.safe_load(f) or {}
+
+    # `defaults` apply to every search; anything not set there falls back to the environment
+    env = profile_from_env()
+    base = {
+        'lat': env.lat, 'lon': env.lon, 'search_distance': env.search_distance,
+        'min_price': env.min_price, 'max_price': env.max_price, 'min_bedrooms': env.min_bedrooms,
+        'distance_from_lat': str(env.distance_from[0]), 'distance_from_lon': str(env.distance_from[1]),
+    }
+    base.update(_profile_kwargs(config.get('defaults') or {}))
+
+    profiles = []
+    names = set()
+    for index, entry in enumerate(config.get('searches') or []):
+        name = str(entry.get('name') or 'search-%s' % (index + 1))
+        if name in names:
+            raise ValueError('Duplicate search profile name: %s' % name)
+        names.add(name)
+        profiles.append(SearchProfile(name, **{**base, **_profile_kwargs(entry)}))
+
+    if not profiles:
+        raise ValueError('The search profiles file does not define any searches')
+    return profiles
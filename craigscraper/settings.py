@@ -30,6 +30,23 @@ ROBOTSTXT_OBEY = False
 #CONCURRENT_REQUESTS_PER_DOMAIN = 16
 #CONCURRENT_REQUESTS_PER_IP = 16
 
+# Search results pagination: result pages are requested SEARCH_PAGE_FANOUT at a time
+# (defaults to CONCURRENT_REQUESTS_PER_DOMAIN), at most SEARCH_MAX_PAGES pages per search,
+# with SEARCH_PAGE_PRIORITY so they are fetched before the listing detail pages
+#SEARCH_PAGE_FANOUT = 8
+SEARCH_MAX_PAGES = 25
+SEARCH_PAGE_PRIORITY = 100
+
+# Listing detail pages are fetched in priority order, from 0 up to DETAIL_PRIORITY_MAX (kept below
+# SEARCH_PAGE_PRIORITY), by a weighted score of newness, distance from the reference point
+# (from the result page's coordinates), price within the searched range and size of a price drop
+DETAIL_PRIORITY_MAX = 90
+DETAIL_PRIORITY_WEIGHTS = {"new": 3, "distance": 2, "price": 1, "price_drop": 3}
+
+# A repriced listing whose detail page was fetched less than DETAIL_REFRESH_HOURS ago gets its new
+# price straight from the result page; older ones are fetched again (0 fetches every reprice)
+DETAIL_REFRESH_HOURS = 24
+
 # Disable cookies (enabled by default)
 COOKIES_ENABLED = False
 
@@ -55,13 +72,15 @@ DOWNLOADER_MIDDLEWARES = {
     'scrapy.downloadermiddlewares.retry.RetryMiddleware': None,
     'scrapy_fake_useragent.middleware.RandomUserAgentMiddleware': 500, # https://github.com/alecxe/scrapy-fake-useragent/issues/36#issuecomment-1491458670
     'scrapy_fake_useragent.middleware.RetryUserAgentMiddleware': 501, # https://github.com/alecxe/scrapy-fake-useragent/issues/36#issuecomment-1491458670
+    'craigscraper.middlewares.DetailPageCacheMiddleware': 550, # below HttpCompressionMiddleware (590): caches decompressed bodies
 }
 
 # Enable or disable extensions
 # See https://docs.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    "scrapy.extensions.telnet.TelnetConsole": None,
-#}
+    "craigscraper.extensions.CrawlMetrics": 500, # stage timings: METRICS_PORT endpoint + crawl_metrics table
+}
 
 # Configure item pipelines
 # See https://docs.scrapy.org/en/latest/topics/item-pipeline.html
@@ -82,6 +101,18 @@ AUTOTHROTTLE_TARGET_CONCURRENCY = 1.0
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
+# Listing detail pages are cached (compressed) in the rents DB and revalidated with conditional
+# requests; DETAIL_CACHE_OFFLINE serves cached pages without any network request.
+# Re-parse cached pages offline with: python -m craigscraper.page_cache reparse [--write]
+DETAIL_CACHE_ENABLED = True
+DETAIL_CACHE_OFFLINE = False
+# new pages are committed to the cache this many at a time (and when the crawl ends)
+DETAIL_CACHE_BATCH_SIZE = 50
+
+# How listing detail pages are parsed: "parsel" runs one CSS/XPath query per field, "lxml" reads
+# every field in a single pass over the page (cheaper on large initial crawls)
+DETAIL_EXTRACTOR = "parsel"
+
 # Enable and configure HTTP caching (disabled by default)
 # See https://docs.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
 #HTTPCACHE_ENABLED = True
@@ -0,0 +1,96 @@
+"""Raw field extraction for listing detail pages.
+
+Both extractors return the same dict of raw strings, which RentSpider.parseItem turns into an
+item. 'parsel' runs the original CSS/XPath queries one by one (each a walk of the whole
+document); 'lxml' parses the page once and collects every field in a single walk of the tree.
+Select one with the DETAIL_EXTRACTOR setting.
+"""
+import lxml.etree
+import lxml.html
+
+
+def extract_parsel(response):
+    return {
+        # `.attrgroup` blocks: [0] the bold facts (rooms, size, availability), [2] the amenities
+        'properties': response.css('.attrgroup')[0].css('span::text').getall(),
+        'attributes': response.css('.attrgroup')[2].css('div span a::text').getall(),
+        'description': ' '.join(response.css('section#postingbody::text').getall()).strip(),
+        'title': response.xpath("//meta[@property='og:title']/@content").extract_first(),
+        'link': response.xpath("//meta[@property='og:url']/@content").extract_first(),
+        'icbm': response.xpath("//meta[@name='ICBM']/@content").extract_first(),
+        'price': response.css('span.price').get(),
+        'times': response.css('div.postinginfos p.postinginfo.reveal time::attr(datetime)').getall(),
+        'postinginfos': ' '.join(response.css('.postinginfos ::text').getall()),
+    }
+
+
+def extract_lxml(response):
+    # same parser settings as parsel, so both see the same tree
+    root = lxml.etree.fromstring(response.text.encode('utf8'), parser=lxml.html.HTMLParser(encoding='utf8'))
+
+    meta = {}
+    attrgroups = []
+    postinginfos = []
+    description = None
+    price = None
+    for el in root.iter():
+        tag = el.tag
+        if not isinstance(tag, str):  # comments, processing instructions
+            continue
+        if tag == 'meta':
+            for key in (el.get('property'), el.get('name')):
+                if key in ('og:title', 'og:url', 'ICBM') and key not in meta:
+                    meta[key] = el.get('content')
+            continue
+        classes = el.get('class', '').split()
+        if 'attrgroup' in classes:
+            attrgroups.append(el)
+        if 'postinginfos' in classes:
+            postinginfos.append(el)
+        if tag == 'section' and description is None and el.get('id') == 'postingbody':
+            description = ' '.join(_own_text(el)).strip()
+        elif tag == 'span' and price is None and 'price' in classes:
+            price = lxml.html.tostring(el, encoding='unicode', with_tail=False)
+
+    return {
+        'properties': [text for span in attrgroups[0].iter('span') for text in _own_text(span)],
+        'attributes': [text for a in attrgroups[2].iter('a') if _inside(a, attrgroups[2], ('span', 'div')) for text in _own_text(a)],
+        'description': description if description is not None else '',
+        'title': meta.get('og:title'),
+        'link': meta.get('og:url'),
+        'icbm': meta.get('ICBM'),
+        'price': price,
+        'times': [
+            time.get('datetime')
+            for info in postinginfos if info.tag == 'div'
+            for p in info.iter('p') if {'postinginfo', 'reveal'} <= set(p.get('class', '').split())
+            for time in p.iter('time') if time.get('datetime') is not None
+        ],
+        'postinginfos': ' '.join(text for info in postinginfos for text in info.itertext()),
+    }
+
+
+def _own_text(el):
+    # the element's direct text nodes (what `::text` selects), in document order
+    texts = [el.text] + [child.tail for child in el]
+    return [text for text in texts if text]
+
+
+def _inside(el, scope, ancestors):
+    # True if `el` has ancestors with these tags (innermost first) inside `scope`, scope included,
+    # i.e. the `div span a` part of a descendant CSS selector
+    wanted = list(ancestors)
+    node = el.getparent()
+    while wanted and node is not None:
+        if node.tag == wanted[0]:
+            wanted.pop(0)
+        if node is scope:
+            break
+        node = node.getparent()
+    return not wanted
+
+
+EXTRACTORS = {
+    'parsel': extract_parsel,
+    'lxml': extract_lxml,
+}
@@ -0,0 +1,73 @@
+"""Priority of listing detail requests.
+
+Scrapy's scheduler hands out the highest priority first, so under autothrottle the listings most
+worth a notification are fetched (and notified) first. Each listing gets a score from 0 to 1, a
+weighted mean of:
+
+- new: 1 for a listing we have never stored, 0 for a repriced one
+- distance: 1 at the search's reference point, 0 at the edge of the search radius, estimated
+  from the coordinates Craigslist embeds in the result page (0.5 when they are missing)
+- price: 1 at the search's min_price, 0 at max_price
+- price_drop: 1 for a drop of PRICE_DROP_SCALE (10%) or more, 0 for a raise or a new listing
+
+and the priority is the score scaled to 0..max_priority, which stays below the result pages'
+SEARCH_PAGE_PRIORITY so result pages still go first.
+"""
+import json
+import geopy.distance
+
+
+DEFAULT_WEIGHTS = {'new': 3, 'distance': 2, 'price': 1, 'price_drop': 3}
+PRICE_DROP_SCALE = 0.1
+MILES_TO_KM = 1.609344  # search_distance is in miles
+
+
+def parse_result_coordinates(ld_json):
+    # the search page's <script id="ld_searchpage_results"> JSON-LD -> {listing name: (lat, lon)}
+    if not ld_json:
+        return {}
+    try:
+        data = json.loads(ld_json)
+    except ValueError:
+        return {}
+    coordinates = {}
+    for element in data.get('itemListElement') or []:
+        item = element.get('item') if isinstance(element, dict) else None
+        if not isinstance(item, dict):
+            continue
+        try:
+            coordinates[item['name'].strip()] = (float(item['latitude']), float(item['longitude']))
+        except (KeyError, TypeError, ValueError, AttributeError):
+            continue
+    return coordinates
+
+
+def _clamp(value):
+    return min(max(value, 0.0), 1.0)
+
+
+def detail_priority(profile, price, previous_price=None, coordinates=None, weights=None, max_priority=90):
+    # previous_price: the stored price of a repriced listing, None for a new one
+    weights = weights or DEFAULT_WEIGHTS
+    scores = {'new': 1.0 if previous_price is None else 0.0}
+
+    if coordinates is None:
+        scores['distance'] = 0.5
+    else:
+        radius = float(profile.search_distance) * MILES_TO_KM
+        distance = geopy.distance.geodesic(profile.distance_from, coordinates).km
+        scores['distance'] = _clamp(1 - distance / radius) if radius > 0 else 0.5
+
+    low, high = float(profile.min_price), float(profile.max_price)
+    scores['price'] = _clamp((high - price) / (high - low)) if high > low else 0.5
+
+    if previous_price:
+        scores['price_drop'] = _clamp((previous_price - price) / previous_price / PRICE_DROP_SCALE)
+    else:
+        scores['price_drop'] = 0.0
+
+    total = sum(weights.get(name, 0) for name in scores)
+    if total <= 0:
+        return 0
+    score = sum(weights.get(name, 0) * value for name, value in scores.items()) / total
+    return int(round(score * max_priority))
@@ -1,15 +1,21 @@
 import scrapy
 from scrapy import signals
 from scrapy.exceptions import CloseSpider
-from datetime import datetime
+from twisted.internet.threads import deferToThread
+from datetime import datetime, timedelta
 import geopy.distance
 import regex_spm
-import sqlite3
 import os
 import re
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
 from termcolor import colored
 from dotenv import load_dotenv
 from notifications import Notifications
+from craigscraper.db import connect
+from craigscraper.metrics import METRICS
+from craigscraper.search_profiles import load_search_profiles
+from craigscraper.spiders.extractors import EXTRACTORS
+from craigscraper.spiders.priority import DEFAULT_WEIGHTS, detail_priority, parse_result_coordinates
 from craigscraper.spiders.shared_utils import SharedUtils
 
 
@@ -20,23 +26,26 @@ class RentSpider(scrapy.Spider):
 
     rents_db = os.environ.get('RENTS_DB', 'rents.db')
 
-    min_price         = os.environ.get('MIN_PRICE',         '2000')
-    max_price         = os.environ.get('MAX_PRICE',         '2700')
-    lat               = os.environ.get('LAT',               '49.2822')
-    lon               = os.environ.get('LON',               '-123.1284')
-    min_bedrooms      = os.environ.get('MIN_BEDROOMS',      '1')
-    search_distance   = os.environ.get('SEARCH_DISTANCE',   '1.41')
-    distance_from_lat = os.environ.get('DISTANCE_FROM_LAT', '49.2799016')
-    distance_from_lon = os.environ.get('DISTANCE_FROM_LON', '-123.1167676')
-
     suppress_test_notification = os.environ.get('SUPPRESS_TEST_NOTIFICATION', 'False')
-
-    distance_from = (float(distance_from_lat), float(distance_from_lon))
+    # the test notification is sent once per process, not once per crawl (see main.py's
+    # persistent mode, which runs many crawls in one process)
+    test_notification_sent = False
+    # how long a finishing crawl waits for queued notifications to be delivered
+    notification_drain_seconds = float(os.environ.get('NOTIFICATION_DRAIN_SECONDS', '60'))
 
     allowed_domains = ["craigslist.org"]
-    start_urls = [
-        f"https://vancouver.craigslist.org/search/vancouver-bc/apa?lat={lat}&lon={lon}&min_price={min_price}&max_price={max_price}&min_bedrooms={min_bedrooms}&search_distance={search_distance}#search=1~list~1~0"
-    ]
+
+    # how listing pages are read: 'parsel' (one query per field) or 'lxml' (one pass over the
+    # page); overridden by the DETAIL_EXTRACTOR setting
+    detail_extractor = 'parsel'
+
+    # detail requests are prioritized (see priority.py); overridden by the DETAIL_PRIORITY_* settings
+    detail_priority_max = 90
+    detail_priority_weights = DEFAULT_WEIGHTS
+
+    # a repriced listing whose detail page was fetched less than this many hours ago is updated
+    # from its search result alone; overridden by the DETAIL_REFRESH_HOURS setting (0: always fetch)
+    detail_refresh_hours = 24
 
     # regex to extract availability date from description
     availability_pattern = re.compile(r'^[^\n]*(available|availability|avail)[^\n]*(?P<now>now|immediately|immediate)|((?P<month_long>(January|February|March|April|May|June|July|August|September|October|November|December))|(?P<month_short>Jan|Feb|Mar|Apr|May|Jun|Jul|Aug|Sep|Oct|Nov|Dec))[\s,]+(?P<day>\d{,2}|)[^\n]*$', flags=re.IGNORECASE | re.MULTILINE)
@@ -51,27 +60,31 @@ class RentSpider(scrapy.Spider):
         # get notified when the scrape breaks instead of failing silently
         crawler.signals.connect(spider.on_spider_error, signal=signals.spider_error)
         crawler.signals.connect(spider.on_spider_closed, signal=signals.spider_closed)
+
+        # result pages are fetched SEARCH_PAGE_FANOUT at a time, so throughput follows the
+        # configured concurrency instead of being capped at one page
+        settings = crawler.settings
+        spider.search_page_fanout = max(1, settings.getint('SEARCH_PAGE_FANOUT') or settings.getint('CONCURRENT_REQUESTS_PER_DOMAIN'))
+        spider.search_max_pages = max(1, settings.getint('SEARCH_MAX_PAGES', 25))
+        spider.search_page_priority = settings.getint('SEARCH_PAGE_PRIORITY', 100)
+        spider.detail_extractor = settings.get('DETAIL_EXTRACTOR', cls.detail_extractor)
+        if spider.detail_extractor not in EXTRACTORS:
+            raise ValueError('DETAIL_EXTRACTOR must be one of: %s' % ', '.join(EXTRACTORS))
+        # below the result pages, so those are still fetched first
+        spider.detail_priority_max = min(settings.getint('DETAIL_PRIORITY_MAX', cls.detail_priority_max), spider.search_page_priority - 1)
+        weights = settings.getdict('DETAIL_PRIORITY_WEIGHTS') or cls.detail_priority_weights
+        spider.detail_priority_weights = {name: float(weight) for name, weight in weights.items()}
+        spider.detail_refresh_hours = settings.getfloat('DETAIL_REFRESH_HOURS', cls.detail_refresh_hours)
         return spider
 
-    def __init__(self, notifications_file=None, *args, **kwargs):
+    def __init__(self, notifications_file=None, notifications=None, *args, **kwargs):
         super(RentSpider, self).__init__(*args, **kwargs)
 
         # set to True once a breaking-change notification has been sent this run (avoid duplicates)
         self.breaking_change_notified = False
 
-        # initialize notifications
-        self.notifications = Notifications(notifications_file)
-        print('Sending a test notification to ensure your configuration is valid...')
-        if self.suppress_test_notification == 'False':
-            print(colored('SENDING TEST NOTIFICATION', 'green'))
-            self.notifications.apobj.notify(
-                title = 'Looking for apartments',
-                body  = 'Starting now...',
-            )
-        else:
-            print(colored('TEST NOTIFICATION SUPPRESSED', 'magenta'))
-
-        # avoid notifications on first execution
+        # avoid notifications on first execution (checked before anything can create the DB:
+        # the notification outbox lives in it)
         if not os.path.exists(self.rents_db):
             self.first_run = True
             print(colored('DATABASE DOES NOT EXIST, SUPPRESS NOTIFICATIONS', 'magenta'))
@@ -79,9 +92,44 @@ class RentSpider(scrapy.Spider):
             print(colored('DATABASE EXISTS, NOTIFICATIONS ENABLED', 'green'))
             self.first_run = False
 
+        # initialize notifications, unless a long-lived caller hands us an already configured one
+        # (then the caller also owns draining its outbox)
+        self.owns_notifications = notifications is None
+        if notifications is None:
+            notifications = Notifications(notifications_file)
+        self.notifications = notifications
+        if not RentSpider.test_notification_sent:
+            RentSpider.test_notification_sent = True
+            print('Sending a test notification to ensure your configuration is valid...')
+            if self.suppress_test_notification == 'False':
+                print(colored('SENDING TEST NOTIFICATION', 'green'))
+                self.notifications.notify(
+                    title  = 'Looking for apartments',
+                    body   = 'Starting now...',
+                    urgent = True, # it's checking the configuration: don't hold it in a digest
+                )
+            else:
+                print(colored('TEST NOTIFICATION SUPPRESSED', 'magenta'))
+
         # initialize utils
         self.utils = SharedUtils()
 
+        # every configured search runs in this crawl (SEARCH_PROFILES_FILE, or the env vars)
+        self.search_profiles = load_search_profiles()
+        self.profiles_by_url = {profile.search_url(): profile for profile in self.search_profiles}
+        self.start_urls = list(self.profiles_by_url)
+        # names of the searches each listing showed up in: distance is measured from their references
+        self.link_profiles = {}
+
+        # search results state for this crawl, merged across every result page
+        self.cl_data = {} # "link: price" of every listing currently on CL
+        self.pending_pages = 0 # result pages requested but not parsed yet
+        self.last_page_requested = {} # furthest result page requested, per search URL
+        self.search_seen = {} # links returned so far, per search URL (pagination ignores other searches)
+        self.search_complete = True # False once any result page fails
+        self.published = None # published listings "link: price", see published_listings()
+        self.db_connection = None
+
     def notify_breaking_change(self, reason):
         # alert the user that Craigslist likely changed something and the scraper needs attention.
         # deduplicated so a page-structure change affecting many listings sends a single alert.
@@ -89,13 +137,14 @@ class RentSpider(scrapy.Spider):
             return
         self.breaking_change_notified = True
         print(colored('POSSIBLE BREAKING CHANGE DETECTED: %s' % reason, 'red'))
-        self.notifications.apobj.notify(
+        self.notifications.notify(
             title = '⚠️ Craigscraper may be broken',
             body  = (
                 'The scraper hit an unexpected problem, likely because Craigslist changed '
                 'its page structure. New apartments will NOT be detected until this is fixed.\n\n'
                 'Details: %s' % reason
             ),
+            summary = '⚠️ Craigscraper may be broken: %s' % reason,
         )
 
     def on_spider_error(self, failure, response, spider):
@@ -112,11 +161,77 @@ class RentSpider(scrapy.Spider):
         if reason not in benign_reasons:
             self.notify_breaking_change('crawl stopped early (reason: %s)' % reason)
 
+        self.close_connection()
+
+        # send the rest of this crawl's digest (if NOTIFICATION_DIGEST is on)
+        self.notifications.flush_digest()
+
+        # give queued notifications a chance to go out before a one-shot `scrapy crawl` exits;
+        # anything still undelivered stays in the outbox and is retried by the next run. The wait
+        # happens in a thread: Scrapy waits for the returned Deferred, the reactor keeps running.
+        if self.owns_notifications:
+            d = deferToThread(self.notifications.close, self.notification_drain_seconds)
+            d.addCallback(self.on_notifications_closed)
+            return d
+
+    def on_notifications_closed(self, delivered):
+        if not delivered:
+            print(colored('NOTIFICATIONS: some notifications are still queued, they will be retried on the next run', 'yellow'))
+
+    async def start(self):
+        for request in self.start_requests():
+            yield request
+
+    def start_requests(self):
+        for url in self.start_urls:
+            yield self.search_page_request(url, 0)
+
+    def search_page_request(self, search_url, page, page_size=None):
+        # every result page is tracked so the unpublish diff only runs once all of them are in
+        self.pending_pages += 1
+        self.last_page_requested[search_url] = max(page, self.last_page_requested.get(search_url, 0))
+        return scrapy.Request(
+            self.get_page_url(search_url, page, page_size),
+            callback = self.parse,
+            errback = self.on_search_page_error,
+            priority = self.search_page_priority, # result pages go ahead of detail pages
+            dont_filter = True,
+            meta = {'search_url': search_url, 'page': page, 'page_size': page_size},
+        )
+
+    def get_page_url(self, search_url, page, page_size):
+        # result pages are addressed by the offset of their first result (`s=`); the fragment
+        # only drives the client-side UI and is dropped
+        if page == 0:
+            return search_url
+        parts = urlsplit(search_url)
+        query = [(k, v) for k, v in parse_qsl(parts.query) if k != 's'] + [('s', str(page * page_size))]
+        return urlunsplit((parts.scheme, parts.netloc, parts.path, urlencode(query), ''))
+
     def parse(self, response):
+        with METRICS.timer('search_page'):
+            requests = self.parse_search_page(response)
+
+        self.pending_pages -= 1
+        if self.pending_pages == 0:
+            self.finish_search()
+
+        yield from requests
+
+    def on_search_page_error(self, failure):
+        # a missing page means we don't know the full result set: never unpublish on a partial view
+        print(colored('Search results page failed (%s): %s' % (failure.request.url, failure.getErrorMessage()), 'red'))
+        self.search_complete = False
+        self.pending_pages -= 1
+        if self.pending_pages == 0:
+            self.finish_search()
+
+    def parse_search_page(self, response):
+        requests = []
         links_to_examinate = []
 
         cl_data = {} # stores a dictionary of listing on CL to dictionary "link: price"
-        cl_links = [] # stores all the links of current listings to avoid extracting keys in a second stage
+        cl_titles = {} # "link: title", to find the listing's coordinates in the page's JSON-LD
 
         # detect a structural change of the search results page: if the container is
         # missing entirely, Craigslist changed the layout and we must not fail silently
@@ -130,63 +245,190 @@ class RentSpider(scrapy.Spider):
             price = int(''.join(filter(str.isdigit, property.css('div.price::text').get())))
 
             cl_data[link] = price
-            cl_links.append(link)
-
-        # prepare sqlite
-        connection = sqlite3.connect(self.rents_db)
-        cursor = connection.cursor()
-
-        # find listings already in the database
-        cursor.execute('SELECT link, last_price FROM listings WHERE link IN (%s)' %','.join('?'*len(cl_links)), cl_links)
-        db_data = dict(cursor.fetchall()) # convert array of tuples to dictionary "link: price"
-        db_links = list(db_data.keys()) # extract the links
+            cl_titles[link] = (property.attrib.get('title') or '').strip()
+
+        search_url = response.meta.get('search_url', response.url)
+        page = response.meta.get('page', 0)
+        profile = self.profiles_by_url.get(search_url)
+        for link in cl_data:
+            self.link_profiles.setdefault(link, set()).add(profile.name if profile else None)
+        # the first page tells us how many results a full page holds
+        page_size = response.meta.get('page_size') or len(cl_data)
+
+        # listings can shift between pages while we crawl: a page that only repeats this search's
+        # earlier results ends it. Other searches' results don't count, an overlapping search
+        # still has to read all of its own pages.
+        seen = self.search_seen.setdefault(search_url, set())
+        search_links = [link for link in cl_data if link not in seen]
+        seen.update(cl_data)
+
+        # overlapping searches return the same listings: only handle links no search has
+        # returned yet, so each detail page is requested once
+        cl_links = [link for link in cl_data if link not in self.cl_data]
+        self.cl_data.update(cl_data)
+        METRICS.inc('listings_seen', len(cl_links))
+
+        # A full page of unseen results means there is probably more: when the furthest page
+        # requested so far comes back full, fan out the next window of pages concurrently.
+        # An empty/short page, or one that only repeats known results, ends the search.
+        if search_links and len(cl_data) >= page_size and page == self.last_page_requested.get(search_url, 0):
+            if page + 1 >= self.search_max_pages:
+                # there are more results than we are allowed to read: the set is incomplete
+                print(colored('Reached SEARCH_MAX_PAGES (%s) for %s' % (self.search_max_pages, search_url), 'red'))
+                self.search_complete = False
+            last_page = min(page + self.search_page_fanout, self.search_max_pages - 1)
+            for next_page in range(page + 1, last_page + 1):
+                requests.append(self.search_page_request(search_url, next_page, page_size))
+
+        if not cl_links:
+            return requests
+
+        # published listings as of the start of the crawl "link: price", loaded once
+        db_data = self.published_listings()
 
         # listing on both db and cl -> check if price has changed
-        common_list = list(set(cl_links).intersection(db_links))
+        common_list = [link for link in cl_links if link in db_data]
+        repriced = [link for link in common_list if db_data[link] != cl_data[link]]
+        fetch_state = self.fetch_state(repriced)
         for listing in common_list:
             if db_data[listing] == cl_data[listing]:
                 print(colored('Apartment %s already fetched and price ($%s) is unchanged: %s'%(self.get_slug(listing), db_data[listing], listing), 'green'))
-            else:
-                links_to_examinate.append(listing)
+                continue
+            METRICS.inc('repriced_listings')
+            listing_id, last_fetched, last_updated = fetch_state[listing]
+            if self.detail_is_stale(last_fetched):
+                links_to_examinate.append((listing, db_data[listing]))
                 print(colored('Apartment %s already fetched but price ($%s) is changed to $%s: %s'%(self.get_slug(listing), db_data[listing], cl_data[listing], listing), 'yellow'))
-
-        # listings only on db -> update as still_published = 'False'
-        cursor.execute('SELECT link, last_price FROM listings WHERE still_published = \'True\' AND link NOT IN (%s)' %','.join('?'*len(cl_links)), cl_links)
-        only_db_data = dict(cursor.fetchall()) # convert array of tuples to dictionary "link: price"
-        only_db_links = list(only_db_data.keys()) # extract the links
-        if len(only_db_links) > 0:
-            print(colored('Apartment(s) have been unpublished: %s'%(' '.join(only_db_links)), 'magenta'))
-            cursor.execute('UPDATE listings SET still_published = \'False\' WHERE link IN (%s)' %','.join('?'*len(only_db_links)), only_db_links)
-            connection.commit()
+            else:
+                # only the price changed as far as the result page tells: record it without the detail page
+                requests.append(self.price_only_item(listing_id, listing, cl_data[listing], last_updated))
+                METRICS.inc('price_only_updates')
+                print(colored('Apartment %s price ($%s) is changed to $%s, detail page is recent: %s'%(self.get_slug(listing), db_data[listing], cl_data[listing], listing), 'yellow'))
 
         # listings only on cl -> we need to add them, normal processing
-        only_cl_list = list(set(cl_links) - set(db_links))
+        only_cl_list = [link for link in cl_links if link not in db_data]
         for listing in only_cl_list:
-            links_to_examinate.append(listing)
+            links_to_examinate.append((listing, None))
+            METRICS.inc('new_listings')
             print(colored('Apartment %s ($%s) is new: %s'%(self.get_slug(listing), cl_data[listing], listing), 'cyan'))
 
-        # continue scraping the links
-        for link in links_to_examinate:
-            yield scrapy.Request(link, callback = self.parseItem)
+        # continue scraping the links, most valuable first: new listings, close to the reference,
+        # cheap, or with a big price drop
+        coordinates = parse_result_coordinates(response.css('script#ld_searchpage_results::text').get())
+        profile = profile or self.search_profiles[0]
+        prioritized = []
+        for link, previous_price in links_to_examinate:
+            priority = detail_priority(
+                profile, cl_data[link], previous_price,
+                coordinates = coordinates.get(cl_titles.get(link)),
+                weights = self.detail_priority_weights,
+                max_priority = self.detail_priority_max,
+            )
+            prioritized.append((priority, link))
+        prioritized.sort(key=lambda pair: pair[0], reverse=True)
+        for priority, link in prioritized:
+            requests.append(scrapy.Request(link, callback = self.parseItem, priority = priority, meta = {'link': link, 'detail_page': True}))
+
+        return requests
+
+    def finish_search(self):
+        # runs once, after every result page has been parsed: only now is the full result set known
+        if not self.search_complete:
+            print(colored('Some search results pages failed, skipping the unpublished listings check', 'red'))
+            self.close_connection()
+            return
+
+        # listings only on db -> update as still_published = 'False'
+        only_db_links = [link for link in self.published_listings() if link not in self.cl_data]
+        if len(only_db_links) > 0:
+            print(colored('Apartment(s) have been unpublished: %s'%(' '.join(only_db_links)), 'magenta'))
+            METRICS.inc('unpublished_listings', len(only_db_links))
+            connection = self.connection()
+            connection.executemany('UPDATE listings SET still_published = \'False\' WHERE link = ?', [(link,) for link in only_db_links])
+            connection.commit()
+        self.close_connection()
+
+    def connection(self):
+        # one connection per crawl, closed once the search is finished (or at spider_closed)
+        if self.db_connection is None:
+            self.db_connection = connect(self.rents_db)
+        return self.db_connection
+
+    def close_connection(self):
+        if self.db_connection is not None:
+            self.db_connection.close()
+            self.db_connection = None
+
+    def published_listings(self):
+        # "link: price" of the listings published when the crawl started, read once. Result pages
+        # diff against it in memory and finish_search unpublishes what no page returned. An
+        # unpublished listing that comes back is fetched again, which republishes it.
+        if self.published is None:
+            self.published = dict(self.connection().execute("SELECT link, last_price FROM listings WHERE still_published = 'True'"))
+        return self.published
+
+    def fetch_state(self, links):
+        # "link: (id, last_fetched, last_updated)" of the given stored listings
+        state = {}
+        links = list(links)
+        for start in range(0, len(links), 500):
+            chunk = links[start:start + 500]
+            cursor = self.connection().execute(
+                "SELECT link, id, last_fetched, last_updated FROM listings WHERE link IN (%s)" % ','.join('?' * len(chunk)),
+                chunk
+            )
+            for link, listing_id, last_fetched, last_updated in cursor:
+                state[link] = (listing_id, last_fetched, last_updated)
+        return state
+
+    def detail_is_stale(self, last_fetched):
+        # never fetched since last_fetched was introduced, or more than detail_refresh_hours ago
+        if self.detail_refresh_hours <= 0:
+            return True
+        try:
+            fetched = datetime.strptime(last_fetched, '%Y-%m-%dT%H:%M:%S%z')
+        except (TypeError, ValueError):
+            return True
+        return datetime.now().astimezone() - fetched >= timedelta(hours=self.detail_refresh_hours)
+
+    def price_only_item(self, listing_id, link, price, last_updated):
+        # the pipeline records the price and takes everything else from the stored listing. The
+        # listing's last_updated stays as its detail page said: the new price is timestamped
+        # seen_at, now, in the UTC offset Craigslist used for the listing.
+        try:
+            timezone = datetime.strptime(last_updated, '%Y-%m-%dT%H:%M:%S%z').tzinfo
+        except (TypeError, ValueError):
+            timezone = None
+        now = datetime.now(timezone) if timezone else datetime.now().astimezone()
+        return {
+            'price_only': True,
+            'id': listing_id,
+            'link': link,
+            'price': price,
+            'seen_at': now.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        }
 
     def parseItem(self, response):
         item = {}
 
-        item['attributes'] = response.css('.attrgroup')[2].css('div span a::text').getall()
-        item['description'] = ' '.join(response.css('section#postingbody::text').getall()).strip()
-        item['title'] = response.xpath("//meta[@property='og:title']/@content").extract_first().removesuffix('- craigslist')
-        item['link'] = response.xpath("//meta[@property='og:url']/@content").extract_first()
-        item['id'] = self.get_id(response)
-        geo = tuple(response.xpath("//meta[@name='ICBM']/@content").extract_first().split(', '))
+        # raw strings from the page, by the configured extractor (see extractors.py)
+        with METRICS.timer('extract'):
+            fields = EXTRACTORS[self.detail_extractor](response)
+
+        item['attributes'] = fields['attributes']
+        item['description'] = fields['description']
+        item['title'] = fields['title'].removesuffix('- craigslist')
+        item['link'] = fields['link']
+        item['id'] = self.get_id(fields['postinginfos'])
+        geo = tuple(fields['icbm'].split(', '))
         item['lat'] = geo[0]
         item['lon'] = geo[1]
-        item['distance'] = geopy.distance.geodesic(self.distance_from, geo).km
-        item['gym'] = self.utils.findFeature('gym', item)
-        item['pool'] = self.utils.findFeature('pool', item)
-        item['parking'] = self.utils.findFeature('parking', item)
-        item['ev_charging'] = self.utils.findFeature('ev_charging', item)
-        item['price'] = int(''.join(filter(str.isdigit, response.css('span.price').get())))
-        times = response.css('div.postinginfos p.postinginfo.reveal time::attr(datetime)').getall()
+        with METRICS.timer('distance'):
+            item['distance'] = min(geopy.distance.geodesic(distance_from, geo).km for distance_from in self.get_distance_references(response))
+        with METRICS.timer('features'):
+            item.update(self.utils.findFeatures(item)) # gym, pool, parking, ev_charging
+        item['price'] = int(''.join(filter(str.isdigit, fields['price'])))
+        times = fields['times']
         item['posted_on'] = times[0]
         if len(times) == 2: # last_updated matches created_on if not present
             item['last_updated'] = times[1]
@@ -198,8 +440,7 @@ class RentSpider(scrapy.Spider):
         item['size'] = None
 
         # properties don't have anything to distinguish them and need to be extracted one by one with regexp
-        properties = response.css('.attrgroup')[0].css('span::text').getall()
-        for attribute in properties:
+        for attribute in fields['properties']:
             attribute_string = attribute.strip()
             match regex_spm.fullmatch_in(attribute_string):
                 case r'.*BR.*':
@@ -271,17 +512,22 @@ class RentSpider(scrapy.Spider):
 
         yield item
 
-    def get_id(self, response):
+    def get_id(self, postinginfos_text):
         # the numeric post id lives in the listing page body ("post id: 1234567890").
         # it stays stable across URL/layout changes, so we keep it as the DB primary key.
-        body_text = ' '.join(response.css('.postinginfos ::text').getall())
-        id_search = self.post_id_pattern.search(body_text)
+        id_search = self.post_id_pattern.search(postinginfos_text)
 
         if id_search:
             return int(id_search.group('id'))
         else:
             raise CloseSpider('post id not found on listing page — Craigslist may have changed its page structure')
 
+    def get_distance_references(self, response):
+        # the reference points of every search that returned this listing (nearest one wins)
+        names = self.link_profiles.get(response.meta.get('link'), set())
+        references = [profile.distance_from for profile in self.search_profiles if profile.name in names]
+        return references or [self.search_profiles[0].distance_from]
+
     def get_slug(self, link):
         # human-friendly identifier for logs, derived from the listing URL (last path segment)
         return link.rstrip('/').rsplit('/', 1)[-1]
\ No newline at end of file
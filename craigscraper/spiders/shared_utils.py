@@ -25,6 +25,25 @@ class SharedUtils:
         re.IGNORECASE
     )
 
+    # every parking / ev_charging match starts (case-insensitively) with one of these keywords,
+    # so the patterns above only need to run where a keyword occurs
+    feature_keywords = {
+        'parking': ('parking', 'stall', 'space', 'attached', 'off-street', 'carport'),
+        'ev_charging': ('ev', 'electric', 'charg'),
+    }
+    # the starts of parking_pattern's first branch: once its `.*?` found no qualifier on the rest
+    # of the line from one of them, it finds none from a later one on the same line either
+    parking_line_pattern = re.compile(r'\b(?:parking|stalls?|spaces?)\b', re.IGNORECASE)
+    # characters re.IGNORECASE matches to ASCII letters that str.lower() doesn't map to them
+    # (dotted and dotless i, long s, Kelvin sign); texts containing one skip the keyword scan
+    casefold_exceptions = ('\u0130', '\u0131', '\u017f', '\u212a')
+
+    # joins the description and attributes into one text: '.' can't cross the newlines and '\s'
+    # can't cross the NUL, so no match spans two of them (same as searching each separately)
+    feature_text_separator = '\n\x00\n'
+
+    features = ('gym', 'pool', 'parking', 'ev_charging')
+
     def parse_rooms(self, rooms_str):
         # Split e.g. '2BR / 1.5Ba' into structured fields. Bedrooms are always integers;
         # bathrooms are numeric (incl. halves) or a text type ('split'/'shared'). Never raises.
@@ -59,4 +78,52 @@ class SharedUtils:
                 result = bool(self.ev_charging_pattern.search(item['description']) or any(self.ev_charging_pattern.search(attr) for attr in item['attributes']))
 
         # Convert the boolean value to 'True' or 'False' string
-        return'True' if result else 'False'
\ No newline at end of file
+        return'True' if result else 'False'
+
+    def findFeatures(self, item, features=features):
+        # same answers as findFeature, but the description and attributes are joined and lowered
+        # once, scanned for keywords with str.find, and the parking/EV patterns only run anchored
+        # at those keywords instead of being tried at every position of every text
+        description = item['description']
+        found = {}
+        if 'pool' in features:
+            found['pool'] = "pool" in description
+        if 'gym' in features:
+            found['gym'] = "gym" in description or "fitness" in description
+
+        patterns = {'parking': self.parking_pattern, 'ev_charging': self.ev_charging_pattern}
+        pending = [feature for feature in features if feature in patterns]
+        if pending:
+            text = self.feature_text_separator.join([description, *item['attributes']])
+            if any(ch in text for ch in self.casefold_exceptions):
+                for feature in pending:
+                    found[feature] = bool(patterns[feature].search(text))
+            else:
+                lowered = text.lower()
+                for feature in pending:
+                    found[feature] = self.match_at_keywords(feature, patterns[feature], text, lowered)
+
+        # Convert the boolean values to 'True' or 'False' strings
+        return {feature: 'True' if found[feature] else 'False' for feature in features}
+
+    def match_at_keywords(self, feature, pattern, text, lowered):
+        starts = sorted(pos for keyword in self.feature_keywords[feature] for pos in find_all(lowered, keyword))
+        line_end = -1  # parking_line_pattern hits before this can't match
+        for pos in starts:
+            line_start = feature == 'parking' and self.parking_line_pattern.match(text, pos)
+            if line_start and pos < line_end:
+                continue
+            if pattern.match(text, pos):
+                return True
+            if line_start:
+                line_end = text.find('\n', pos)
+                if line_end == -1:
+                    line_end = len(text)
+        return False
+
+
+def find_all(text, sub):
+    pos = text.find(sub)
+    while pos != -1:
+        yield pos
+        pos = text.find(sub, pos + 1)
@@ -2,16 +2,75 @@ import schedule
 import time
 import os
 
+def next_interval():
+    # MINUTES_INTERVAL, or with ADAPTIVE_SCHEDULE=True an interval learnt from how often listings
+    # are posted and repriced at this time of the week (see craigscraper/adaptive_schedule.py)
+    if os.environ.get('ADAPTIVE_SCHEDULE', 'False') != 'True':
+        return run_every
+    from craigscraper.adaptive_schedule import next_interval as adaptive_interval
+    return adaptive_interval(run_every)
+
 def job():
     os.system('scrapy crawl rent')
+    # the next run is counted from the end of this one, with a fresh interval each time
+    schedule.every(next_interval()).minutes.do(job)
     print('Next job is set to run at: ' + str(schedule.next_run()))
+    return schedule.CancelJob
+
+def run_persistent(run_every):
+    # Keep one process, one reactor and one CrawlerRunner alive and re-crawl RentSpider inside
+    # it. Python/Scrapy/Twisted imports, apprise plugin discovery, the user-agent providers, the
+    # pipeline's sqlite connection and schema checks, and the compiled regexes are all paid once
+    # instead of on every interval.
+    from scrapy.utils.project import get_project_settings
+    from scrapy.utils.reactor import install_reactor
+
+    settings = get_project_settings()
+    # the reactor has to be installed before anything imports twisted.internet.reactor
+    install_reactor(settings['TWISTED_REACTOR'])
+
+    from datetime import datetime, timedelta
+    from twisted.internet import reactor
+    from twisted.internet.threads import deferToThread
+    from scrapy.crawler import CrawlerRunner
+    from scrapy.utils.log import configure_logging
+    from termcolor import colored
+    from notifications import Notifications
+    from craigscraper.spiders.rent import RentSpider
+
+    configure_logging(settings)
+    runner = CrawlerRunner(settings)
+    notifications = Notifications(None)
+
+    def crawl():
+        d = runner.crawl(RentSpider, notifications=notifications)
+        # a failed crawl must not stop the daemon: report it and keep the schedule going
+        d.addErrback(lambda failure: print(colored('Crawl failed: %s' % failure.getErrorMessage(), 'red')))
+        d.addBoth(lambda _: schedule_next())
+
+    def schedule_next():
+        # like schedule.every(...), the next run is counted from the end of the previous one
+        minutes = next_interval()
+        reactor.callLater(minutes * 60, crawl)
+        print('Next job is set to run at: ' + str(datetime.now() + timedelta(minutes=minutes)))
+
+    # the crawls share one outbox: deliver what's queued and close it when the reactor stops,
+    # waiting in a thread so the shutdown's other triggers still run
+    reactor.addSystemEventTrigger('before', 'shutdown', deferToThread, notifications.close, RentSpider.notification_drain_seconds)
+
+    reactor.callWhenRunning(crawl)
+    reactor.run()
 
 run_every = int(os.environ.get('MINUTES_INTERVAL', '10'))
 
-print('Scheduler initialised')
-schedule.every(run_every).minutes.do(lambda: job())
-schedule.run_all()
+if os.environ.get('PERSISTENT_CRAWLER', 'False') == 'True':
+    print('Persistent crawler initialised')
+    run_persistent(run_every)
+else:
+    print('Scheduler initialised')
+    schedule.every(run_every).minutes.do(lambda: job())
+    schedule.run_all()
 
-while True:
-    schedule.run_pending()
-    time.sleep(1)
+    while True:
+        schedule.run_pending()
+        time.sleep(1)
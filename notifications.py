@@ -1,7 +1,11 @@
 from __future__ import annotations
 
+import hashlib
 import os
 import apprise
+from craigscraper.metrics import METRICS
+from craigscraper.notification_digest import NotificationDigest
+from craigscraper.notification_outbox import NotificationOutbox
 
 
 class Notifications:
@@ -43,6 +47,77 @@ class Notifications:
 
         self._log_active_transports()
 
+        # Deliver through a persistent outbox in the rents DB, off the reactor thread, so a slow
+        # or unreachable notifier never stalls the crawl. NOTIFICATION_OUTBOX=False sends inline.
+        self.outbox = None
+        if os.environ.get('NOTIFICATION_OUTBOX', 'True') == 'True':
+            self.outbox = NotificationOutbox(
+                self._senders(),
+                os.environ.get('RENTS_DB', 'rents.db'),
+                workers       = int(os.environ.get('NOTIFICATION_WORKERS', '4')),
+                per_transport = int(os.environ.get('NOTIFICATION_TRANSPORT_CONCURRENCY', '1')),
+                max_attempts  = int(os.environ.get('NOTIFICATION_MAX_ATTEMPTS', '5')),
+                retry_seconds = float(os.environ.get('NOTIFICATION_RETRY_SECONDS', '30')),
+            )
+
+        # Digest mode: coalesce listing events into one summary per NOTIFICATION_DIGEST_MAX_EVENTS
+        # events or NOTIFICATION_DIGEST_SECONDS, plus whatever is left when the crawl closes.
+        self.digest = None
+        if os.environ.get('NOTIFICATION_DIGEST', 'False') == 'True':
+            self.digest = NotificationDigest(
+                self.send,
+                max_events  = int(os.environ.get('NOTIFICATION_DIGEST_MAX_EVENTS', '25')),
+                max_seconds = float(os.environ.get('NOTIFICATION_DIGEST_SECONDS', '600')),
+            )
+
+    def notify(self, title, body, notify_type=apprise.NotifyType.INFO, body_format=None, summary=None, urgent=False):
+        # summary: this event's line(s) in a digest; urgent events skip the digest
+        if self.digest is not None and not urgent:
+            self.digest.add(title, body, notify_type, body_format, summary)
+            return
+        return self.send(title, body, notify_type, body_format)
+
+    def send(self, title, body, notify_type=apprise.NotifyType.INFO, body_format=None):
+        notify_type = notify_type or apprise.NotifyType.INFO
+        if self.outbox is None:
+            with METRICS.timer('notify'):
+                sent = self.apobj.notify(title=title, body=body, notify_type=notify_type, body_format=body_format)
+            METRICS.inc('notifications_sent' if sent else 'notifications_failed')
+            return sent
+        self.outbox.notify(title, body, notify_type, body_format)
+
+    def flush_digest(self):
+        if self.digest is not None:
+            self.digest.flush()
+
+    def drain(self, timeout=None):
+        # block until queued notifications are delivered (or timeout); no-op when sending inline
+        if self.outbox is not None:
+            return self.outbox.drain(timeout)
+        return True
+
+    def close(self, timeout=None):
+        # blocking: wait up to `timeout` for queued notifications, then stop the outbox workers and
+        # close its connection. True if everything was delivered.
+        delivered = self.drain(timeout)
+        if self.outbox is not None:
+            self.outbox.close()
+        return delivered
+
+    def _senders(self):
+        # one single-transport Apprise per configured URL, keyed by a hash of the URL so queued
+        # rows find their transport again after a restart without storing credentials in the DB
+        senders = {}
+        for index, server in enumerate(self.apobj):
+            try:
+                url = server.url(privacy=False)
+            except Exception:
+                url = '%s-%d' % (server.__class__.__name__, index)
+            sender = apprise.Apprise(asset=self.apobj.asset)
+            sender.add(server)
+            senders[hashlib.sha1(url.encode()).hexdigest()[:16]] = sender
+        return senders
+
     def _log_active_transports(self):
         # Surface which notification transports are actually active. This makes a dead or
         # placeholder config visible instead of silently sending nowhere — the default
@@ -0,0 +1,44 @@
+import sqlite3
+from datetime import datetime, timedelta, timezone
+
+from craigscraper.adaptive_schedule import event_rates, interval_minutes, market_timezone
+
+PST = timezone(timedelta(hours=-8))
+NOW = datetime(2025, 3, 14, 12, 30, tzinfo=PST)  # a Friday
+
+
+def _db():
+    con = sqlite3.connect(':memory:')
+    con.execute("CREATE TABLE listings (id INTEGER PRIMARY KEY, posted_on TEXT)")
+    con.execute("CREATE TABLE prices (listing_id INTEGER, last_updated TEXT, price INTEGER)")
+    return con
+
+
+def _ts(when):
+    return when.strftime('%Y-%m-%dT%H:%M:%S%z')
+
+
+def test_event_rates_count_new_and_repriced_listings_per_hour_of_week():
+    con = _db()
+    listing_id = 0
+    for week in range(4):
+        friday_noon = NOW.replace(minute=5) - timedelta(weeks=week)
+        for _ in range(6):  # six new listings every Friday at noon
+            listing_id += 1
+            con.execute("INSERT INTO listings VALUES (?, ?)", (listing_id, _ts(friday_noon)))
+            con.execute("INSERT INTO prices VALUES (?, ?, 2000)", (listing_id, _ts(friday_noon)))
+        # and one of them repriced an hour later: the first price row of a listing isn't a reprice
+        con.execute("INSERT INTO prices VALUES (?, ?, 1900)", (listing_id, _ts(friday_noon.replace(hour=13))))
+    con.execute("INSERT INTO listings VALUES (999, ?)", (_ts(NOW - timedelta(weeks=20)),))  # outside the window
+
+    rates = event_rates(con, weeks=4, now=NOW)
+    assert rates == {(4, 12): 6.0, (4, 13): 1.0}
+    assert market_timezone(con) == PST
+
+
+def test_interval_follows_the_rate_within_bounds():
+    rates = {(4, 11): 6.0, (4, 12): 6.0, (4, 13): 6.0}
+    assert interval_minutes(rates, NOW, 2, 60) == 10             # 6 events/hour -> one every 10 minutes
+    assert interval_minutes(rates, NOW, 2, 60, target_events=0.1) == 2
+    assert interval_minutes({(4, 12): 3.0}, NOW, 2, 60) == 60    # 1 event/hour once smoothed
+    assert interval_minutes({}, NOW, 2, 60) == 60                # quiet night: the longest interval
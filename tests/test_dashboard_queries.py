@@ -0,0 +1,91 @@
+import sqlite3
+
+from craigscraper import dashboard_queries as queries
+
+
+def _db():
+    con = sqlite3.connect(':memory:')
+    con.execute("""CREATE TABLE listings (id INTEGER PRIMARY KEY, link TEXT, title TEXT, bedrooms REAL,
+                   bathrooms REAL, size INTEGER, last_price INTEGER, available_on TEXT, posted_on TEXT,
+                   last_updated TEXT, distance REAL, gym TEXT, pool TEXT, parking TEXT, ev_charging TEXT,
+                   still_published TEXT, description TEXT, attributes BLOB)""")
+    con.execute("CREATE TABLE prices (listing_id INTEGER, last_updated TEXT, price INTEGER)")
+    rows = []
+    for n in range(1, 41):
+        rows.append((
+            n, 'https://example.org/%d.html' % n, 'Listing %d' % n, float(n % 3 + 1), 1.0,
+            None if n % 7 == 0 else 400 + (n * 37) % 500,  # some sizes missing
+            2000 + (n * 53) % 900, None, '2025-03-01T10:00:00-0800', '2025-03-02T10:00:00-0800', 1.0,
+            'True' if n % 2 else 'False', 'False', 'True' if n % 5 == 0 else 'False', 'False',
+            'False' if n % 4 == 0 else 'True', 'description %d' % n, 'laundry in bldg'
+        ))
+    con.executemany("INSERT INTO listings VALUES (%s)" % ','.join('?' * 18), rows)
+    return con
+
+
+def _walk(con, filters, sort, descending, page_size):
+    ids, cursor = [], None
+    while True:
+        page, cursor = queries.load_listings_page(con, filters, sort, descending, cursor, page_size)
+        assert len(page) <= page_size
+        ids += page['id'].tolist()
+        if cursor is None:
+            return ids
+
+
+def _expected(con, filters, sort, descending):
+    clauses, params = queries.listing_filters(filters)
+    rows = con.execute("SELECT id, %s FROM listings%s" % (sort, queries._where(clauses)), params).fetchall()
+    present = sorted((r for r in rows if r[1] is not None), key=lambda r: (r[1], r[0]), reverse=descending)
+    missing = sorted((r for r in rows if r[1] is None), key=lambda r: r[0], reverse=descending)
+    return [r[0] for r in present + missing]
+
+
+def test_keyset_pages_cover_every_match_once_in_order():
+    con = _db()
+    filters = {'available_only': True, 'price_range': (2100, 2800), 'bedrooms': (1.0, 2.0), 'features': ('gym',)}
+    for sort in ('size', 'last_price', 'title'):
+        for descending in (True, False):
+            expected = _expected(con, filters, sort, descending)
+            assert expected  # the filters leave something to page through
+            assert _walk(con, filters, sort, descending, page_size=4) == expected
+    assert queries.count_listings(con, filters) == len(expected)
+
+
+def test_missing_values_sort_last_in_both_directions():
+    con = _db()
+    for descending in (True, False):
+        ids = _walk(con, {}, 'size', descending, page_size=6)
+        assert ids[-5:] == sorted([7, 14, 21, 28, 35], reverse=descending)
+
+
+def test_page_selects_only_displayed_columns_and_details_load_on_demand():
+    con = _db()
+    page, cursor = queries.load_listings_page(con, {'features': ('parking',)}, 'last_price', page_size=100)
+    assert cursor is None
+    assert list(page.columns) == queries.LISTING_COLUMNS
+    assert set(page['parking']) == {True}
+    assert queries.get_listing_details(con, 5) == {'description': 'description 5', 'attributes': 'laundry in bldg'}
+    assert queries.get_listing_details(con, 999) is None
+
+
+def test_snapshot_inputs_are_aggregated_in_sql():
+    con = _db()
+    con.executemany("INSERT INTO prices VALUES (?, ?, ?)", [
+        (1, '2025-03-01T10:00:00-0800', 2000), (1, '2025-03-05T10:00:00-0800', 2100),  # increase
+        (2, '2025-03-01T10:00:00-0800', 2200), (2, '2025-03-04T10:00:00-0800', 2000),  # decrease
+        (3, '2025-03-01T10:00:00-0800', 2300),
+    ])
+    filters = {'available_only': True}
+    points = queries.load_price_points(con, filters)
+    clauses, params = queries.listing_filters(filters)
+    assert points['n'].sum() == con.execute("SELECT COUNT(*) FROM listings" + queries._where(clauses), params).fetchone()[0]
+    assert not points.duplicated(['bedrooms', 'last_price']).any()
+
+    trends = dict(queries.load_trend_counts(con, {}).values.tolist())
+    assert trends == {'increase': 1, 'decrease': 1, 'stable': 38}
+    assert queries.load_price_points(con, {'rented_only': True})['n'].sum() == 10  # every 4th listing
+
+    titles = queries.load_listing_titles(con, {'features': ('parking',)})
+    assert sorted(titles['id']) == [5, 10, 15, 20, 25, 30, 35, 40]
+    assert queries.get_listing_title(con, 5) == 'Listing 5'
@@ -0,0 +1,33 @@
+import sqlite3
+
+import pytest
+
+from craigscraper.db import checkpoint, connect
+
+
+def test_connect_enables_wal(tmp_path):
+    con = connect(str(tmp_path / 'rents.db'))
+    assert con.execute("PRAGMA journal_mode").fetchone() == ('wal',)
+    assert con.execute("PRAGMA synchronous").fetchone() == (1,)  # NORMAL
+
+def test_readers_are_not_blocked_by_an_open_write(tmp_path):
+    path = str(tmp_path / 'rents.db')
+    writer = connect(path)
+    writer.execute("CREATE TABLE listings (id INTEGER PRIMARY KEY, last_price INTEGER)")
+    writer.execute("INSERT INTO listings VALUES (1, 2000)")
+    writer.commit()
+
+    # the crawler is in the middle of a batch...
+    writer.execute("UPDATE listings SET last_price = 2100 WHERE id = 1")
+
+    # ...and the dashboard still reads the last committed snapshot right away
+    reader = connect(path, read_only=True)
+    assert reader.execute("SELECT last_price FROM listings").fetchone() == (2000,)
+    writer.commit()
+    assert reader.execute("SELECT last_price FROM listings").fetchone() == (2100,)
+
+    with pytest.raises(sqlite3.OperationalError):
+        reader.execute("DELETE FROM listings")
+
+    busy, _, _ = checkpoint(writer, 'TRUNCATE')
+    assert busy == 0
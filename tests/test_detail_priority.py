@@ -0,0 +1,34 @@
+import json
+
+from craigscraper.search_profiles import SearchProfile
+from craigscraper.spiders.priority import detail_priority, parse_result_coordinates
+
+PROFILE = SearchProfile('default', min_price='2000', max_price='2700', search_distance='1.41',
+                        distance_from_lat='49.2799016', distance_from_lon='-123.1167676')
+NEAR = (49.2801, -123.1170)
+FAR = (49.2684, -123.1683)
+
+
+def test_new_near_cheap_listings_come_first():
+    assert detail_priority(PROFILE, 2100, None, NEAR) > detail_priority(PROFILE, 2100, None, FAR)
+    assert detail_priority(PROFILE, 2100, None, NEAR) > detail_priority(PROFILE, 2600, None, NEAR)
+    # a new listing beats a repriced one, unless the price dropped a lot
+    assert detail_priority(PROFILE, 2400, None, FAR) > detail_priority(PROFILE, 2400, 2450, FAR)
+    assert detail_priority(PROFILE, 2400, 2700, FAR) > detail_priority(PROFILE, 2400, 2450, FAR)
+
+
+def test_priority_stays_within_bounds():
+    assert detail_priority(PROFILE, 2000, None, NEAR, weights={'new': 1, 'distance': 1, 'price': 1}) == 90
+    assert detail_priority(PROFILE, 2900, 2800, (48.0, -122.0), max_priority=90) == 0
+    assert detail_priority(PROFILE, 2300, None, None, weights={'distance': 1}) == 45  # unknown location: halfway
+
+
+def test_parse_result_coordinates():
+    ld_json = json.dumps({'itemListElement': [
+        {'item': {'name': 'Bright 1BR ', 'latitude': 49.27, 'longitude': '-123.12'}},
+        {'item': {'name': 'No location'}},
+        'garbage',
+    ]})
+    assert parse_result_coordinates(ld_json) == {'Bright 1BR': (49.27, -123.12)}
+    assert parse_result_coordinates('{not json') == {}
+    assert parse_result_coordinates(None) == {}
@@ -0,0 +1,30 @@
+import pytest
+
+from benchmarks.corpus import html_response, listing_fixtures, offline_spider, synthesize_listings
+from craigscraper.spiders.extractors import extract_lxml, extract_parsel
+
+
+def _pages():
+    pages = list(listing_fixtures())
+    pages += [(link.rsplit('/', 1)[-1], html) for link, _, _, html in synthesize_listings(5, seed=3)]
+    return pages
+
+@pytest.mark.parametrize('name,html', _pages(), ids=[name for name, _ in _pages()])
+def test_lxml_extractor_matches_parsel(name, html):
+    response = html_response('https://vancouver.craigslist.org/x.html', html)
+    assert extract_lxml(response) == extract_parsel(response)
+
+def test_parse_item_is_the_same_with_either_extractor(tmp_path):
+    for name, html in listing_fixtures():
+        items = []
+        for extractor in ('parsel', 'lxml'):
+            spider = offline_spider(str(tmp_path / 'rents.db'), extractor)
+            items.extend(spider.parseItem(html_response('https://vancouver.craigslist.org/x.html', html)))
+        assert items[0] == items[1], name
+
+def test_lxml_extractor_fails_like_parsel_on_a_broken_page():
+    response = html_response('https://vancouver.craigslist.org/x.html', '<html><body><p>nothing here</p></body></html>')
+    with pytest.raises(IndexError):
+        extract_parsel(response)
+    with pytest.raises(IndexError):
+        extract_lxml(response)
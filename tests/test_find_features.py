@@ -0,0 +1,42 @@
+import random
+
+from craigscraper.spiders.shared_utils import SharedUtils
+
+utils = SharedUtils()
+
+WORDS = [
+    'parking', 'Parking', 'stall', 'stalls', 'space', 'spaces', 'spacious', 'secured', 'underground',
+    'garage', 'attached', 'off-street', 'carport', 'included', 'available', 'fee', 'for', '2',
+    'EV', 'ev', 'EVC', 'electric', 'vehicle', 'car', 'charging', 'charger', 'station', 'port',
+    'on-site', 'pool', 'Liverpool', 'gym', 'fitness', 'room', 'the', 'bright', 'unit', 'is',
+    'every', 'seven', 'discharge', 'ſtall', 'İndoor',  # mid-word keywords, case-folding oddities
+]
+SEPARATORS = [' ', ' ', ' ', '  ', '\n', ', ', '-']
+
+def _text(rng, words):
+    out = []
+    for _ in range(words):
+        out.append(rng.choice(WORDS))
+        out.append(rng.choice(SEPARATORS))
+    return ''.join(out)
+
+def _reference(item):
+    return {feature: utils.findFeature(feature, item) for feature in SharedUtils.features}
+
+def test_find_features_matches_find_feature_on_random_text():
+    rng = random.Random(15)
+    for _ in range(5000):
+        item = {
+            'description': _text(rng, rng.randint(0, 12)),
+            'attributes': [_text(rng, rng.randint(1, 3)) for _ in range(rng.randint(0, 3))],
+        }
+        assert utils.findFeatures(item) == _reference(item), item
+
+def test_matches_never_span_two_attributes():
+    # 'EV' and 'charging' in separate attributes is not EV charging
+    item = {'description': '', 'attributes': ['EV', 'charging', 'attached', 'garage']}
+    assert utils.findFeatures(item) == _reference(item) == {'gym': 'False', 'pool': 'False', 'parking': 'False', 'ev_charging': 'False'}
+
+def test_find_features_subset():
+    item = {'description': 'Underground parking stall included, EV charging on-site', 'attributes': []}
+    assert utils.findFeatures(item, ('ev_charging',)) == {'ev_charging': 'True'}
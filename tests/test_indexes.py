@@ -0,0 +1,43 @@
+import sqlite3
+
+from craigscraper.indexes import ensure_indexes, query_plans, slow_plans
+
+
+def _db(prices_unique=True):
+    con = sqlite3.connect(':memory:')
+    con.execute("CREATE TABLE listings (id INTEGER PRIMARY KEY, link TEXT, last_price INTEGER, last_updated TEXT, still_published TEXT, last_fetched TEXT)")
+    unique = ", UNIQUE(listing_id, last_updated, price) ON CONFLICT IGNORE" if prices_unique else ""
+    con.execute("CREATE TABLE prices (listing_id INTEGER, last_updated TEXT, price INTEGER%s)" % unique)
+    con.execute("CREATE TABLE listing_changes (listing_id INTEGER, field TEXT, old_value TEXT, new_value TEXT, changed_at TEXT)")
+    con.execute("CREATE INDEX listing_changes_ids ON listing_changes(listing_id)")
+    return con
+
+
+def _index_names(con):
+    return {r[0] for r in con.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+
+
+def test_hot_queries_use_indexes():
+    con = _db()
+    assert slow_plans(con)  # unindexed tables scan
+    ensure_indexes(con)
+    assert slow_plans(con) == {}, query_plans(con)
+
+
+def test_hot_queries_use_indexes_on_legacy_prices_table():
+    # databases created before the prices UNIQUE constraint have no automatic index
+    con = _db(prices_unique=False)
+    ensure_indexes(con)
+    assert slow_plans(con) == {}, query_plans(con)
+    assert 'prices_listing_updated' in _index_names(con)
+
+
+def test_ensure_indexes_is_idempotent_and_skips_redundant_indexes():
+    con = _db()
+    ensure_indexes(con)
+    first = _index_names(con)
+    ensure_indexes(con)
+    assert _index_names(con) == first
+    # the UNIQUE constraint's automatic index already covers prices(listing_id, last_updated, price)
+    assert 'prices_listing_updated' not in first
+    assert 'listing_changes_ids' not in first
@@ -0,0 +1,55 @@
+from types import SimpleNamespace
+
+import pytest
+
+from craigscraper import market_aggregates
+from craigscraper.pipelines import CraigscraperPipeline
+from tests.test_pipeline_batching import _item
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setenv('RENTS_DB', str(tmp_path / 'rents.db'))
+    monkeypatch.setenv('PIPELINE_BATCH_SIZE', '2')
+    return CraigscraperPipeline()
+
+
+def _tables(con):
+    return (
+        sorted(con.execute("SELECT month, bedrooms, price, n FROM market_price_counts").fetchall()),
+        sorted(con.execute("SELECT * FROM market_months").fetchall()),
+    )
+
+
+def test_incremental_updates_match_a_rebuild(pipeline):
+    spider = SimpleNamespace(first_run=True)
+    two_bedroom = dict(_item(3, 3000), bedrooms=2.0, posted_on='2025-01-20T09:00:00-0800')
+    for item in [
+        _item(1, 2000),
+        _item(2, 2100),
+        two_bedroom,
+        _item(1, 1900, last_updated='2025-04-02T10:00:00-0800'),   # price drop, seen until April
+        dict(_item(2, 2100, last_updated='2025-03-09T10:00:00-0800'), bedrooms=2.0),  # bedrooms corrected
+        dict(two_bedroom, posted_on='2025-03-05T09:00:00-0800'),  # reposted later
+    ]:
+        pipeline.process_item(item, spider)
+    pipeline.close_spider(spider)
+
+    incremental = _tables(pipeline.con)
+    market_aggregates.rebuild(pipeline.con)
+    assert _tables(pipeline.con) == incremental
+
+    prices, months = incremental
+    assert prices == [('2025-03', 1.0, 2000, 1), ('2025-03', 2.0, 2100, 1), ('2025-03', 2.0, 3000, 1),
+                      ('2025-04', 1.0, 1900, 1)]
+    # month, new listings, span starts, span ends, days on market total, listings
+    assert months == [('2025-03', 3, 3, 0, 36, 3), ('2025-04', 0, 0, 2, 0, 0), ('2025-05', 0, 0, 1, 0, 0)]
+
+
+def test_rebuild_skips_unparseable_and_inverted_spans(pipeline):
+    pipeline.con.executemany(
+        "INSERT INTO listings (id, posted_on, last_updated) VALUES (?, ?, ?)",
+        [(1, '2025-05-01T10:00:00-0800', '2025-03-01T10:00:00-0800'), (2, '2025-05-01', None)]
+    )
+    market_aggregates.rebuild(pipeline.con)
+    assert _tables(pipeline.con)[1] == [('2025-05', 2, 0, 0, -61, 1)]
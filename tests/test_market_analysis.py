@@ -1,7 +1,9 @@
 import pandas as pd
 from craigscraper.market_analysis import (
     MIN_POINTS_PER_BUCKET, monthly_median_rent, new_listings_per_month,
-    pct_change_vs, active_listings_per_month
+    pct_change_vs, active_listings_per_month, price_chain_labels, median_from_counts,
+    monthly_median_rent_from_counts, active_listings_from_months, new_listings_from_months,
+    price_stats_from_counts
 )
 
 def _prices(rows):
@@ -71,3 +73,101 @@ def test_sqlite_month_extraction_matches_iso_timestamps():
     con.close()
     assert strftime_month is None          # strftime fails on this format
     assert substr_month == '2025-02'       # substr is the correct extraction
+
+
+def _active_reference(spans):
+    # the original per-listing, per-month loop
+    counts = {}
+    for posted, last in spans:
+        start = int(posted[:4]) * 12 + int(posted[5:7]) - 1
+        end = int(last[:4]) * 12 + int(last[5:7]) - 1
+        for idx in range(start, end + 1):
+            m = '%04d-%02d' % (idx // 12, idx % 12 + 1)
+            counts[m] = counts.get(m, 0) + 1
+    return counts
+
+def test_active_listings_per_month_matches_reference_on_random_spans():
+    import random
+    rng = random.Random(7)
+    spans = []
+    for _ in range(500):
+        start = rng.randint(2020 * 12, 2026 * 12)
+        end = start + rng.choice([0, 0, 1, 2, 5, 30])
+        spans.append(('%04d-%02d' % (start // 12, start % 12 + 1), '%04d-%02d' % (end // 12, end % 12 + 1)))
+    out = active_listings_per_month(pd.DataFrame(spans, columns=['posted_month', 'last_month']))
+    assert dict(zip(out['month'], out['active'])) == _active_reference(spans)
+    assert list(out['month']) == sorted(out['month'])
+
+def test_active_listings_per_month_skips_gaps_and_bad_rows():
+    spans = pd.DataFrame(
+        [('2025-01', '2025-01'), ('2025-04', '2025-04'), (None, '2025-02'), ('2025-06', '2025-05')],
+        columns=['posted_month', 'last_month']
+    )
+    out = active_listings_per_month(spans)
+    assert list(out['month']) == ['2025-01', '2025-04']  # no empty months in the gap, inverted span ignored
+    assert list(out['active']) == [1, 1]
+
+
+def test_price_chain_labels_collapse_repeats_in_date_order():
+    prices = pd.DataFrame([
+        (1, pd.Timestamp('2025-03-01', tz='UTC'), 2000),
+        (1, pd.Timestamp('2025-01-01', tz='UTC'), 2100),
+        (1, pd.Timestamp('2025-02-01', tz='UTC'), 2100),
+        (1, pd.Timestamp('2025-04-01', tz='UTC'), 2100),
+        (2, pd.Timestamp('2025-01-01', tz='UTC'), 1500),   # single point: no chain
+        (3, pd.Timestamp('2025-01-01', tz='UTC'), 1800),
+        (3, pd.Timestamp('2025-02-01', tz='UTC'), 1800),   # repeats collapse to one price
+    ], columns=['listing_id', 'last_updated', 'price'])
+    assert price_chain_labels(prices) == {1: '$2,100→$2,000→$2,100', 3: '$1,800'}
+    assert price_chain_labels(prices.iloc[0:0]) == {}
+
+
+def test_median_from_counts_matches_raw_medians():
+    import random
+    rng = random.Random(3)
+    rows = [('2025-%02d' % rng.randint(1, 4), float(rng.choice([1, 2])), rng.choice(range(1800, 2600, 50)))
+            for _ in range(400)]
+    raw = _prices(rows)
+    counts = raw.groupby(['month', 'bedrooms', 'price']).size().reset_index(name='n')
+    expected = monthly_median_rent(raw)
+    got = monthly_median_rent_from_counts(counts)
+    assert got[['month', 'bedrooms', 'n']].values.tolist() == expected[['month', 'bedrooms', 'n']].values.tolist()
+    assert got['median_price'].tolist() == expected['median_price'].tolist()
+    # pooled per month, without the sparsity guard (the dashboard's delta metrics)
+    pooled = median_from_counts(counts, ['month'], min_points=1)
+    assert pooled['median_price'].tolist() == raw.groupby('month')['price'].median().sort_index().tolist()
+
+def test_median_from_counts_even_count_averages_middle_prices():
+    counts = pd.DataFrame([('2025-03', 1.0, 2000, 3), ('2025-03', 1.0, 2400, 3)],
+                          columns=['month', 'bedrooms', 'price', 'n'])
+    out = monthly_median_rent_from_counts(counts)
+    assert out.iloc[0]['median_price'] == 2200
+    assert out.iloc[0]['n'] == 6
+
+def test_active_listings_from_months_matches_spans():
+    spans = [('2025-01', '2025-03'), ('2025-02', '2025-02'), ('2025-11', '2026-01')]
+    months = pd.DataFrame([
+        # month, new_listings, span_starts, span_ends (month after the last active one), dom
+        ('2025-01', 1, 1, 0, 0, 0),
+        ('2025-02', 1, 1, 0, 0, 0),
+        ('2025-03', 0, 0, 1, 0, 0),
+        ('2025-04', 0, 0, 1, 0, 0),
+        ('2025-11', 1, 1, 0, 0, 0),
+        ('2026-02', 0, 0, 1, 0, 0),
+    ], columns=['month', 'new_listings', 'span_starts', 'span_ends', 'dom_days', 'dom_listings'])
+    out = active_listings_from_months(months)
+    assert dict(zip(out['month'], out['active'])) == _active_reference(spans)
+    assert list(new_listings_from_months(months)['month']) == ['2025-01', '2025-02', '2025-11']
+
+def test_price_stats_from_counts_match_the_expanded_prices():
+    import random
+    rng = random.Random(5)
+    raw = pd.DataFrame([(float(rng.choice([1, 2, 3])), rng.choice(range(1800, 3000, 25))) for _ in range(301)],
+                       columns=['bedrooms', 'last_price'])
+    counts = raw.groupby(['bedrooms', 'last_price']).size().reset_index(name='n')
+    got = price_stats_from_counts(counts)
+    grouped = raw.groupby('bedrooms')['last_price']
+    assert got['count'].tolist() == grouped.count().tolist()
+    assert got['avg_price'].round(6).tolist() == grouped.mean().round(6).tolist()
+    for column, q in (('min_price', 0), ('q1_price', 0.25), ('median_price', 0.5), ('q3_price', 0.75), ('max_price', 1)):
+        assert got[column].tolist() == grouped.quantile(q).tolist(), column
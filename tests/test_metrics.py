@@ -0,0 +1,100 @@
+import json
+import sqlite3
+import urllib.request
+
+from craigscraper.metrics import Histogram, Metrics, save_crawl_run, save_run, serve
+
+
+def test_histogram_quantiles_interpolate_within_buckets():
+    h = Histogram(buckets=(0.1, 1, 10))
+    for value in [0.05] * 50 + [0.5] * 45 + [5] * 5:
+        h.observe(value)
+    assert (h.count, h.max) == (100, 5)
+    assert round(h.sum, 6) == 50.0
+    assert 0 < h.quantile(0.5) <= 0.1     # the 50th observation is in the first bucket
+    assert 0.1 < h.quantile(0.95) <= 1
+    assert h.quantile(1.0) == 5           # capped at the largest value seen
+    assert Histogram().quantile(0.5) is None
+
+
+def test_run_summary_resets_per_crawl_but_totals_keep_growing():
+    metrics = Metrics()
+    metrics.observe('extract', 0.002)
+    metrics.inc('items_written', 3)
+    metrics.begin_run()
+    with metrics.timer('extract'):
+        pass
+    metrics.inc('items_written')
+
+    stages, counters = metrics.run_summary()
+    assert stages['extract'][0] == 1
+    assert counters == {'items_written': 1}
+    text = metrics.render()
+    assert 'craigscraper_stage_seconds_count{stage="extract"} 2' in text
+    assert 'craigscraper_stage_seconds_bucket{stage="extract",le="+Inf"} 2' in text
+    assert 'craigscraper_items_written_total 4' in text
+
+
+def test_endpoint_serves_the_registry():
+    metrics = Metrics()
+    metrics.observe('download', 0.3)
+    server = serve(0, metrics=metrics)
+    try:
+        url = 'http://127.0.0.1:%d/metrics' % server.server_address[1]
+        with urllib.request.urlopen(url, timeout=5) as response:
+            assert response.headers['Content-Type'].startswith('text/plain')
+            assert 'craigscraper_stage_seconds_sum{stage="download"} 0.3' in response.read().decode()
+    finally:
+        server.shutdown()
+
+
+def test_save_run_stores_one_row_per_stage_and_counter():
+    metrics = Metrics()
+    metrics.observe('db_write', 0.02)
+    metrics.observe('db_write', 0.04)
+    metrics.inc('detail_pages', 7)
+    con = sqlite3.connect(':memory:')
+    save_run(con, '2025-03-01T10:00:00-0800', '2025-03-01T10:02:00-0800', metrics)
+    rows = con.execute("SELECT metric, count, total_seconds, max_seconds FROM crawl_metrics ORDER BY metric").fetchall()
+    assert rows[0][0] == 'db_write' and rows[0][1] == 2 and rows[0][3] == 0.04
+    assert round(rows[0][2], 6) == 0.06
+    assert rows[1] == ('detail_pages', 7, None, None)
+
+
+def test_save_crawl_run_records_counts_freshness_and_stage_totals():
+    metrics = Metrics()
+    metrics.inc('detail_pages', 4)
+    metrics.inc('new_listings', 2)
+    metrics.inc('new_listings_written', 2)
+    metrics.inc('new_listing_age_seconds', 900)
+    metrics.observe('extract', 0.5)
+    con = sqlite3.connect(':memory:')
+    save_crawl_run(con, '2025-03-01T10:00:00-0800', '2025-03-01T10:02:00-0800', 120.0, 'finished', metrics)
+    con.row_factory = sqlite3.Row
+    run = con.execute("SELECT * FROM crawl_runs").fetchone()
+    assert (run['duration_seconds'], run['reason'], run['detail_pages'], run['new_listings'], run['search_pages']) == (120.0, 'finished', 4, 2, 0)
+    assert run['new_listing_age_seconds'] == 450
+    assert json.loads(run['stage_seconds']) == {'extract': 0.5}
+
+
+def test_crawl_metrics_count_bytes_as_downloaded():
+    import gzip
+    from scrapy.http import HtmlResponse, Request
+    from craigscraper.extensions import CrawlMetrics
+    from craigscraper.metrics import METRICS
+
+    extension = CrawlMetrics(':memory:', 0, '127.0.0.1')
+    extension.spider_opened(None)
+    request = Request('https://vancouver.craigslist.org/1.html', meta={'detail_page': True})
+    page = b'<html>' + b'spacious 1BR near the seawall ' * 200 + b'</html>'
+    wire = HtmlResponse(request.url, body=gzip.compress(page), headers={'Content-Encoding': 'gzip'}, request=request)
+
+    extension.response_downloaded(wire, request, None)
+    received = wire.replace(body=gzip.decompress(wire.body))  # what HttpCompressionMiddleware passes on
+    extension.response_received(received, request, None)
+    # answered by the page cache: nothing downloaded
+    extension.response_received(received.replace(flags=['cached']), request, None)
+
+    counters = METRICS.run_summary()[1]
+    assert counters['bytes_downloaded'] == len(wire.body) < len(page)
+    assert (counters['detail_pages'], counters['cached_pages']) == (1, 1)
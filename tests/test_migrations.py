@@ -0,0 +1,42 @@
+import sqlite3
+
+from craigscraper.migrations import MIGRATIONS, apply_migrations, applied_versions
+
+
+def _db():
+    con = sqlite3.connect(':memory:')
+    con.execute("""CREATE TABLE listings (id INTEGER PRIMARY KEY, rooms TEXT, bedrooms REAL, bathrooms REAL,
+                   bathrooms_type TEXT, attributes BLOB, description TEXT, gym TEXT, pool TEXT,
+                   parking TEXT, ev_charging TEXT, last_updated TEXT, posted_on TEXT)""")
+    con.execute("CREATE TABLE prices (listing_id INTEGER, last_updated TEXT, price INTEGER)")
+    return con
+
+
+def test_migrations_repair_and_record_in_ledger():
+    con = _db()
+    con.execute("INSERT INTO listings (id, rooms, attributes, description) VALUES (1, '2BR / 1Ba', '', 'rooftop pool')")
+    con.executemany("INSERT INTO prices VALUES (1, ?, ?)",
+                    [('2025-01-01', 2000), ('2025-01-02', 2000), ('2025-01-03', 2100), ('2025-01-04', 2000)])
+
+    apply_migrations(con)
+
+    assert con.execute("SELECT pool, gym, bedrooms FROM listings").fetchone() == ('True', 'False', 2.0)
+    # only the consecutive duplicate is purged; the real round-trip back to 2000 is kept
+    assert [r[0] for r in con.execute("SELECT price FROM prices ORDER BY last_updated")] == [2000, 2100, 2000]
+    assert applied_versions(con) == {m[0] for m in MIGRATIONS}
+
+
+def test_applied_migrations_are_skipped():
+    con = _db()
+    calls = []
+    migrations = [(1, 'first', lambda c: calls.append(1)), (2, 'second', lambda c: calls.append(2))]
+
+    apply_migrations(con, migrations)
+    apply_migrations(con, migrations)
+    assert calls == [1, 2]
+
+    # a migration appended later runs exactly once
+    migrations.append((3, 'third', lambda c: calls.append(3)))
+    apply_migrations(con, migrations)
+    apply_migrations(con, migrations)
+    assert calls == [1, 2, 3]
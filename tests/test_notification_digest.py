@@ -0,0 +1,65 @@
+from craigscraper.notification_digest import NotificationDigest, most_severe
+
+
+def _digest(**kwargs):
+    sent = []
+    digest = NotificationDigest(lambda *message: sent.append(message), **kwargs)
+    return digest, sent
+
+def test_events_are_coalesced_until_flush():
+    digest, sent = _digest()
+    digest.add('$2000 / 600sqft - Nice 1br', 'Link: a\nGym: True', 'success', 'text', summary='$2000 / 600sqft - Nice 1br\na')
+    digest.add('$2100 / 700sqft - Big 1br', 'Link: b\nGym: False', 'success', 'text', summary='$2100 / 700sqft - Big 1br\nb')
+    assert sent == []
+    digest.flush()
+    assert sent == [('Craigscraper: 2 updates', '$2000 / 600sqft - Nice 1br\na\n\n$2100 / 700sqft - Big 1br\nb', 'success', 'text')]
+    digest.flush()  # nothing left
+    assert len(sent) == 1
+
+def test_flushes_every_max_events():
+    digest, sent = _digest(max_events=3)
+    for n in range(7):
+        digest.add('title %d' % n, 'body')
+    assert [title for title, _, _, _ in sent] == ['Craigscraper: 3 updates', 'Craigscraper: 3 updates']
+    digest.flush()
+    assert sent[-1] == ('title 6', 'body', None, None)  # a lone event is sent unchanged
+
+def test_flushes_once_the_oldest_event_is_too_old():
+    digest, sent = _digest(max_seconds=0)
+    digest.add('title', 'body')
+    assert sent == [('title', 'body', None, None)]
+
+def test_digest_takes_the_most_severe_type():
+    assert most_severe(['success', None, 'warning', 'info']) == 'warning'
+    assert most_severe([None]) is None
+
+def test_timer_sends_the_digest_of_a_quiet_crawl(monkeypatch):
+    import craigscraper.notification_digest as notification_digest
+    now = [1000.0]
+    monkeypatch.setattr(notification_digest.time, 'monotonic', lambda: now[0])
+    timers = []
+
+    class FakeTimer:
+        def __init__(self, seconds, callback):
+            self.seconds, self.callback, self.cancelled = seconds, callback, False
+            timers.append(self)
+        def start(self):
+            pass
+        def cancel(self):
+            self.cancelled = True
+
+    digest, sent = _digest(max_seconds=600, timer=FakeTimer)
+    digest.add('first', 'body')
+    now[0] += 300
+    digest.add('second', 'body')
+    assert [t.seconds for t in timers] == [600]  # one timer per buffer, from its first event
+
+    timers[0].callback()  # a stale wake-up before the oldest event is max_seconds old
+    assert sent == []
+    now[0] += 300
+    timers[0].callback()
+    assert [title for title, _, _, _ in sent] == ['Craigscraper: 2 updates']
+
+    digest.add('third', 'body')
+    digest.flush()
+    assert timers[-1].cancelled and len(timers) == 2
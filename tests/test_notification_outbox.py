@@ -0,0 +1,65 @@
+import sqlite3
+
+from craigscraper.notification_outbox import NotificationOutbox
+
+
+class FlakySender:
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.sent = []
+
+    def notify(self, **kwargs):
+        if self.failures:
+            self.failures -= 1
+            return False
+        self.sent.append(kwargs)
+        return True
+
+def _rows(db):
+    con = sqlite3.connect(db)
+    rows = con.execute("SELECT transport, status, attempts FROM notification_outbox ORDER BY id").fetchall()
+    con.close()
+    return rows
+
+def test_delivers_to_every_transport_and_clears_the_outbox(tmp_path):
+    db = str(tmp_path / 'rents.db')
+    telegram, email = FlakySender(), FlakySender()
+    outbox = NotificationOutbox({'telegram': telegram, 'email': email}, db)
+    outbox.notify('$2000 - Nice 1br', 'Link: ...', notify_type='success', body_format='text')
+    assert outbox.drain(5)
+    outbox.close()
+    assert telegram.sent == email.sent == [{'title': '$2000 - Nice 1br', 'body': 'Link: ...', 'notify_type': 'success', 'body_format': 'text'}]
+    assert _rows(db) == []
+
+def test_retries_with_backoff_then_gives_up(tmp_path):
+    db = str(tmp_path / 'rents.db')
+    recovers, broken = FlakySender(failures=2), FlakySender(failures=100)
+    outbox = NotificationOutbox({'recovers': recovers, 'broken': broken}, db, max_attempts=3, retry_seconds=0.01)
+    outbox.notify('title', 'body')
+    assert outbox.drain(5)
+    outbox.close()
+    assert len(recovers.sent) == 1
+    assert broken.sent == []
+    assert _rows(db) == [('broken', 'failed', 3)]  # kept for inspection, not retried again
+
+def test_pending_notifications_survive_a_restart(tmp_path):
+    db = str(tmp_path / 'rents.db')
+    down = FlakySender(failures=1)
+    first = NotificationOutbox({'telegram': down}, db, retry_seconds=3600)
+    first.notify('title', 'body')
+    first.drain(0.5)  # the retry is an hour away: still waiting
+    first.close()     # "crash"
+    assert _rows(db) == [('telegram', 'pending', 1)]
+
+    up = FlakySender()
+    second = NotificationOutbox({'telegram': up}, db)  # resumes leftovers without waiting out the backoff
+    assert second.drain(5)
+    second.close()
+    assert [n['title'] for n in up.sent] == ['title']
+    assert _rows(db) == []
+
+def test_does_not_create_the_database_until_something_is_sent(tmp_path):
+    db = tmp_path / 'rents.db'
+    outbox = NotificationOutbox({'telegram': FlakySender()}, str(db))
+    outbox.close()
+    assert not db.exists()
@@ -0,0 +1,106 @@
+import sqlite3
+from types import SimpleNamespace
+
+from craigscraper.page_cache import PageCache, write_content
+from tests.test_pipeline_batching import _item
+
+
+def test_put_get_roundtrip_is_compressed():
+    con = sqlite3.connect(':memory:')
+    cache = PageCache(con)
+    body = ('<html>' + 'spacious 1BR near the seawall ' * 200 + '</html>').encode()
+
+    cache.put('https://example.org/1.html', body, 'utf-8', post_id=1, last_updated='2025-03-01T10:00:00-0800',
+              etag='"abc"', last_modified='Sat, 01 Mar 2025 18:00:00 GMT')
+
+    assert cache.get('https://example.org/1.html') == ('"abc"', 'Sat, 01 Mar 2025 18:00:00 GMT', 'utf-8', body)
+    assert cache.get_by_post(1, '2025-03-01T10:00:00-0800') == ('https://example.org/1.html', 'utf-8', body)
+    stored = con.execute('SELECT length(body) FROM page_cache').fetchone()[0]
+    assert stored < len(body) / 10
+
+
+def test_only_the_newest_version_is_kept():
+    con = sqlite3.connect(':memory:')
+    cache = PageCache(con)
+    cache.put('https://example.org/1.html', b'old', 'utf-8', post_id=1, last_updated='2025-03-01', etag='"v1"')
+    cache.put('https://example.org/1.html', b'new', 'utf-8', post_id=1, last_updated='2025-03-02', etag='"v2"')
+    assert cache.get('https://example.org/1.html') == ('"v2"', None, 'utf-8', b'new')
+    assert cache.get_by_post(1, '2025-03-01') is None
+
+    # a stale copy arriving late doesn't replace the newer version
+    cache.put('https://example.org/1-old.html', b'old', 'utf-8', post_id=1, last_updated='2025-03-01')
+    assert con.execute('SELECT post_id, last_updated FROM page_cache').fetchall() == [(1, '2025-03-02')]
+    assert cache.get('https://example.org/1-old.html') is None
+    # not a listing page: nothing to key it by
+    assert cache.put('https://example.org/x.html', b'?', 'utf-8') is False
+
+
+def test_missing_page_returns_none():
+    cache = PageCache(sqlite3.connect(':memory:'))
+    assert cache.get('https://example.org/nope.html') is None
+
+
+def _stored(tmp_path, monkeypatch):
+    from craigscraper.pipelines import CraigscraperPipeline
+    monkeypatch.setenv('RENTS_DB', str(tmp_path / 'rents.db'))
+    monkeypatch.setenv('PIPELINE_BATCH_SIZE', '1')
+    pipeline = CraigscraperPipeline()
+    spider = SimpleNamespace(first_run=True)
+    pipeline.process_item(_item(1, 2000), spider)
+    pipeline.process_item(_item(2, 2100), spider)
+    return pipeline.con
+
+
+def test_reparse_write_keeps_unpublished_listings_unpublished(tmp_path, monkeypatch):
+    con = _stored(tmp_path, monkeypatch)
+    con.execute("UPDATE listings SET still_published = 'False', last_fetched = '2025-03-01T10:00:00-0800' WHERE id = 1")
+    con.commit()
+
+    assert write_content(con, [_item(1, 2000, title='Sunny 1BR, parsed better'), _item(3, 2300)]) == 1
+    assert con.execute("SELECT title, still_published, last_fetched FROM listings WHERE id = 1").fetchone() == (
+        'Sunny 1BR, parsed better', 'False', '2025-03-01T10:00:00-0800')
+    # only stored listings are refreshed
+    assert con.execute("SELECT COUNT(*) FROM listings WHERE id = 3").fetchone()[0] == 0
+
+
+def test_reparse_write_keeps_newer_prices(tmp_path, monkeypatch):
+    con = _stored(tmp_path, monkeypatch)
+    con.execute("UPDATE listings SET last_price = 1900, last_updated = '2025-03-05T10:00:00-0800' WHERE id = 2")
+    con.execute("INSERT INTO prices VALUES (2, '2025-03-05T10:00:00-0800', 1900)")
+    con.commit()
+
+    # the cached page still shows the old price, and two bedrooms
+    write_content(con, [dict(_item(2, 2100), rooms='2BR / 1Ba', bedrooms=2.0)])
+    assert con.execute("SELECT last_price, last_updated, bedrooms FROM listings WHERE id = 2").fetchone() == (
+        1900, '2025-03-05T10:00:00-0800', 2.0)
+    assert con.execute("SELECT price FROM prices WHERE listing_id = 2 ORDER BY last_updated").fetchall() == [(2100,), (1900,)]
+    assert con.execute("SELECT bedrooms FROM market_price_counts WHERE price = 1900").fetchall() == [(2.0,)]
+
+
+def test_reparse_write_keeps_the_distance_of_the_search_that_found_the_listing(tmp_path, monkeypatch):
+    from benchmarks.corpus import html_response, listing_fixtures, offline_spider
+    profiles = tmp_path / 'profiles.yaml'
+    profiles.write_text(
+        'searches:\n'
+        '  - name: downtown\n'
+        '    distance_from: {lat: 49.2799, lon: -123.1168}\n'
+        '  - name: burnaby\n'
+        '    distance_from: {lat: 49.2488, lon: -122.9805}\n'
+    )
+    monkeypatch.setenv('SEARCH_PROFILES_FILE', str(profiles))
+    con = _stored(tmp_path, monkeypatch)
+    html = dict(listing_fixtures())['listing_1br_yaletown.html']
+    link = 'https://vancouver.craigslist.org/x.html'
+
+    # the crawl found it through the burnaby search; a reparse has no search results to go by
+    crawl = offline_spider(str(tmp_path / 'rents.db'))
+    crawl.link_profiles[link] = {'burnaby'}
+    [crawled] = crawl.parseItem(html_response(link, html, meta={'link': link}))
+    [reparsed] = offline_spider(str(tmp_path / 'rents.db')).parseItem(html_response(link, html, meta={'link': link}))
+    assert crawled['distance'] > reparsed['distance']
+
+    con.execute("UPDATE listings SET id = ?, distance = ? WHERE id = 1", (crawled['id'], crawled['distance']))
+    con.commit()
+    assert write_content(con, [reparsed]) == 1
+    assert con.execute("SELECT distance, title FROM listings WHERE id = ?", (crawled['id'],)).fetchone() == (
+        crawled['distance'], reparsed['title'])
@@ -0,0 +1,140 @@
+from types import SimpleNamespace
+
+import pytest
+
+from craigscraper.pipelines import CraigscraperPipeline
+
+
+def _item(listing_id, price, title='Sunny 1BR', last_updated='2025-03-01T10:00:00-0800'):
+    return {
+        'id': listing_id,
+        'link': 'https://vancouver.craigslist.org/van/apa/d/sunny/%s.html' % listing_id,
+        'rooms': '1BR / 1Ba',
+        'bedrooms': 1.0,
+        'bathrooms': 1.0,
+        'bathrooms_type': None,
+        'available_on': None,
+        'size': 600,
+        'attributes': ['cats are OK - purrr', 'laundry in bldg'],
+        'description': 'Bright unit close to the seawall',
+        'title': title,
+        'gym': 'False',
+        'pool': 'False',
+        'parking': 'False',
+        'ev_charging': 'False',
+        'distance': 1.2,
+        'price': price,
+        'last_updated': last_updated,
+        'posted_on': '2025-03-01T10:00:00-0800',
+    }
+
+
+@pytest.fixture
+def pipeline(tmp_path, monkeypatch):
+    monkeypatch.setenv('RENTS_DB', str(tmp_path / 'rents.db'))
+    monkeypatch.setenv('PIPELINE_BATCH_SIZE', '3')
+    return CraigscraperPipeline()
+
+
+def _count(pipeline, table):
+    return pipeline.con.execute('SELECT COUNT(*) FROM %s' % table).fetchone()[0]
+
+
+def test_items_are_buffered_until_batch_is_full(pipeline):
+    spider = SimpleNamespace(first_run=True)
+    pipeline.process_item(_item(1, 2000), spider)
+    pipeline.process_item(_item(2, 2100), spider)
+    assert _count(pipeline, 'listings') == 0
+
+    pipeline.process_item(_item(3, 2200), spider)
+    assert _count(pipeline, 'listings') == 3
+    assert _count(pipeline, 'prices') == 3
+
+
+def test_close_spider_flushes_partial_batch(pipeline):
+    spider = SimpleNamespace(first_run=True)
+    pipeline.process_item(_item(1, 2000), spider)
+    pipeline.close_spider(spider)
+    assert _count(pipeline, 'listings') == 1
+
+
+def test_in_batch_updates_keep_change_and_price_semantics(pipeline):
+    spider = SimpleNamespace(first_run=True)
+    # same listing three times in one batch: a price change, then a re-post at the same price
+    pipeline.process_item(_item(1, 2000), spider)
+    pipeline.process_item(_item(1, 2100, title='Sunny 1BR - reduced', last_updated='2025-03-02T10:00:00-0800'), spider)
+    pipeline.process_item(_item(1, 2100, title='Sunny 1BR - reduced', last_updated='2025-03-03T10:00:00-0800'), spider)
+
+    prices = pipeline.con.execute('SELECT price FROM prices ORDER BY last_updated').fetchall()
+    assert prices == [(2000,), (2100,)]
+
+    changes = pipeline.con.execute('SELECT field, old_value, new_value FROM listing_changes').fetchall()
+    assert changes == [('title', 'Sunny 1BR', 'Sunny 1BR - reduced')]
+
+    assert pipeline.con.execute('SELECT last_price FROM listings WHERE id = 1').fetchone() == (2100,)
+
+
+def test_notifications_carry_full_price_history(pipeline):
+    spider = SimpleNamespace(first_run=False, notifications=SimpleNamespace(sent=[]))
+    spider.notifications.notify = lambda **kw: spider.notifications.sent.append(kw)
+
+    pipeline.process_item(_item(1, 2000), spider)
+    pipeline.close_spider(spider)
+    pipeline.process_item(_item(1, 1900, last_updated='2025-03-05T10:00:00-0800'), spider)
+    pipeline.close_spider(spider)
+
+    titles = [n['title'] for n in spider.notifications.sent]
+    assert titles[-1].startswith('$1900 <- $2000 / 600sqft')
+
+
+def test_price_only_items_update_the_stored_listing(pipeline):
+    spider = SimpleNamespace(first_run=False, notifications=SimpleNamespace(sent=[]))
+    spider.notifications.notify = lambda **kw: spider.notifications.sent.append(kw)
+    pipeline.process_item(_item(1, 2000), spider)
+    pipeline.close_spider(spider)
+    fetched = pipeline.con.execute('SELECT last_fetched FROM listings WHERE id = 1').fetchone()[0]
+    assert fetched is not None
+
+    link = _item(1, 2000)['link']
+    pipeline.process_item({'price_only': True, 'id': 1, 'link': link, 'price': 1900, 'seen_at': '2025-03-05T10:00:00-0800'}, spider)
+    pipeline.close_spider(spider)
+
+    # last_updated stays the detail page's, so a later fetch of that page can't move it backwards
+    row = pipeline.con.execute('SELECT last_price, last_updated, description, last_fetched FROM listings WHERE id = 1').fetchone()
+    assert row == (1900, '2025-03-01T10:00:00-0800', 'Bright unit close to the seawall', fetched)
+    assert pipeline.con.execute('SELECT price, last_updated FROM prices ORDER BY last_updated').fetchall() == [
+        (2000, '2025-03-01T10:00:00-0800'), (1900, '2025-03-05T10:00:00-0800')]
+    assert _count(pipeline, 'listing_changes') == 0
+    # notified with the stored details
+    assert spider.notifications.sent[-1]['title'] == '$1900 <- $2000 / 600sqft / Unknown - Sunny 1BR'
+    assert spider.notifications.sent[-1]['body'].startswith('Link: %s\nDistance from the reference: 1.2km' % link)
+
+
+def test_failed_flush_rolls_back_and_keeps_the_batch(pipeline):
+    spider = SimpleNamespace(first_run=True)
+    pipeline.con.execute("""CREATE TRIGGER reject_price BEFORE INSERT ON prices WHEN NEW.price = 666
+                            BEGIN SELECT RAISE(ABORT, 'rejected'); END""")
+    pipeline.process_item(_item(1, 2000), spider)
+    pipeline.process_item(_item(2, 666), spider)
+    with pytest.raises(Exception, match='rejected'):
+        pipeline.process_item(_item(3, 2200), spider)
+
+    # the listings written before the failing insert are undone, not left for the next commit
+    pipeline.con.commit()
+    assert _count(pipeline, 'listings') == 0
+    assert _count(pipeline, 'market_price_counts') == 0
+    assert [item['id'] for item in pipeline.batch] == [1, 2, 3]
+
+    pipeline.con.execute("DROP TRIGGER reject_price")
+    pipeline.close_spider(spider)
+    assert _count(pipeline, 'listings') == 3
+    assert pipeline.batch == []
+
+
+def test_timer_flush_survives_a_failure(pipeline, monkeypatch):
+    spider = SimpleNamespace(first_run=True)
+    pipeline.process_item(_item(1, 2000), spider)
+    pipeline.batch_seconds = 0
+    monkeypatch.setattr(pipeline, 'write_batch', lambda batch, ids: 1 / 0)
+    pipeline.flush_on_timer(spider)  # must not raise into the LoopingCall
+    assert len(pipeline.batch) == 1
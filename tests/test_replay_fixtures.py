@@ -0,0 +1,171 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from benchmarks.corpus import (
+    SEARCH_URL, html_response, listing_fixtures, offline_spider, read_fixture, replay_search, search_page_html
+)
+
+
+def _parse(spider, name):
+    html = dict(listing_fixtures())[name]
+    [item] = spider.parseItem(html_response('https://vancouver.craigslist.org/x.html', html))
+    return item
+
+
+def test_parse_item_full_listing(tmp_path):
+    item = _parse(offline_spider(str(tmp_path / 'rents.db')), 'listing_1br_yaletown.html')
+    assert item['id'] == 7812345601
+    assert item['price'] == 2450
+    assert item['title'] == 'Bright 1BR + den in Yaletown, steps to the seawall '
+    assert item['link'].endswith('/7812345601.html')
+    assert item['rooms'] == '1BR / 1Ba'
+    assert (item['bedrooms'], item['bathrooms']) == (1.0, 1.0)
+    assert item['size'] == 650
+    assert item['available_on'].endswith('-03-15')
+    assert item['attributes'] == ['cats are OK - purrr', 'laundry in bldg', 'underground parking', 'no smoking']
+    assert (item['gym'], item['pool'], item['parking'], item['ev_charging']) == ('True', 'False', 'True', 'False')
+    assert item['posted_on'] == '2025-03-01T10:15:00-0800'
+    assert item['last_updated'] == '2025-03-03T09:00:00-0800'
+    assert 0 < item['distance'] < 2
+
+
+def test_parse_item_falls_back_to_title_and_description(tmp_path):
+    item = _parse(offline_spider(str(tmp_path / 'rents.db')), 'listing_studio_westend.html')
+    assert item['size'] == '520'  # found in the title
+    assert item['available_on'] == 'now'  # found in the description
+    assert item['bathrooms_type'] == 'split'
+    assert (item['parking'], item['ev_charging']) == ('True', 'True')
+    assert item['last_updated'] == item['posted_on']  # never updated
+
+
+def test_search_page_requests_every_new_listing(tmp_path, monkeypatch):
+    rents_db = str(tmp_path / 'rents.db')
+    monkeypatch.setenv('RENTS_DB', rents_db)
+    from craigscraper.pipelines import CraigscraperPipeline
+    CraigscraperPipeline()  # creates the schema
+
+    spider = offline_spider(rents_db)
+    # the recorded page, then the empty page that ends the search
+    requests = replay_search(spider, [read_fixture('search_results.html'), search_page_html([])], SEARCH_URL)
+
+    assert sorted(r.url.rsplit('/', 1)[-1] for r in requests) == ['7812345601.html', '7812345602.html', '7812345603.html']
+    assert spider.cl_data[requests[0].url] in (2450, 2095, 2690)
+    assert spider.pending_pages == 0
+
+
+def test_results_diff_against_the_published_index(tmp_path, monkeypatch):
+    rents_db = str(tmp_path / 'rents.db')
+    monkeypatch.setenv('RENTS_DB', rents_db)
+    from craigscraper.pipelines import CraigscraperPipeline
+    con = CraigscraperPipeline().con
+    link = 'https://vancouver.craigslist.org/van/apa/d/x/%d.html'
+    con.executemany(
+        "INSERT INTO listings (id, link, last_price, still_published) VALUES (?, ?, ?, ?)",
+        [(1, link % 1, 2000, 'True'), (2, link % 2, 2100, 'True'), (3, link % 3, 2200, 'False'), (4, link % 4, 2300, 'True')]
+    )
+    con.commit()
+
+    spider = offline_spider(rents_db)
+    results = [(link % 1, 'same price', 2000), (link % 2, 'repriced', 2050), (link % 3, 'back again', 2200)]
+    requests = replay_search(spider, [search_page_html(results), search_page_html([])], SEARCH_URL)
+
+    # unchanged listings are skipped; a repriced one and a relisted (unpublished) one are fetched
+    assert sorted(r.url for r in requests) == [link % 2, link % 3]
+    # the listing no page returned is unpublished, in one batch once the search is finished
+    assert dict(con.execute("SELECT id, still_published FROM listings")) == {1: 'True', 2: 'True', 3: 'False', 4: 'False'}
+    assert spider.db_connection is None
+
+
+def test_detail_requests_are_prioritized(tmp_path, monkeypatch):
+    rents_db = str(tmp_path / 'rents.db')
+    monkeypatch.setenv('RENTS_DB', rents_db)
+    from craigscraper.pipelines import CraigscraperPipeline
+    CraigscraperPipeline()
+
+    spider = offline_spider(rents_db)
+    requests = replay_search(spider, [read_fixture('search_results.html'), search_page_html([])], SEARCH_URL)
+
+    # all new and within the price range: the closest to the reference point (Yaletown) goes first,
+    # the Kitsilano one, outside the search radius and at the top of the range, last
+    assert [r.url.rsplit('/', 1)[-1] for r in requests] == ['7812345601.html', '7812345602.html', '7812345603.html']
+    priorities = [r.priority for r in requests]
+    assert priorities == sorted(priorities, reverse=True) and priorities[0] > priorities[-1]
+    assert all(0 <= p < spider.search_page_priority for p in priorities)
+
+
+def test_recently_fetched_reprices_skip_the_detail_page(tmp_path, monkeypatch):
+    rents_db = str(tmp_path / 'rents.db')
+    monkeypatch.setenv('RENTS_DB', rents_db)
+    from craigscraper.pipelines import CraigscraperPipeline
+    con = CraigscraperPipeline().con
+    link = 'https://vancouver.craigslist.org/van/apa/d/x/%d.html'
+    recent = datetime.now().astimezone().strftime('%Y-%m-%dT%H:%M:%S%z')
+    stale = (datetime.now().astimezone() - timedelta(days=3)).strftime('%Y-%m-%dT%H:%M:%S%z')
+    con.executemany(
+        "INSERT INTO listings (id, link, last_price, last_updated, still_published, last_fetched) VALUES (?, ?, ?, ?, 'True', ?)",
+        [(1, link % 1, 2000, '2025-03-01T10:00:00-0800', recent), (2, link % 2, 2100, '2025-03-01T10:00:00-0800', stale),
+         (3, link % 3, 2200, '2025-03-01T10:00:00-0800', None)]
+    )
+    con.commit()
+
+    spider = offline_spider(rents_db)
+    items = []
+    results = [(link % 1, 'fresh', 1950), (link % 2, 'stale', 2050), (link % 3, 'never fetched', 2150)]
+    requests = replay_search(spider, [search_page_html(results), search_page_html([])], SEARCH_URL, items=items)
+
+    assert sorted(r.url for r in requests) == [link % 2, link % 3]
+    [item] = items
+    assert (item['price_only'], item['id'], item['link'], item['price']) == (True, 1, link % 1, 1950)
+    assert item['seen_at'].endswith('-0800')  # Craigslist's offset, not the host's
+
+    spider.detail_refresh_hours = 0  # always fetch
+    spider.cl_data, spider.published = {}, None
+    assert len(replay_search(spider, [search_page_html(results), search_page_html([])], SEARCH_URL)) == 3
+
+
+def test_overlapping_searches_read_all_of_their_own_pages(tmp_path, monkeypatch):
+    rents_db = str(tmp_path / 'rents.db')
+    monkeypatch.setenv('RENTS_DB', rents_db)
+    from craigscraper.pipelines import CraigscraperPipeline
+    con = CraigscraperPipeline().con
+    link = 'https://vancouver.craigslist.org/van/apa/d/x/%d.html'
+    con.executemany(
+        "INSERT INTO listings (id, link, last_price, still_published) VALUES (?, ?, 2000, 'True')",
+        [(n, link % n) for n in range(1, 5)]
+    )
+    con.commit()
+
+    # the second search's first page only repeats the first search's results, its second page
+    # holds listings no other search returns
+    other_url = SEARCH_URL.replace('search_distance=1.41', 'search_distance=3')
+    results = {
+        (SEARCH_URL, 0): [1, 2], (SEARCH_URL, 1): [],
+        (other_url, 0): [1, 2], (other_url, 1): [3, 4], (other_url, 2): [],
+    }
+    spider = offline_spider(rents_db)
+    queue = [spider.search_page_request(SEARCH_URL, 0), spider.search_page_request(other_url, 0)]
+    while queue:
+        request = queue.pop(0)
+        page = search_page_html([(link % n, 'listing %d' % n, 2000) for n in results[(request.meta['search_url'], request.meta['page'])]])
+        out = list(spider.parse(html_response(request.url, page, meta=request.meta)))
+        queue.extend(r for r in out if getattr(r, 'callback', None) == spider.parse)
+
+    assert spider.last_page_requested[other_url] == 2
+    assert dict(con.execute("SELECT id, still_published FROM listings")) == {1: 'True', 2: 'True', 3: 'True', 4: 'True'}
+
+
+def test_spider_closed_waits_for_notifications_off_the_reactor_thread(tmp_path, monkeypatch):
+    from twisted.internet.defer import succeed
+    from craigscraper.spiders import rent
+
+    calls = []
+    monkeypatch.setattr(rent, 'deferToThread', lambda f, *args: calls.append((f, args)) or succeed(True))
+    spider = offline_spider(str(tmp_path / 'rents.db'))
+    spider.owns_notifications = True
+    spider.notifications = SimpleNamespace(flush_digest=lambda: None, close=lambda timeout=None: pytest.fail('blocking close'))
+
+    d = spider.on_spider_closed(spider, 'finished')
+    assert calls == [(spider.notifications.close, (spider.notification_drain_seconds,))]
+    assert d is not None and d.called
@@ -0,0 +1,69 @@
+import sqlite3
+
+from craigscraper.reprocess import reprocess
+
+
+def _db(path):
+    con = sqlite3.connect(path)
+    con.execute("""CREATE TABLE listings (id INTEGER PRIMARY KEY, rooms TEXT, bedrooms REAL, bathrooms REAL,
+                   bathrooms_type TEXT, attributes BLOB, description TEXT, gym TEXT, pool TEXT,
+                   parking TEXT, ev_charging TEXT)""")
+    con.executemany(
+        "INSERT INTO listings (id, rooms, attributes, description, gym, pool, parking, ev_charging, bedrooms, bathrooms) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+        [
+            (1, '2BR / 1Ba', 'parking: underground', 'rooftop pool', 'False', 'False', 'False', 'False', 2.0, 1.0),  # stale
+            (2, '1BR / 1Ba', '', 'quiet street', 'False', 'False', 'False', 'False', 1.0, 1.0),                  # up to date
+            (3, '1BR / splitBa', 'EV charging', 'gym on site', None, None, None, None, None, None),              # never filled
+        ] + [(n, 'studio', '', 'nothing', 'False', 'False', 'False', 'False', None, None) for n in range(4, 20)]
+    )
+    con.commit()
+    return con
+
+def _features(con):
+    return con.execute("SELECT id, gym, pool, parking, ev_charging, bedrooms, bathrooms, bathrooms_type FROM listings WHERE id <= 3 ORDER BY id").fetchall()
+
+EXPECTED = [
+    (1, 'False', 'True', 'True', 'False', 2.0, 1.0, None),
+    (2, 'False', 'False', 'False', 'False', 1.0, 1.0, None),
+    (3, 'True', 'False', 'False', 'True', 1.0, None, 'split'),
+]
+
+def test_reprocess_recomputes_every_row_and_writes_only_changes(tmp_path):
+    con = _db(str(tmp_path / 'rents.db'))
+    done, updated = reprocess(con, chunk_size=4, workers=1, report=lambda line: None)
+    assert (done, updated) == (19, 2)
+    assert _features(con) == EXPECTED
+
+def test_reprocess_in_a_process_pool_matches(tmp_path):
+    con = _db(str(tmp_path / 'rents.db'))
+    reprocess(con, chunk_size=3, workers=2, report=lambda line: None)
+    assert _features(con) == EXPECTED
+
+def test_reprocess_only_null_leaves_filled_rows_alone(tmp_path):
+    con = _db(str(tmp_path / 'rents.db'))
+    done, _ = reprocess(con, groups=['features'], only_null=True, workers=1, report=lambda line: None)
+    assert done == 1
+    assert _features(con)[0] == (1, 'False', 'False', 'False', 'False', 2.0, 1.0, None)  # stale, but not NULL
+    assert _features(con)[2][1:5] == ('True', 'False', 'False', 'True')
+
+def test_reprocess_moves_corrected_bedrooms_between_market_buckets(tmp_path, monkeypatch):
+    from craigscraper import market_aggregates
+    con = _db(str(tmp_path / 'rents.db'))
+    con.execute("ALTER TABLE listings ADD COLUMN posted_on TEXT")
+    con.execute("ALTER TABLE listings ADD COLUMN last_updated TEXT")
+    con.execute("UPDATE listings SET bedrooms = 3.0, posted_on = '2025-03-01T10:00:00-0800', last_updated = '2025-03-02T10:00:00-0800'")
+    con.execute("CREATE TABLE prices (listing_id INTEGER, last_updated TEXT, price INTEGER)")
+    con.executemany("INSERT INTO prices VALUES (?, '2025-03-01T10:00:00-0800', ?)", [(n, 2000 + n) for n in range(1, 20)])
+    market_aggregates.rebuild(con)
+    con.commit()
+
+    reprocess(con, groups=['rooms'], chunk_size=4, workers=1, report=lambda line: None)
+    stored = dict(((month, bedrooms, price), n) for month, bedrooms, price, n in con.execute("SELECT * FROM market_price_counts"))
+    assert stored == market_aggregates.price_counts(con)
+    assert stored[('2025-03', 2.0, 2001)] == 1
+
+    # only feature columns change now: the aggregates aren't touched
+    con.execute("UPDATE listings SET description = 'gym and pool' WHERE id = 2")
+    monkeypatch.setattr(market_aggregates, 'listing_counts', lambda *args: 1 / 0)
+    monkeypatch.setattr(market_aggregates, 'rebuild', lambda *args: 1 / 0)
+    assert reprocess(con, workers=1, report=lambda line: None) == (19, 3)  # 1 and 3 had stale features too
@@ -0,0 +1,52 @@
+import pytest
+
+from craigscraper.search_profiles import load_search_profiles
+
+
+def test_env_profile_matches_legacy_url(monkeypatch):
+    for var in ('LAT', 'LON', 'MIN_PRICE', 'MAX_PRICE', 'MIN_BEDROOMS', 'SEARCH_DISTANCE', 'SEARCH_PROFILES_FILE'):
+        monkeypatch.delenv(var, raising=False)
+    [profile] = load_search_profiles()
+    assert profile.search_url() == (
+        'https://vancouver.craigslist.org/search/vancouver-bc/apa?lat=49.2822&lon=-123.1284'
+        '&min_price=2000&max_price=2700&min_bedrooms=1&search_distance=1.41#search=1~list~1~0'
+    )
+    assert profile.distance_from == (49.2799016, -123.1167676)
+
+
+def test_profiles_file_applies_defaults_and_overrides(tmp_path, monkeypatch):
+    monkeypatch.setenv('MIN_PRICE', '1500')
+    path = tmp_path / 'searches.yaml'
+    path.write_text(
+        'defaults:\n'
+        '  max_price: 3000\n'
+        '  distance_from: {lat: 49.0, lon: -123.0}\n'
+        'searches:\n'
+        '  - name: downtown\n'
+        '    lat: 49.28\n'
+        '  - name: burnaby\n'
+        '    site: vancouver\n'
+        '    area: burnaby-bc\n'
+        '    distance_from: {lat: 49.25, lon: -122.99}\n'
+    )
+    downtown, burnaby = load_search_profiles(str(path))
+
+    assert downtown.name == 'downtown'
+    assert 'lat=49.28&' in downtown.search_url()
+    assert 'min_price=1500&max_price=3000' in downtown.search_url()  # env fallback + defaults
+    assert downtown.distance_from == (49.0, -123.0)
+
+    assert burnaby.search_url().startswith('https://vancouver.craigslist.org/search/burnaby-bc/apa?')
+    assert burnaby.distance_from == (49.25, -122.99)
+
+
+def test_duplicate_profile_names_are_rejected(tmp_path):
+    path = tmp_path / 'searches.yaml'
+    path.write_text('searches:\n  - name: a\n  - name: a\n')
+    with pytest.raises(ValueError):
+        load_search_profiles(str(path))
+
+
+def test_missing_profiles_file_raises(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        load_search_profiles(str(tmp_path / 'nope.yaml'))
@@ -1,7 +1,7 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
 import plotly.express as px
+import plotly.graph_objects as go
 from datetime import datetime, timedelta
 from urllib.parse import urlparse
 import os
@@ -12,10 +12,16 @@ import sys
 # parent's parent) so the import works regardless of the launch directory (incl. the container).
 sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
+from craigscraper import dashboard_queries as queries
+from craigscraper.db import connect
 from craigscraper.market_analysis import (
-    monthly_median_rent, new_listings_per_month, pct_change_vs, active_listings_per_month
+    median_from_counts, monthly_median_rent_from_counts, new_listings_from_months, pct_change_vs,
+    active_listings_from_months, days_on_market_from_months, price_chain_labels, price_stats_from_counts
 )
 
+# rows per page of the listings table
+PAGE_SIZE = int(os.environ.get('UI_PAGE_SIZE', '50'))
+
 # Set page configuration
 st.set_page_config(
     page_title="Rental Property Viewer",
@@ -73,90 +79,66 @@ def get_connection():
     else:
         db_path = 'rents.db'
 
-    return sqlite3.connect(db_path, check_same_thread=False)
+    # read-only: dashboard queries read the last committed snapshot (WAL, see craigscraper/db.py)
+    # and never hold up the crawler's writes. A missing database is created empty as before.
+    return connect(db_path, read_only=os.path.exists(db_path), check_same_thread=False)
 
-# Load data from database
-@st.cache_data(ttl=300)  # Cache data for 5 minutes
-def load_listings_data():
-    conn = get_connection()
-    query = """
-    SELECT * FROM listings
-    """
-    df = pd.read_sql_query(query, conn)
-
-    # Convert string boolean columns to actual booleans
-    for col in ['gym', 'pool', 'parking', 'ev_charging', 'still_published']:
-        if col in df.columns:
-            df[col] = df[col].map({'True': True, 'False': False})
-
-    # Convert date columns to datetime
-    date_columns = ['available_on', 'last_updated', 'posted_on']
-    for col in date_columns:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce', utc=True)
+# Load data from database; every loader is cached for 5 minutes (ttl=300)
+@st.cache_data(ttl=300)
+def load_listing_titles(filters):
+    return queries.load_listing_titles(get_connection(), filters)
 
-    return df
+@st.cache_data(ttl=300)
+def get_listing_title(listing_id):
+    return queries.get_listing_title(get_connection(), listing_id)
 
+# snapshot charts: aggregated in SQL, a row per distinct price or trend rather than per listing
 @st.cache_data(ttl=300)
-def load_prices_data():
-    conn = get_connection()
-    query = """
-    SELECT * FROM prices
-    """
-    df = pd.read_sql_query(query, conn)
+def load_price_points(filters):
+    return queries.load_price_points(get_connection(), filters)
 
-    # Convert date columns to datetime
-    if 'last_updated' in df.columns:
-        df['last_updated'] = pd.to_datetime(df['last_updated'], errors='coerce', utc=True)
+@st.cache_data(ttl=300)
+def load_trend_counts(filters):
+    return queries.load_trend_counts(get_connection(), filters)
 
-    return df
+# the listings table: filtered, sorted and paginated in SQL, only the displayed columns
+@st.cache_data(ttl=300)
+def load_filter_options():
+    return queries.load_filter_options(get_connection())
 
 @st.cache_data(ttl=300)
-def load_price_months():
-    # one row per price point: month, bedrooms, price (joined to the listing's bedroom count).
-    # Timestamps are stored ISO-8601 with a 'T' and tz offset (e.g. 2025-02-16T12:00:53-0800),
-    # which SQLite strftime() CANNOT parse (returns NULL). substr(...,1,7) extracts 'YYYY-MM'
-    # directly from the ISO string, which is correct for that fixed layout.
-    conn = get_connection()
-    query = """
-    SELECT substr(p.last_updated, 1, 7) AS month, l.bedrooms AS bedrooms, p.price AS price
-    FROM prices p
-    JOIN listings l ON l.id = p.listing_id
-    WHERE l.bedrooms IS NOT NULL AND p.price IS NOT NULL
-    """
-    return pd.read_sql_query(query, conn)
+def count_listings(filters):
+    return queries.count_listings(get_connection(), filters)
 
 @st.cache_data(ttl=300)
-def load_posted_and_dom():
-    # posted month (for new-listings) and approximate days-on-market per listing.
-    # substr(...,1,7) is used instead of strftime() because the ISO-8601 timestamps with a
-    # 'T'/tz offset are not parseable by SQLite's date functions (see load_price_months).
-    conn = get_connection()
-    query = """
-    SELECT substr(posted_on, 1, 7) AS posted_month,
-           substr(last_updated, 1, 7) AS last_month,
-           posted_on, last_updated
-    FROM listings
-    WHERE posted_on IS NOT NULL
-    """
-    df = pd.read_sql_query(query, conn)
-    df['posted_on'] = pd.to_datetime(df['posted_on'], errors='coerce', utc=True)
-    df['last_updated'] = pd.to_datetime(df['last_updated'], errors='coerce', utc=True)
-    df['days_on_market'] = (df['last_updated'] - df['posted_on']).dt.days
-    return df
+def load_listings_page(filters, sort, descending, after):
+    return queries.load_listings_page(get_connection(), filters, sort, descending, after, PAGE_SIZE)
+
+@st.cache_data(ttl=300)
+def load_listing_prices(listing_ids):
+    return queries.load_listing_prices(get_connection(), listing_ids)
+
+@st.cache_data(ttl=300)
+def get_listing_details(listing_id):
+    return queries.get_listing_details(get_connection(), listing_id)
+
+# market statistics read the aggregates the crawler maintains (craigscraper/market_aggregates.py),
+# a few rows per month, instead of regrouping the whole price history
+@st.cache_data(ttl=300)
+def load_price_counts():
+    return queries.load_price_counts(get_connection())
+
+@st.cache_data(ttl=300)
+def load_market_months():
+    return queries.load_market_months(get_connection())
+
+@st.cache_data(ttl=60)
+def load_crawl_runs():
+    return queries.load_crawl_runs(get_connection())
 
 # Get price history for a specific listing
 def get_price_history(listing_id):
-    conn = get_connection()
-    query = """
-    SELECT last_updated, price
-    FROM prices
-    WHERE listing_id = ?
-    ORDER BY last_updated
-    """
-    df = pd.read_sql_query(query, conn, params=(listing_id,))
-    df['last_updated'] = pd.to_datetime(df['last_updated'], errors='coerce', utc=True)
-    return df
+    return queries.get_price_history(get_connection(), listing_id)
 
 def get_property_price_history(listing_id):
     price_history = get_price_history(listing_id)
@@ -234,7 +216,7 @@ def make_clickable(link):
     display_text = f"{parsed.netloc}{parsed.path[:20]}..."
     return f'<a target="_blank" rel="noreferrer href="{link}">{display_text}</a>'
 
-def create_price_trend(row):
+def create_price_trend(row, price_chains):
     """Create a price trend with history tooltip"""
     try:
         # Get the price change percentage
@@ -255,27 +237,15 @@ def create_price_trend(row):
         # Format the percentage (ensure it's displayed as absolute value with sign)
         formatted_pct = f"{abs(percentage):.1f}%"
 
-        # Get price history for this property
-        history = get_property_price_history(row.get('id'))
+        # Collapsed price chain for this property (precomputed for the whole table; see
+        # price_chain_labels). Missing means no history or only one price point.
+        price_changes = price_chains.get(row.get('id'))
 
-        if history.empty or len(history) <= 1:
+        if price_changes is None:
             # No history or only one price point
             return (f'<a href="?history={row.get("id")}" target="_self" '
                     f'style="color: {color}; text-decoration: none;">{trend_symbol} {formatted_pct}</a>')
         else:
-            # Sort the history by date to ensure chronological order
-            history = history.sort_values(by='date')
-
-            # Collapse consecutive identical prices so unchanged re-scrapes don't render
-            # as fake steps (e.g. $2,160→$2,160). Keeps only real transitions.
-            collapsed = []
-            for p in history['price']:
-                if not collapsed or collapsed[-1] != p:
-                    collapsed.append(p)
-
-            # Format price history as a chronological string: price1->price2->price3
-            price_changes = "→".join([f"${p:,.0f}" for p in collapsed])
-
             property_id = row.get('id')
 
             # Link the trend to open the timeline modal via query param
@@ -310,15 +280,9 @@ def show_timeline_dialog(listing_id, title):
 def main():
     st.markdown('<div class="main-header">Rental Property Viewer</div>', unsafe_allow_html=True)
 
-    # Load data
-    with st.spinner('Loading data...'):
-        listings_df = load_listings_data()
-        prices_df = load_prices_data()
-
-    # Calculate trends and statistics
-    if not listings_df.empty and not prices_df.empty:
-        listings_with_trends = calculate_price_trends(listings_df, prices_df)
-    else:
+    # no listing has a price until the scraper has run
+    options = load_filter_options()
+    if options['min_price'] is None:
         st.error("No data available. Please make sure the scraper has run at least once.")
         return
 
@@ -327,9 +291,7 @@ def main():
     if hist_param:
         try:
             hist_id = int(hist_param)
-            match = listings_df[listings_df['id'] == hist_id]
-            title = match.iloc[0]['title'] if not match.empty else str(hist_id)
-            show_timeline_dialog(hist_id, title)
+            show_timeline_dialog(hist_id, get_listing_title(hist_id) or str(hist_id))
         except (ValueError, TypeError):
             pass
         finally:
@@ -342,8 +304,8 @@ def main():
     show_available_only = st.sidebar.checkbox("Show available properties only", value=True)
 
     # Price range filter
-    min_price = int(listings_df['last_price'].min()) if not listings_df.empty else 0
-    max_price = int(listings_df['last_price'].max()) if not listings_df.empty else 5000
+    min_price = int(options['min_price']) if options['min_price'] is not None else 0
+    max_price = int(options['max_price']) if options['max_price'] is not None else 5000
     if min_price >= max_price:
         # a slider requires min < max; with a single distinct price there's nothing to range over
         st.sidebar.write(f"Price: ${min_price:,}")
@@ -357,8 +319,8 @@ def main():
         )
 
     # Bedroom / bathroom filters (numeric, from the parsed columns)
-    bed_vals = sorted(v for v in listings_df['bedrooms'].dropna().unique())
-    bath_vals = sorted(v for v in listings_df['bathrooms'].dropna().unique())
+    bed_vals = options['bedrooms']
+    bath_vals = options['bathrooms']
     selected_beds = st.sidebar.multiselect(
         "Bedrooms",
         options=bed_vals,
@@ -383,52 +345,57 @@ def main():
     with col4:
         ev_charging = st.checkbox("EV Charging")
 
-    # Apply filters
-    filtered_df = listings_with_trends.copy()
-    if show_available_only:
-        filtered_df = filtered_df[filtered_df['still_published'] == True]
-
-    filtered_df = filtered_df[
-        (filtered_df['last_price'] >= price_range[0]) &
-        (filtered_df['last_price'] <= price_range[1])
-    ]
-
-    if selected_beds:
-        filtered_df = filtered_df[filtered_df['bedrooms'].isin(selected_beds)]
-    if selected_baths:
-        filtered_df = filtered_df[filtered_df['bathrooms'].isin(selected_baths)]
-
-    if has_gym:
-        filtered_df = filtered_df[filtered_df['gym'] == True]
-
-    if has_pool:
-        filtered_df = filtered_df[filtered_df['pool'] == True]
-
-    if has_parking:
-        filtered_df = filtered_df[filtered_df['parking'] == True]
-
-    if ev_charging:
-        filtered_df = filtered_df[filtered_df['ev_charging'] == True]
+    # Filters are applied in SQL (see craigscraper/dashboard_queries.py)
+    filters = {
+        'available_only': show_available_only,
+        'price_range': tuple(price_range),
+        'bedrooms': tuple(selected_beds),
+        'bathrooms': tuple(selected_baths),
+        'features': tuple(column for column, checked in (
+            ('gym', has_gym), ('pool', has_pool), ('parking', has_parking), ('ev_charging', ev_charging)
+        ) if checked),
+    }
 
     # Main content area - Tabs
-    tab1, tab2, tab3 = st.tabs(["Available Properties", "Price History", "Market Statistics"])
+    tab1, tab2, tab3, tab4 = st.tabs(["Available Properties", "Price History", "Market Statistics", "Crawl Runs"])
 
     with tab1:
         st.markdown('<div class="subheader">Available Properties</div>', unsafe_allow_html=True)
-        if filtered_df.empty:
+
+        # Sorting happens in SQL too. Default to Size, descending.
+        sort_options = {
+            'Size': 'size', 'Price': 'last_price', 'Bedrooms': 'bedrooms', 'Bathrooms': 'bathrooms',
+            'Distance (km)': 'distance', 'Available On': 'available_on', 'Posted On': 'posted_on', 'Title': 'title',
+        }
+        sort_label = st.selectbox("Sort by", options=list(sort_options), index=0)
+        sort_order = st.radio("Order", options=["Ascending", "Descending"], horizontal=True, index=1)
+        sort_col = sort_options[sort_label]
+        descending = sort_order == "Descending"
+
+        total = count_listings(filters)
+        if total == 0:
             st.warning("No properties match your filters.")
         else:
-            # Prepare display dataframe
-            display_df = filtered_df.copy()
+            # keyset pagination: the cursor of every page seen so far; changing the filters or
+            # the sort starts over from the first page
+            view = (filters, sort_col, descending)
+            if st.session_state.get('listings_view') != view:
+                st.session_state['listings_view'] = view
+                st.session_state['listings_cursors'] = [None]
+            cursors = st.session_state['listings_cursors']
+            page_df, next_cursor = load_listings_page(filters, sort_col, descending, cursors[-1])
+
+            # trends and price chains for the rows on this page only
+            page_prices = load_listing_prices(tuple(page_df['id']))
+            display_df = calculate_price_trends(page_df, page_prices)
 
             # Format columns for display
             display_df['last_price'] = display_df['last_price'].apply(format_price)
-            display_df['size'] = display_df['size']
             display_df['available_on'] = display_df['available_on'].dt.strftime('%Y-%m-%d')
             display_df['posted_on'] = display_df['posted_on'].dt.strftime('%Y-%m-%d')
             display_df['last_updated'] = display_df['last_updated'].dt.strftime('%Y-%m-%d')
 
-            # Render feature flags as emoji (values are Python booleans from load_listings_data).
+            # Render feature flags as emoji (values are Python booleans from the query layer).
             # fillna(False) guards against any NULL feature value rendering as literal 'nan'.
             feature_icons = {'gym': '🏋️', 'pool': '🏊', 'parking': '🅿️', 'ev_charging': '⚡'}
             for col, icon in feature_icons.items():
@@ -440,8 +407,9 @@ def main():
             )
 
             # Add trend indicator with price history
+            price_chains = price_chain_labels(page_prices)
             display_df['price_trend'] = display_df.apply(
-                lambda x: create_price_trend(x), axis=1
+                lambda x: create_price_trend(x, price_chains), axis=1
             )
 
             # Select columns to display
@@ -466,46 +434,50 @@ def main():
                 'price_trend': 'Price Trend'
             })
 
-            # Let user sort by any column. Default to Size, descending.
-            # NOTE: 'Price' sorts lexically here because it's a formatted string ($2,100) at
-            # this point — a pre-existing caveat, intentionally not fixed in this change.
-            sort_options = list(display_df.columns)
-            default_sort_index = sort_options.index('Size') if 'Size' in sort_options else 0
-            sort_col = st.selectbox("Sort by", options=sort_options, index=default_sort_index)
-            sort_order = st.radio("Order", options=["Ascending", "Descending"], horizontal=True, index=1)
-
-            # Apply sorting
-            ascending = sort_order == "Ascending"
-            sorted_df = display_df.sort_values(by=sort_col, ascending=ascending)
-
             # Display the dataframe without showing the index column
-            html_df = sorted_df.to_html(escape=False, index=False)
+            html_df = display_df.to_html(escape=False, index=False)
             st.write(html_df, unsafe_allow_html=True)
-            st.write(f"Showing {len(filtered_df)} properties")
+
+            first_row = (len(cursors) - 1) * PAGE_SIZE + 1
+            prev_col, info_col, next_col = st.columns([1, 3, 1])
+            with prev_col:
+                st.button("← Previous", disabled=len(cursors) == 1, on_click=cursors.pop)
+            with info_col:
+                st.write(f"Showing {first_row}–{first_row + len(page_df) - 1} of {total} properties")
+            with next_col:
+                st.button("Next →", disabled=next_cursor is None, on_click=cursors.append, args=(next_cursor,))
+
+            # description and attributes are only loaded for the row being looked at
+            titles = dict(zip(page_df['id'], page_df['title']))
+            details_id = st.selectbox(
+                "Show details for:",
+                options=[None] + list(titles),
+                format_func=lambda listing_id: "Select a property..." if listing_id is None else titles[listing_id]
+            )
+            if details_id is not None:
+                details = get_listing_details(int(details_id))
+                if details is not None:
+                    with st.expander(titles[details_id], expanded=True):
+                        if details['attributes']:
+                            st.caption(details['attributes'])
+                        st.write(details['description'] or "No description.")
 
     with tab2:
         st.markdown('<div class="subheader">Property Price History</div>', unsafe_allow_html=True)
 
-        # Property selector
-        selected_property_id = None
-        property_options = ["Select a property..."] + listings_df['title'].tolist()
-
-        selected_title = st.selectbox(
+        # Property selector, over the listings matching the sidebar filters
+        property_titles = load_listing_titles(filters)
+        titles = dict(zip(property_titles['id'], property_titles['title']))
+        selected_property_id = st.selectbox(
             "Select a property to view its price history:",
-            options=property_options,
+            options=[None] + list(titles),
+            format_func=lambda listing_id: "Select a property..." if listing_id is None else titles[listing_id],
             index=0
         )
 
-        # If a property was selected from the dropdown, use that instead
-        if selected_title != "Select a property...":
-            selected_property = listings_df[listings_df['title'] == selected_title].iloc[0]
-            selected_property_id = selected_property['id']
-
         # Display price history if a property is selected
-        if selected_property_id:
-            # Get the property's details
-            property_row = listings_df[listings_df['id'] == selected_property_id].iloc[0]
-            title = property_row['title']
+        if selected_property_id is not None:
+            title = titles[selected_property_id]
 
             st.write(f"### Price History for {title}")
 
@@ -585,8 +557,8 @@ def main():
 
         # ---- Rent over time ----
         with rent_tab:
-            price_months = load_price_months()
-            medians = monthly_median_rent(price_months)
+            price_counts = load_price_counts()
+            medians = monthly_median_rent_from_counts(price_counts)
             if medians.empty:
                 st.info("Not enough price history yet to chart rent over time.")
             else:
@@ -599,9 +571,7 @@ def main():
                 st.plotly_chart(fig, width="stretch")
 
                 # overall median per month (all bedrooms pooled) for the delta metrics
-                overall = (price_months.groupby('month')['price'].median()
-                           .reset_index().rename(columns={'price': 'median_price'})
-                           .sort_values('month'))
+                overall = median_from_counts(price_counts, ['month'], min_points=1)
                 c3, c6, c12 = st.columns(3)
                 for col, months_back, label in ((c3, 3, "vs 3 mo ago"),
                                                  (c6, 6, "vs 6 mo ago"),
@@ -614,18 +584,18 @@ def main():
 
         # ---- Market activity ----
         with activity_tab:
-            pdom = load_posted_and_dom()
-            if pdom.empty:
+            market_months = load_market_months()
+            if market_months.empty:
                 st.info("Not enough listing data yet to chart market activity.")
             else:
-                newpm = new_listings_per_month(pdom['posted_month'])
+                newpm = new_listings_from_months(market_months)
                 if not newpm.empty:
                     fig = px.bar(newpm, x='month', y='count', title='New listings per month',
                                  labels={'month': 'Month', 'count': 'New listings'})
                     st.plotly_chart(fig, width="stretch")
 
                 # inventory over time: active listings per month (posted_month..last_month inclusive)
-                inv = active_listings_per_month(pdom[['posted_month', 'last_month']])
+                inv = active_listings_from_months(market_months)
                 if not inv.empty:
                     fig = px.line(inv, x='month', y='active', markers=True,
                                   title='Active listings per month (inventory, approximate)',
@@ -635,8 +605,7 @@ def main():
                                "posted month through its last-seen month.")
 
                 # approximate days-on-market by posted month
-                dom = (pdom.dropna(subset=['days_on_market'])
-                       .groupby('posted_month')['days_on_market'].mean().reset_index())
+                dom = days_on_market_from_months(market_months)
                 if not dom.empty:
                     fig = px.line(dom, x='posted_month', y='days_on_market', markers=True,
                                   title='Average days on market by posted month (approximate)',
@@ -649,26 +618,26 @@ def main():
         with snapshot_tab:
             snap_price, snap_rented = st.tabs(["Price Distribution", "Rented Properties"])
             with snap_price:
-                if not listings_df.empty:
-                    fig = px.box(listings_with_trends, x='bedrooms', y='last_price',
-                                 title='Price Distribution by Bedrooms',
-                                 labels={'bedrooms': 'Bedrooms', 'last_price': 'Price ($)'})
+                # the listings matching the sidebar filters
+                price_stats = price_stats_from_counts(load_price_points(filters))
+                if not price_stats.empty:
+                    # the box plot is drawn from the quartiles, the whiskers span min..max
+                    fig = go.Figure(go.Box(
+                        x=price_stats['bedrooms'], q1=price_stats['q1_price'], median=price_stats['median_price'],
+                        q3=price_stats['q3_price'], lowerfence=price_stats['min_price'],
+                        upperfence=price_stats['max_price'], mean=price_stats['avg_price'],
+                    ))
+                    fig.update_layout(title='Price Distribution by Bedrooms', xaxis_title='Bedrooms', yaxis_title='Price ($)')
                     st.plotly_chart(fig, width="stretch")
 
-                    price_stats = listings_with_trends.groupby('bedrooms').agg(
-                        avg_price=('last_price', 'mean'),
-                        median_price=('last_price', 'median'),
-                        min_price=('last_price', 'min'),
-                        max_price=('last_price', 'max'),
-                        count=('id', 'count')
-                    ).reset_index()
+                    price_stats = price_stats[['bedrooms', 'avg_price', 'median_price', 'min_price', 'max_price', 'count']]
                     for c in ['avg_price', 'median_price', 'min_price', 'max_price']:
                         price_stats[c] = price_stats[c].round().astype(int).apply(format_price)
                     price_stats.columns = ['Bedrooms', 'Average Price', 'Median Price', 'Min Price', 'Max Price', 'Count']
                     st.write(price_stats)
 
                     st.subheader("Price Trend Analysis")
-                    trend_data = listings_with_trends.groupby('trend').size().reset_index(name='count')
+                    trend_data = load_trend_counts(filters)
                     if not trend_data.empty:
                         fig = px.pie(trend_data, values='count', names='trend',
                                      title='Price Trend Distribution', color='trend',
@@ -678,26 +647,69 @@ def main():
                     st.warning("Not enough data to display price distribution.")
 
             with snap_rented:
-                rented_df = listings_df[listings_df['still_published'] == False].copy()
-                if rented_df.empty:
+                rented_points = load_price_points({'rented_only': True})
+                if rented_points.empty:
                     st.info("No data available for rented properties yet.")
                 else:
-                    rented_stats = rented_df.groupby('bedrooms').agg(
-                        avg_price=('last_price', 'mean'),
-                        min_price=('last_price', 'min'),
-                        max_price=('last_price', 'max'),
-                        count=('id', 'count')
-                    ).reset_index()
+                    rented_stats = price_stats_from_counts(rented_points)[['bedrooms', 'avg_price', 'min_price', 'max_price', 'count']]
                     for c in ['avg_price', 'min_price', 'max_price']:
                         rented_stats[c] = rented_stats[c].round().astype(int).apply(format_price)
                     rented_stats.columns = ['Bedrooms', 'Average Price', 'Min Price', 'Max Price', 'Count']
                     st.table(rented_stats)
 
-                    fig = px.histogram(rented_df, x='last_price', color='bedrooms',
+                    fig = px.histogram(rented_points, x='last_price', y='n', histfunc='sum', color='bedrooms',
                                        title='Distribution of Rented Property Prices',
-                                       labels={'last_price': 'Price ($)'}, nbins=20)
+                                       labels={'last_price': 'Price ($)', 'n': 'count'}, nbins=20)
                     st.plotly_chart(fig, width="stretch")
 
+    with tab4:
+        st.markdown('<div class="subheader">Crawl Runs</div>', unsafe_allow_html=True)
+        runs = load_crawl_runs()
+        if runs.empty:
+            st.info("No crawl has been recorded yet.")
+        else:
+            last = runs.iloc[-1]
+            minutes_ago = (pd.Timestamp.now(tz='UTC') - last['run_finished']).total_seconds() / 60
+            c1, c2, c3 = st.columns(3)
+            with c1:
+                st.metric("Last crawl finished", f"{minutes_ago:,.0f} min ago")
+            with c2:
+                st.metric("Last crawl took", f"{last['duration_seconds']:,.0f}s")
+            with c3:
+                age = last['new_listing_age_seconds']
+                st.metric("New listings were", "n/a" if pd.isna(age) else f"{age / 60:,.0f} min old")
+
+            # latency: how long each crawl takes, and how much of it the stages account for
+            fig = px.line(runs, x='run_started', y='duration_seconds', markers=True, hover_data=['reason'],
+                          title='Crawl duration', labels={'run_started': 'Run', 'duration_seconds': 'Seconds'})
+            st.plotly_chart(fig, width="stretch")
+
+            # freshness: time between crawls and the age of new listings when we stored them
+            freshness = pd.DataFrame({
+                'run_started': runs['run_started'],
+                'Minutes since previous crawl': runs['run_started'].diff().dt.total_seconds() / 60,
+                'Age of new listings (min)': runs['new_listing_age_seconds'] / 60,
+            }).melt(id_vars='run_started', var_name='measure', value_name='minutes').dropna()
+            if not freshness.empty:
+                fig = px.line(freshness, x='run_started', y='minutes', color='measure', markers=True,
+                              title='Scrape freshness', labels={'run_started': 'Run', 'minutes': 'Minutes', 'measure': ''})
+                st.plotly_chart(fig, width="stretch")
+
+            activity = runs.melt(id_vars='run_started', value_vars=['new_listings', 'repriced_listings', 'unpublished_listings'],
+                                 var_name='change', value_name='listings')
+            fig = px.bar(activity, x='run_started', y='listings', color='change',
+                         title='Listing changes per crawl', labels={'run_started': 'Run', 'listings': 'Listings', 'change': ''})
+            st.plotly_chart(fig, width="stretch")
+
+            recent = runs.sort_values('run_started', ascending=False).head(20).copy()
+            recent['run_started'] = recent['run_started'].dt.strftime('%Y-%m-%d %H:%M')
+            recent['kB'] = (recent['bytes_downloaded'] / 1024).round().astype(int)
+            st.dataframe(
+                recent[['run_started', 'duration_seconds', 'reason', 'search_pages', 'detail_pages', 'cached_pages', 'kB',
+                        'listings_seen', 'new_listings', 'repriced_listings', 'unpublished_listings', 'stage_seconds']],
+                width="stretch", hide_index=True
+            )
+
 # CSS for styling
 def load_css():
     st.markdown("""